@@ -1,6 +1,6 @@
 {
     'name': 'PV Management',
-    'version': '1.0',
+    'version': '1.2',
     'summary': 'Manage PV Installations, Modules, and Inverters',
     'description': 'Module to manage PV installations, modules, and inverters',
     'author': 'Chihaoui Mohamed',
@@ -17,12 +17,22 @@
         'views/fiche_intervention_views.xml',
         'views/configuration_steg_views.xml',
         'views/evaluation_views.xml',
+        'views/pv_evaluation_import_views.xml',
         'views/fiche_reponse_views.xml',
         'views/calibre_disj_views.xml',
         'views/hr_employee_views.xml',
+        'views/pv_ai_job_views.xml',
+        'views/action_plan_templates.xml',
+        'views/pv_perf_metric_views.xml',
         'views/configuration_menu.xml',
         'data/system_parameters.xml',
+        'data/ai_job_cron.xml',
     ],
+    'assets': {
+        'web.assets_backend': [
+            'pv_management/static/src/js/ai_stream_service.js',
+        ],
+    },
     'installable': True,
     'application': True,
 }
@@ -0,0 +1,32 @@
+from odoo import http
+from odoo.http import request
+import hmac
+from ..models.pv_perf_metric import flush_metrics, _is_enabled, PERF_TOKEN_PARAM
+
+
+class PVPerfMetricsController(http.Controller):
+
+    @http.route('/pv_management/metrics', type='http', auth='none', methods=['GET'], csrf=False, save_session=False)
+    def perf_metrics(self, **kwargs):
+        """Mesures de performance au format texte Prometheus
+
+        Réservé au collecteur configuré: jeton du paramètre pv_management.perf_metrics_token dans
+        l'en-tête Authorization (Bearer). L'adresse distante n'est pas une preuve: derrière un proxy
+        local, toutes les requêtes viennent de 127.0.0.1.
+        """
+        if not request.db:
+            return request.not_found()
+        env = request.env(su=True)
+        expected = env['ir.config_parameter'].get_param(PERF_TOKEN_PARAM)
+        authorization = request.httprequest.headers.get('Authorization', '')
+        scheme, _sep, token = authorization.partition(' ')
+        if (not expected or scheme.lower() != 'bearer'
+                or not hmac.compare_digest(token.strip().encode(), expected.encode())):
+            return request.not_found()
+        if not _is_enabled(env):
+            return request.not_found()
+        flush_metrics(env, force=True)
+        return request.make_response(
+            env['pv.perf.metric']._export_prometheus(),
+            headers=[('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')],
+        )
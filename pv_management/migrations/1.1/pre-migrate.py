@@ -0,0 +1,24 @@
+import logging
+
+_logger = logging.getLogger(__name__)
+
+
+def migrate(cr, version):
+    """Conserve les plans HTML existants: action_plan_html devient un champ calculé (non stocké),
+    l'ancienne colonne traduite est renommée en legacy_action_plan_html (texte) jusqu'à la prochaine génération.
+    """
+    cr.execute("""
+        SELECT data_type FROM information_schema.columns
+         WHERE table_name = 'alarm_management' AND column_name = 'action_plan_html'
+    """)
+    row = cr.fetchone()
+    if not row:
+        return
+    cr.execute("ALTER TABLE alarm_management RENAME COLUMN action_plan_html TO legacy_action_plan_html")
+    if row[0] == 'jsonb':
+        cr.execute("""
+            ALTER TABLE alarm_management
+            ALTER COLUMN legacy_action_plan_html TYPE text
+            USING COALESCE(legacy_action_plan_html->>'fr_FR', legacy_action_plan_html->>'en_US')
+        """)
+    _logger.info("alarm.management: anciens plans d'action HTML conservés dans legacy_action_plan_html")
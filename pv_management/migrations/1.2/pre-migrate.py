@@ -0,0 +1,29 @@
+import logging
+
+_logger = logging.getLogger(__name__)
+
+SCORE_COLUMNS = {
+    'technician_rating': 'technician_rating_score',
+    'technician_knowledge': 'technician_knowledge_score',
+    'technician_professionalism': 'technician_professionalism_score',
+    'technician_communication': 'technician_communication_score',
+}
+
+
+def migrate(cr, version):
+    """Crée et remplit en SQL les colonnes de score de pv.evaluation: l'ORM ne recalcule pas
+    un champ stocké dont la colonne existe déjà (évite un calcul enregistrement par enregistrement).
+    """
+    for rating_column, score_column in SCORE_COLUMNS.items():
+        cr.execute(f"ALTER TABLE pv_evaluation ADD COLUMN IF NOT EXISTS {score_column} integer")
+        cr.execute(f"""
+            UPDATE pv_evaluation
+               SET {score_column} = CASE {rating_column}
+                                        WHEN 'excellent' THEN 4
+                                        WHEN 'good' THEN 3
+                                        WHEN 'average' THEN 2
+                                        WHEN 'poor' THEN 1
+                                        ELSE 0
+                                    END
+        """)
+    _logger.info("pv.evaluation: scores des techniciens calculés pour les évaluations existantes")
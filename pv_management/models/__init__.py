@@ -1,3 +1,4 @@
+from . import pv_sequence_service
 from . import pv_installation
 from . import pv_module
 from . import pv_inverter
@@ -6,6 +7,15 @@ from . import alarm_management
 from . import reclamation
 from . import fiche_intervention
 from . import evaluation
+from . import pv_evaluation_import
 from . import fiche_reponse
+from . import pv_perf_metric
+from . import pv_ai_cache
+from . import pv_ai_call_log
+from . import pv_ai_rate_limiter
+from . import pv_ai_action_plan
+from . import pv_ai_circuit_breaker
 from . import pv_openai_service
-from . import hr_employee
\ No newline at end of file
+from . import pv_ai_job
+from . import hr_employee
+from . import pv_fleet_generator
\ No newline at end of file
@@ -1,4 +1,15 @@
 from odoo import models, fields, api, _
+from odoo.exceptions import UserError
+from odoo.osv import expression
+from odoo.tools import str2bool
+from datetime import timedelta
+import logging
+from .pv_perf_metric import instrumented
+
+_logger = logging.getLogger(__name__)
+
+# Fenêtres (jours) des statistiques de résolution fournies au prompt IA et aux rapports
+RESOLUTION_WINDOWS = (7, 30, 90)
 
 
 class AlarmManagement(models.Model):
@@ -39,16 +50,20 @@ class AlarmManagement(models.Model):
         ('safety', 'Sécurité')
     ], string='Catégorie', help="Catégorie du problème")
 
-    # Occurrence tracking
+    reclamation_ids = fields.One2many('reclamation', 'code_alarm_id', string='Réclamations')
+
+    # Occurrence tracking (stockés: triables, groupables et filtrables en SQL)
     occurrence_count = fields.Integer(
         string='Occurrences',
-        compute='_compute_occurrence_count',
+        compute='_compute_occurrence_stats',
+        store=True,
         help="Nombre de fois que cette alarme est apparue"
     )
 
     last_occurrence_date = fields.Datetime(
         string='Dernière occurrence',
-        compute='_compute_last_occurrence',
+        compute='_compute_occurrence_stats',
+        store=True,
         help="Date de la dernière réclamation pour cette alarme"
     )
 
@@ -56,17 +71,24 @@ class AlarmManagement(models.Model):
     avg_resolution_time = fields.Float(
         string='Temps moyen de résolution (h)',
         compute='_compute_resolution_stats',
+        store=True,
         help="Temps moyen de résolution en heures"
     )
 
     resolution_rate = fields.Float(
         string='Taux de résolution (%)',
         compute='_compute_resolution_stats',
+        store=True,
         help="Pourcentage d'interventions résolues"
     )
 
-    # Nouveaux champs pour le plan d'action IA
-    action_plan_html = fields.Html(string='Plan d\'action IA', translate=True)
+    # Nouveaux champs pour le plan d'action IA: plan stocké en JSON (partagé par empreinte), HTML rendu à la lecture
+    action_plan_id = fields.Many2one('pv.ai.action.plan', string='Plan d\'action (données)', readonly=True,
+                                     copy=False, index=True)
+    action_plan_html = fields.Html(string='Plan d\'action IA', compute='_compute_action_plan_html',
+                                   sanitize=False)
+    legacy_action_plan_html = fields.Html(string='Ancien plan d\'action IA', readonly=True, copy=False,
+                                          help="Plan HTML enregistré avant le stockage JSON, remplacé à la prochaine génération")
     last_action_plan_date = fields.Datetime(string='Dernière mise à jour du plan', readonly=True)
     action_plan_severity = fields.Selection([
         ('low', 'Faible'),
@@ -77,65 +99,107 @@ class AlarmManagement(models.Model):
     action_plan_resolution_time = fields.Float(string='Temps estimé (heures)', readonly=True)
     requires_specialist = fields.Boolean(string='Spécialiste requis', readonly=True)
 
-    @api.depends('code_alarm')
-    def _compute_occurrence_count(self):
+    # Suivi de la génération asynchrone
+    ai_job_id = fields.Many2one('pv.ai.job', string='Dernière tâche IA', readonly=True, copy=False)
+    ai_job_state = fields.Selection(related='ai_job_id.state', string='État de la génération')
+    ai_job_progress = fields.Integer(related='ai_job_id.progress', string='Progression')
+    ai_job_error = fields.Text(related='ai_job_id.error_message', string='Erreur de génération')
+
+    @api.depends('action_plan_id', 'legacy_action_plan_html', 'code_alarm', 'name', 'description',
+                 'severity', 'occurrence_count', 'last_action_plan_date')
+    @instrumented('compute')
+    def _compute_action_plan_html(self):
+        for alarm in self:
+            if not alarm.action_plan_id:
+                alarm.action_plan_html = alarm.legacy_action_plan_html
+                continue
+            header = (alarm.code_alarm, alarm.name, alarm.description, alarm.severity,
+                      alarm.occurrence_count, alarm.last_action_plan_date)
+            alarm.action_plan_html = alarm.action_plan_id._render_html_cached(header)
+
+    @api.depends('reclamation_ids', 'reclamation_ids.date_heure')
+    @instrumented('compute')
+    def _compute_occurrence_stats(self):
+        # Une seule requête groupée pour tout le recordset; recalcul incrémental via les dépendances
+        alarm_ids = [alarm_id for alarm_id in self._origin.ids if alarm_id]
+        groups = self.env['reclamation']._read_group(
+            [('code_alarm_id', 'in', alarm_ids)], ['date_heure:max'], ['code_alarm_id'],
+        ) if alarm_ids else []
+        stats = {group['code_alarm_id'][0]: group for group in groups}
         for record in self:
-            try:
-                count = self.env['reclamation'].search_count([
-                    ('code_alarm_id', '=', record.id)
-                ])
-                record.occurrence_count = count
-            except:
-                record.occurrence_count = 0
-
-    @api.depends('code_alarm')
-    def _compute_last_occurrence(self):
-        for record in self:
-            try:
-                last_reclamation = self.env['reclamation'].search([
-                    ('code_alarm_id', '=', record.id)
-                ], order='date_heure desc', limit=1)
-                record.last_occurrence_date = last_reclamation.date_heure if last_reclamation else False
-            except:
-                record.last_occurrence_date = False
-
-    @api.depends('code_alarm')
+            group = stats.get(record._origin.id, {})
+            record.occurrence_count = group.get('code_alarm_id_count', 0)
+            record.last_occurrence_date = group.get('date_heure', False)
+
+    @api.depends('reclamation_ids.date_heure', 'reclamation_ids.intervention_ids.state')
+    @instrumented('compute')
     def _compute_resolution_stats(self):
+        stats = self._origin._get_resolution_stats()
         for record in self:
-            try:
-                reclamations = self.env['reclamation'].search([
-                    ('code_alarm_id', '=', record.id)
-                ])
-
-                if not reclamations:
-                    record.avg_resolution_time = 0.0
-                    record.resolution_rate = 0.0
-                    continue
+            record_stats = stats.get(record._origin.id) or self._empty_resolution_stats()
+            record.avg_resolution_time = record_stats['avg_resolution_time']
+            record.resolution_rate = record_stats['resolution_rate']
+
+    @api.model
+    def _empty_resolution_stats(self):
+        return {
+            'occurrence_count': 0,
+            'intervention_count': 0,
+            'resolved_count': 0,
+            'resolution_rate': 0.0,
+            'avg_resolution_time': 0.0,
+        }
 
-                total_time = 0.0
-                resolved_count = 0
-                total_interventions = 0
-
-                for reclamation in reclamations:
-                    interventions = self.env['fiche.intervention'].search([
-                        ('reclamation_id', '=', reclamation.id)
-                    ])
-
-                    for intervention in interventions:
-                        total_interventions += 1
-                        if intervention.state == 'closed':
-                            resolved_count += 1
-                            # Calculate resolution time
-                            if intervention.create_date and reclamation.date_heure:
-                                time_diff = intervention.create_date - reclamation.date_heure
-                                total_time += time_diff.total_seconds() / 3600  # Convert to hours
-
-                record.avg_resolution_time = total_time / resolved_count if resolved_count > 0 else 0.0
-                record.resolution_rate = (
-                            resolved_count / total_interventions * 100)/100  if total_interventions > 0 else 0.0
-            except:
-                record.avg_resolution_time = 0.0
-                record.resolution_rate = 0.0
+    def _get_resolution_stats(self, days=None):
+        """Statistiques de résolution de toutes les alarmes de self en une requête groupée
+
+        days: ne compte que les réclamations des N derniers jours (None: tout l'historique).
+        Retourne {id de l'alarme: {occurrence_count, intervention_count, resolved_count,
+        resolution_rate (fraction 0-1), avg_resolution_time (heures jusqu'à l'intervention clôturée)}}.
+        """
+        alarm_ids = tuple(alarm_id for alarm_id in self.ids if alarm_id)
+        if not alarm_ids:
+            return {}
+        self.env['reclamation'].flush_model(['code_alarm_id', 'date_heure'])
+        self.env['fiche.intervention'].flush_model(['reclamation_id', 'state'])
+
+        where_window = ""
+        params = {'alarm_ids': alarm_ids}
+        if days:
+            where_window = "AND r.date_heure >= (now() AT TIME ZONE 'UTC') - make_interval(days => %(days)s)"
+            params['days'] = days
+        self.env.cr.execute(f"""
+            SELECT r.code_alarm_id,
+                   COUNT(DISTINCT r.id) AS occurrence_count,
+                   COUNT(fi.id) AS intervention_count,
+                   COUNT(fi.id) FILTER (WHERE fi.state = 'closed') AS resolved_count,
+                   AVG(EXTRACT(EPOCH FROM fi.create_date - r.date_heure) / 3600.0)
+                       FILTER (WHERE fi.state = 'closed') AS avg_resolution_time
+              FROM reclamation r
+              LEFT JOIN fiche_intervention fi ON fi.reclamation_id = r.id
+             WHERE r.code_alarm_id IN %(alarm_ids)s
+               {where_window}
+             GROUP BY r.code_alarm_id
+        """, params)
+
+        result = {}
+        for alarm_id, occurrence_count, intervention_count, resolved_count, avg_time in self.env.cr.fetchall():
+            result[alarm_id] = {
+                'occurrence_count': occurrence_count,
+                'intervention_count': intervention_count,
+                'resolved_count': resolved_count,
+                'resolution_rate': resolved_count / intervention_count if intervention_count else 0.0,
+                'avg_resolution_time': float(avg_time or 0.0),
+            }
+        return result
+
+    def _get_resolution_stats_windows(self, windows=RESOLUTION_WINDOWS):
+        """{id de l'alarme: {jours: statistiques}} pour chaque fenêtre (une requête par fenêtre)"""
+        by_window = {days: self._get_resolution_stats(days) for days in windows}
+        return {
+            alarm.id: {days: by_window[days].get(alarm.id) or self._empty_resolution_stats() for days in windows}
+            for alarm in self
+        }
 
     @api.onchange('code_alarm', 'partie')
     def _onchange_auto_description(self):
@@ -218,6 +282,7 @@ class AlarmManagement(models.Model):
             elif any(word in description_lower for word in ['structure', 'fixation', 'mécanique', 'assemblage']):
                 self.category = 'mechanical'
 
+    @instrumented('action')
     def action_debug_openai(self):
         """Méthode de debug pour tester OpenAI"""
         try:
@@ -243,131 +308,274 @@ class AlarmManagement(models.Model):
         if self.partie != 'onduleur':
             self.marque_onduleur_id = False
 
+    @instrumented('action')
     def action_generate_action_plan(self):
         """
-        Génère un plan d'action IA pour le code d'alarme avec feedback utilisateur amélioré
+        Met en file la génération du plan d'action IA et rend la main immédiatement.
+        Le plan est produit par une tâche pv.ai.job exécutée hors du cycle de la requête.
         """
         self.ensure_one()
-        try:
-            # Vérification des prérequis
-            if not self.code_alarm:
-                return {
-                    'type': 'ir.actions.client',
-                    'tag': 'display_notification',
-                    'params': {
-                        'title': _('Erreur'),
-                        'message': _('Veuillez saisir un code d\'alarme avant de générer le plan d\'action.'),
-                        'sticky': False,
-                        'type': 'warning'
-                    }
+        # Vérification des prérequis
+        if not self.code_alarm:
+            return {
+                'type': 'ir.actions.client',
+                'tag': 'display_notification',
+                'params': {
+                    'title': _('Erreur'),
+                    'message': _('Veuillez saisir un code d\'alarme avant de générer le plan d\'action.'),
+                    'sticky': False,
+                    'type': 'warning'
                 }
+            }
 
-            if not self.name:
-                return {
-                    'type': 'ir.actions.client',
-                    'tag': 'display_notification',
-                    'params': {
-                        'title': _('Erreur'),
-                        'message': _('Veuillez saisir un nom pour l\'alarme avant de générer le plan d\'action.'),
-                        'sticky': False,
-                        'type': 'warning'
-                    }
+        if not self.name:
+            return {
+                'type': 'ir.actions.client',
+                'tag': 'display_notification',
+                'params': {
+                    'title': _('Erreur'),
+                    'message': _('Veuillez saisir un nom pour l\'alarme avant de générer le plan d\'action.'),
+                    'sticky': False,
+                    'type': 'warning'
                 }
+            }
 
-            openai_service = self.env['pv.management.openai.service']
+        _job, created = self.env['pv.ai.job']._enqueue(
+            'alarm_action_plan', self, force_refresh=self.env.context.get('pv_ai_force_refresh', False))
+        if not created:
+            # Un autre utilisateur a déjà lancé la génération pour cette alarme: pas de second appel OpenAI
+            return {
+                'type': 'ir.actions.client',
+                'tag': 'display_notification',
+                'params': {
+                    'title': _('Génération déjà en cours'),
+                    'message': _('Le plan d\'action de cette alarme est déjà en cours de génération. '
+                                 'Vous serez notifié dès qu\'il sera disponible.'),
+                    'sticky': False,
+                    'type': 'info',
+                    'next': {'type': 'ir.actions.client', 'tag': 'reload'},
+                }
+            }
+
+        return {
+            'type': 'ir.actions.client',
+            'tag': 'display_notification',
+            'params': {
+                'title': _('Plan d\'action en préparation'),
+                'message': _('La génération du plan d\'action IA a été lancée. '
+                             'Vous serez notifié dès qu\'il sera disponible.'),
+                'sticky': False,
+                'type': 'info',
+                'next': {'type': 'ir.actions.client', 'tag': 'reload'},
+            }
+        }
+
+    def _prepare_alarm_data(self):
+        """Données de l'alarme et de son historique envoyées au service IA"""
+        self.ensure_one()
+        return self._prepare_alarm_data_batch()[self.id]
 
-            # Rechercher des occurrences de ce code d'alarme dans les réclamations
-            reclamations = self.env['reclamation'].search([('code_alarm_id', '=', self.id)], limit=10)
+    def _prepare_alarm_data_batch(self, reclamation_limit=10):
+        """Données IA de toutes les alarmes de self: {id de l'alarme: alarm_data}
 
-            # Préparer les données pour l'IA
+        Les dernières réclamations de chaque alarme sont chargées en une seule requête.
+        """
+        reclamations_by_alarm = {alarm.id: self.env['reclamation'] for alarm in self}
+        if self.ids:
+            self.env['reclamation'].flush_model(['code_alarm_id'])
+            self.env.cr.execute("""
+                SELECT id FROM (
+                    SELECT id, row_number() OVER (PARTITION BY code_alarm_id ORDER BY id DESC) AS rank
+                      FROM reclamation
+                     WHERE code_alarm_id IN %s
+                ) ranked
+                WHERE rank <= %s
+                ORDER BY id DESC
+            """, (tuple(self.ids), reclamation_limit))
+            reclamations = self.env['reclamation'].browse([row[0] for row in self.env.cr.fetchall()])
+            for rec in reclamations:
+                reclamations_by_alarm[rec.code_alarm_id.id] |= rec
+
+        windows = self._get_resolution_stats_windows()
+
+        result = {}
+        for alarm in self:
             alarm_data = {
-                'id': self.id,
-                'name': self.name,
-                'partie': self.partie,
-                'code_alarm': self.code_alarm,
-                'description': self.description,
-                'severity': self.severity,
-                'category': self.category,
-                'occurrence_count': self.occurrence_count,
-                'avg_resolution_time': self.avg_resolution_time,
-                'resolution_rate': self.resolution_rate,
-                'marque_onduleur': self.marque_onduleur_id.name if self.marque_onduleur_id else None,
+                'id': alarm.id,
+                'name': alarm.name,
+                'partie': alarm.partie,
+                'code_alarm': alarm.code_alarm,
+                'description': alarm.description,
+                'severity': alarm.severity,
+                'category': alarm.category,
+                'occurrence_count': alarm.occurrence_count,
+                'avg_resolution_time': alarm.avg_resolution_time,
+                # Le champ stocke une fraction; le prompt et la validation du plan attendent un pourcentage
+                'resolution_rate': alarm.resolution_rate * 100,
+                'marque_onduleur': alarm.marque_onduleur_id.name if alarm.marque_onduleur_id else None,
+                'recent_trend': [
+                    {
+                        'days': days,
+                        'occurrence_count': stats['occurrence_count'],
+                        'resolution_rate': stats['resolution_rate'] * 100,
+                        'avg_resolution_time': stats['avg_resolution_time'],
+                    }
+                    for days, stats in windows[alarm.id].items()
+                ],
             }
 
             # Ajouter l'historique des réclamations associées à ce code d'alarme
-            if reclamations:
+            if reclamations_by_alarm[alarm.id]:
                 alarm_data['reclamations'] = []
-                for rec in reclamations:
-                    intervention = self.env['fiche.intervention'].search([('reclamation_id', '=', rec.id)], limit=1)
+                for rec in reclamations_by_alarm[alarm.id]:
+                    intervention = rec.intervention_ids[:1]
                     alarm_data['reclamations'].append({
                         'date': str(rec.date_heure),
-                        'description': rec.description,
                         'installation_type': rec.nom_central_id.type_installation if rec.nom_central_id else None,
                         'priority': rec.priorite_urgence,
                         'has_intervention': bool(intervention),
                         'intervention_state': intervention.state if intervention else None,
                         'intervention_text': intervention.intervention_text if intervention else None,
                     })
+            result[alarm.id] = alarm_data
+        return result
 
-            # Génération du plan d'action
-            action_plan = openai_service.generate_alarm_action_plan(alarm_data)
-
-            if action_plan:
-                # Mise à jour des champs
-                self.write({
-                    'action_plan_html': action_plan.get('html_content',
-                                                        '<p>Erreur lors de la génération du plan d\'action.</p>'),
-                    'last_action_plan_date': fields.Datetime.now(),
-                    'action_plan_severity': action_plan.get('severity', 'medium'),
-                    'action_plan_resolution_time': action_plan.get('estimated_resolution_time', 0.0),
-                    'requires_specialist': action_plan.get('requires_specialist', False),
-                })
-
-                # Committer la transaction pour s'assurer que les données sont sauvegardées
-                self.env.cr.commit()
-
-                # Retourner une action qui recharge la vue avec le nouvel onglet visible
-                return {
-                    'type': 'ir.actions.act_window',
-                    'name': _('Plan d\'Action Généré'),
-                    'res_model': 'alarm.management',
-                    'res_id': self.id,
-                    'view_mode': 'form',
-                    'view_type': 'form',
-                    'target': 'current',
-                    'context': {
-                        'default_active_tab': 'plan_action',  # Ouvrir directement l'onglet du plan d'action
-                        'form_view_initial_mode': 'edit',
-                    },
-                    'flags': {'mode': 'edit'},
+    def _apply_action_plan(self, action_plan):
+        """Enregistre le plan d'action généré sur l'alarme"""
+        self.ensure_one()
+        if action_plan.get('is_fallback'):
+            # Stocke le modèle de secours (sans données de l'alarme): une seule ligne pour toutes les alarmes
+            action_plan = self.env['pv.management.openai.service']._get_fallback_plan_template(
+                action_plan.get('requires_specialist', False))
+        plan_record = self.env['pv.ai.action.plan'].sudo()._get_or_create(action_plan)
+        self.write({
+            'action_plan_id': plan_record.id,
+            'legacy_action_plan_html': False,
+            'last_action_plan_date': fields.Datetime.now(),
+            'action_plan_severity': action_plan.get('severity', 'medium'),
+            'action_plan_resolution_time': action_plan.get('estimated_resolution_time', 0.0),
+            'requires_specialist': action_plan.get('requires_specialist', False),
+        })
+
+    def _run_action_plan_generation(self, force_refresh=False):
+        """Exécuté par la tâche pv.ai.job: génère et enregistre le plan d'action
+
+        En mode streaming (pv_management.ai_streaming), le diagnostic puis chaque étape sont
+        envoyés au demandeur dès leur réception; le plan n'est enregistré qu'une fois complet.
+        """
+        self.ensure_one()
+        openai_service = self.env['pv.management.openai.service']
+        streaming = str2bool(self.env['ir.config_parameter'].sudo().get_param('pv_management.ai_streaming', 'False'),
+                             False)
+        on_section = self._make_action_plan_progress_sender() if streaming else None
+        try:
+            action_plan = openai_service.generate_alarm_action_plan(
+                self._prepare_alarm_data(), force_refresh=force_refresh, on_section=on_section)
+        finally:
+            if on_section:
+                on_section('done', None)
+        if not action_plan:
+            raise UserError(_('Impossible de générer le plan d\'action. Vérifiez la configuration de '
+                              'l\'API OpenAI et votre connexion internet.'))
+        self._apply_action_plan(action_plan)
+        return _('Plan d\'action généré (%s étapes, confiance %s%%)') % (
+            len(action_plan.get('action_steps', [])), action_plan.get('confidence_score', 0))
+
+    def _make_action_plan_progress_sender(self):
+        """Retourne on_section: envoie chaque section du plan en cours au demandeur (bus)
+
+        Les messages partent dans un curseur séparé: la transaction de la tâche n'est validée
+        qu'avec le plan complet, et le bus ne diffuse qu'à la validation.
+        """
+        self.ensure_one()
+        partner = self.env.user.partner_id
+        step_count = [0]
+
+        def on_section(section, value):
+            message = {'alarm_id': self.id, 'alarm_name': self.name, 'section': section}
+            if section == 'diagnostic':
+                message['diagnostic'] = value
+            elif section == 'action_step':
+                step_count[0] += 1
+                message['step'] = {
+                    'step': value.get('step', step_count[0]),
+                    'title': value.get('title', ''),
+                    'estimated_time': value.get('estimated_time', 0),
                 }
+            message['step_count'] = step_count[0]
+            with self.pool.cursor() as cr:
+                self.env(cr=cr)['bus.bus']._sendone(partner, 'pv_ai_action_plan_progress', message)
 
-            else:
-                return {
-                    'type': 'ir.actions.client',
-                    'tag': 'display_notification',
-                    'params': {
-                        'title': _('Erreur'),
-                        'message': _(
-                            'Impossible de générer le plan d\'action. Vérifiez la configuration de l\'API OpenAI et votre connexion internet.'),
-                        'sticky': False,
-                        'type': 'warning'
-                    }
-                }
+        return on_section
 
-        except Exception as e:
-            # Log de l'erreur pour le débogage
-            import logging
-            _logger = logging.getLogger(__name__)
-            _logger.error(f"Erreur lors de la génération du plan d'action: {str(e)}")
+    # ========== RÉGÉNÉRATION EN MASSE ==========
 
-            return {
-                'type': 'ir.actions.client',
-                'tag': 'display_notification',
-                'params': {
-                    'title': _('Erreur Technique'),
-                    'message': f'Une erreur technique s\'est produite: {str(e)}. Consultez les logs pour plus de détails.',
-                    'sticky': True,
-                    'type': 'danger'
-                }
-            }
\ No newline at end of file
+    def _bulk_regenerate_action_plans(self, force_refresh=False, batch_size=50, max_workers=None, commit=False):
+        """Régénère les plans d'action de toutes les alarmes de self.
+
+        Les appels OpenAI d'un lot partent en parallèle (pool de threads borné);
+        les résultats sont écrits depuis le curseur principal, lot par lot (voir pv.ai.job._run_in_batches).
+        Retourne les statistiques du traitement.
+        """
+        openai_service = self.env['pv.management.openai.service']
+        if max_workers is None:
+            max_workers = openai_service._get_int_param('pv_management.ai_bulk_max_workers', 4)
+
+        def regenerate_batch(batch):
+            batch_stats = dict.fromkeys(('ai', 'fallback', 'failed'), 0)
+            alarm_data_by_id = batch._prepare_alarm_data_batch()
+            plans = openai_service.generate_alarm_action_plans(
+                list(alarm_data_by_id.values()), force_refresh=force_refresh, max_workers=max_workers)
+            for alarm in batch:
+                plan = plans.get(alarm.id)
+                if not plan:
+                    batch_stats['failed'] += 1
+                    continue
+                alarm._apply_action_plan(plan)
+                batch_stats['fallback' if plan.get('is_fallback') else 'ai'] += 1
+            return batch_stats
+
+        stats = {'total': len(self), 'ai': 0, 'fallback': 0, 'skipped': 0, 'failed': 0}
+        self.env['pv.ai.job']._run_in_batches(self, regenerate_batch, stats, batch_size=batch_size, commit=commit)
+        _logger.info(
+            f"Régénération des plans d'action: {stats['total']} alarmes en {stats['duration']:.1f}s "
+            f"({stats['throughput']:.1f} plans/min) - IA: {stats['ai']}, secours: {stats['fallback']} "
+            f"({stats['fallback_rate']:.0f}%), ignorées (génération en cours): {stats['skipped']}, "
+            f"échecs: {stats['failed']}")
+        return stats
+
+    @instrumented('action')
+    def action_bulk_regenerate_action_plans(self):
+        """Action serveur: met en file la régénération des plans des alarmes sélectionnées
+
+        Une tâche pv.ai.job par alarme, exécutée par le cron hors du cycle de la requête HTTP.
+        """
+        alarms = self.filtered(lambda alarm: alarm.code_alarm and alarm.name)
+        queued, already_active = self.env['pv.ai.job']._enqueue_many('alarm_action_plan', alarms, force_refresh=True)
+        message = _('%s régénération(s) de plan d\'action mise(s) en file.') % queued
+        if already_active:
+            message += ' ' + _('%s alarme(s) déjà en cours de génération.') % already_active
+        if len(alarms) < len(self):
+            message += ' ' + _('%s alarme(s) sans code ou sans nom ignorée(s).') % (len(self) - len(alarms))
+        message += ' ' + _('Suivez l\'avancement dans le menu Tâches IA.')
+        return {
+            'type': 'ir.actions.client',
+            'tag': 'display_notification',
+            'params': {
+                'title': _('Régénération des plans d\'action'),
+                'message': message,
+                'sticky': False,
+                'type': 'info',
+                'next': {'type': 'ir.actions.client', 'tag': 'reload'},
+            }
+        }
+
+    @api.model
+    def _cron_regenerate_action_plans(self, domain=None, stale_days=30, limit=1000):
+        """Cron: régénère les plans absents ou plus anciens que stale_days jours"""
+        if domain is None:
+            stale_date = fields.Datetime.now() - timedelta(days=stale_days)
+            domain = ['|', ('last_action_plan_date', '=', False), ('last_action_plan_date', '<', stale_date)]
+        domain = expression.AND([domain, [('code_alarm', '!=', False), ('name', '!=', False)]])
+        alarms = self.search(domain, limit=limit, order='last_action_plan_date asc nulls first, id')
+        return alarms._bulk_regenerate_action_plans(commit=True)
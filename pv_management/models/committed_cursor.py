@@ -0,0 +1,18 @@
+"""Curseur séparé, validé immédiatement, pour l'état partagé entre workers.
+
+Disjoncteur, seaux de débit, journal des appels et file des tâches IA sont écrits hors de la
+transaction de l'appelant. Le curseur est en READ COMMITTED (et non REPEATABLE READ, le niveau
+par défaut d'Odoo): deux workers qui mettent à jour la même ligne s'attendent puis relisent la
+version validée, au lieu d'échouer en conflit de sérialisation.
+"""
+from contextlib import contextmanager
+
+
+@contextmanager
+def committed_cursor(pool):
+    """Nouveau curseur du registre pool, validé à la sortie du bloc (annulé en cas d'exception)"""
+    with pool.cursor() as cr:
+        # En mode test, le curseur partage la transaction du test: le niveau d'isolation est fixé
+        if not pool.in_test_mode():
+            cr.execute("SET TRANSACTION ISOLATION LEVEL READ COMMITTED")
+        yield cr
@@ -1,4 +1,15 @@
-from odoo import models, fields, api
+from odoo import models, fields, api, tools
+from .pv_perf_metric import instrumented
+
+RATING_SCORES = {'excellent': 4, 'good': 3, 'average': 2, 'poor': 1}
+
+# Note du technicien -> (colonne de score, libellé)
+TECHNICIAN_SCORE_FIELDS = {
+    'technician_rating': ('technician_rating_score', 'Performance globale'),
+    'technician_knowledge': ('technician_knowledge_score', 'Connaissances techniques'),
+    'technician_professionalism': ('technician_professionalism_score', 'Professionnalisme'),
+    'technician_communication': ('technician_communication_score', 'Communication'),
+}
 
 
 class Evaluation(models.Model):
@@ -7,8 +18,7 @@ class Evaluation(models.Model):
     _inherit = ['mail.thread', 'mail.activity.mixin']
     _order = 'id desc'
 
-    name = fields.Char(string='Reference', required=True, copy=False, readonly=True,
-                       default=lambda self: self.env['ir.sequence'].next_by_code('pv.evaluation.sequence') or 'New')
+    name = fields.Char(string='Reference', required=True, copy=False, readonly=True, default='New')
 
     # Add client field to allow filtering installations by client
     client_id = fields.Many2one('res.partner', string='Client')
@@ -18,7 +28,7 @@ class Evaluation(models.Model):
 
     # Link to intervention
     intervention_id = fields.Many2one('fiche.intervention', string='Intervention',
-                                      domain="[('installation_id', '=', installation_id)]", readonly=True)
+                                      domain="[('installation_id', '=', installation_id)]", readonly=True, index=True)
 
     # FIX: Make sure technicien_id is properly linked and stored
     technicien_id = fields.Many2one(
@@ -26,10 +36,17 @@ class Evaluation(models.Model):
         string='Technician',
         compute='_compute_technicien_id',
         store=True,  # Important: store the value so it can be searched
-        readonly=True
+        readonly=True,
+        index=True
     )
 
+    def init(self):
+        # Première évaluation de chaque intervention (rapport des interventions)
+        tools.create_index(self._cr, 'pv_evaluation_intervention_id_id_idx', self._table,
+                           ['intervention_id', 'id'])
+
     @api.depends('intervention_id', 'intervention_id.technicien_id')
+    @instrumented('compute')
     def _compute_technicien_id(self):
         """Compute technician from intervention"""
         for record in self:
@@ -111,6 +128,16 @@ class Evaluation(models.Model):
     technician_feedback = fields.Text(string='Feedback on Technician',
                                       help='Additional comments about technician performance')
 
+    # Scores 1-4 des notes du technicien (0: non noté), agrégés en SQL par _get_technician_scores
+    technician_rating_score = fields.Integer(string='Score global', compute='_compute_technician_scores',
+                                             store=True, readonly=True)
+    technician_knowledge_score = fields.Integer(string='Score connaissances', compute='_compute_technician_scores',
+                                                store=True, readonly=True)
+    technician_professionalism_score = fields.Integer(string='Score professionnalisme',
+                                                      compute='_compute_technician_scores', store=True, readonly=True)
+    technician_communication_score = fields.Integer(string='Score communication',
+                                                    compute='_compute_technician_scores', store=True, readonly=True)
+
     # State for workflow
     state = fields.Selection([
         ('draft', 'Draft'),
@@ -119,39 +146,90 @@ class Evaluation(models.Model):
         ('canceled', 'Canceled')
     ], string='Status', default='draft', tracking=True)
 
+    @api.depends(*TECHNICIAN_SCORE_FIELDS)
+    def _compute_technician_scores(self):
+        for record in self:
+            for rating_field, (score_field, _label) in TECHNICIAN_SCORE_FIELDS.items():
+                record[score_field] = RATING_SCORES.get(record[rating_field], 0)
+
     @api.model
-    def create(self, vals):
-        if vals.get('name', 'New') == 'New':
-            vals['name'] = self.env['ir.sequence'].next_by_code('pv.evaluation.sequence') or 'New'
-        result = super(Evaluation, self).create(vals)
+    def _get_technician_scores(self, technician_ids=None):
+        """Scores des techniciens en une requête groupée: {id du technicien: scores}
+
+        scores: count (évaluations), averages ({note: moyenne 1-4 ou None}), overall (moyenne de
+        toutes les notes, None sans note), overall_rating, strengths et weak_areas (libellés).
+        Sans technician_ids, tous les techniciens évalués.
+        """
+        score_columns = [score_field for score_field, _label in TECHNICIAN_SCORE_FIELDS.values()]
+        self.flush_model(['technicien_id'] + score_columns)
+        averages_sql = ', '.join(f"AVG(NULLIF({column}, 0))" for column in score_columns)
+        total_sql = ' + '.join(f"COALESCE(SUM({column}), 0)" for column in score_columns)
+        rated_sql = ' + '.join(f"COUNT(NULLIF({column}, 0))" for column in score_columns)
+        where_sql = "technicien_id IS NOT NULL"
+        params = []
+        if technician_ids is not None:
+            where_sql = "technicien_id = ANY(%s)"
+            params.append(list(technician_ids))
+        self.env.cr.execute(f"""
+            SELECT technicien_id, COUNT(*), {averages_sql},
+                   ({total_sql})::float / NULLIF({rated_sql}, 0)
+              FROM pv_evaluation
+             WHERE {where_sql}
+             GROUP BY technicien_id
+        """, params)
+
+        scores = {}
+        for row in self.env.cr.fetchall():
+            technician_id, count, overall = row[0], row[1], row[-1]
+            averages = dict(zip(TECHNICIAN_SCORE_FIELDS, row[2:-1]))
+            labels = {rating_field: label for rating_field, (_score, label) in TECHNICIAN_SCORE_FIELDS.items()}
+            scores[technician_id] = {
+                'count': count,
+                'averages': averages,
+                'overall': overall,
+                'overall_rating': self._get_overall_rating(overall),
+                'strengths': [labels[field] for field, avg in averages.items() if avg is not None and avg > 3.5],
+                'weak_areas': [labels[field] for field, avg in averages.items() if avg is not None and avg < 2.5],
+            }
+        return scores
 
-        # FIX: After creation, trigger recompute of evaluation count for technician
-        if result.technicien_id:
-            result.technicien_id._compute_evaluation_count()
+    @api.model
+    def _get_overall_rating(self, overall):
+        if overall is None:
+            return 'average'
+        if overall >= 3.5:
+            return 'excellent'
+        if overall >= 2.5:
+            return 'good'
+        if overall >= 1.5:
+            return 'average'
+        return 'needs_improvement'
 
-        return result
+    @api.model
+    def _rank_technicians(self, technician_ids=None):
+        """Classement des techniciens par score global décroissant: [(id du technicien, scores)]"""
+        scores = self._get_technician_scores(technician_ids)
+        return sorted(scores.items(), key=lambda item: (item[1]['overall'] is None, -(item[1]['overall'] or 0),
+                                                        item[0]))
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        # Références réservées en un bloc pour tout le lot
+        self.env['pv.sequence.service']._assign(vals_list, 'name', 'pv.evaluation.sequence', 'New')
+        records = super(Evaluation, self).create(vals_list)
+        # Compteur non stocké: oublié du cache, recalculé à la prochaine lecture seulement
+        self.env['hr.employee'].invalidate_model(['evaluation_count'])
+        return records
 
     def write(self, vals):
         result = super(Evaluation, self).write(vals)
-
-        # FIX: If technician changed, recompute counts for both old and new technicians
         if 'technicien_id' in vals or 'intervention_id' in vals:
-            for record in self:
-                if record.technicien_id:
-                    record.technicien_id._compute_evaluation_count()
-
+            self.env['hr.employee'].invalidate_model(['evaluation_count'])
         return result
 
     def unlink(self):
-        # FIX: Before deletion, remember technicians to update their counts
-        technicians_to_update = self.mapped('technicien_id')
         result = super(Evaluation, self).unlink()
-
-        # Update counts after deletion
-        for technician in technicians_to_update:
-            if technician.exists():  # Check if technician still exists
-                technician._compute_evaluation_count()
-
+        self.env['hr.employee'].invalidate_model(['evaluation_count'])
         return result
 
     @api.onchange('client_id')
@@ -167,15 +245,19 @@ class Evaluation(models.Model):
         return {'domain': {'intervention_id': [('installation_id', '=', self.installation_id.id)]}}
 
     # Action methods for state changes
+    @instrumented('action')
     def action_draft(self):
         self.write({'state': 'draft'})
 
+    @instrumented('action')
     def action_in_progress(self):
         self.write({'state': 'in_progress'})
 
+    @instrumented('action')
     def action_done(self):
         self.write({'state': 'done'})
 
+    @instrumented('action')
     def action_cancel(self):
         self.write({'state': 'canceled'})
 
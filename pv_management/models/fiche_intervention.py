@@ -1,4 +1,5 @@
-from odoo import models, fields, api
+from odoo import models, fields, api, tools
+from .pv_perf_metric import instrumented
 
 
 class AgendaInterventionLine(models.Model):
@@ -17,9 +18,7 @@ class FicheIntervention(models.Model):
     evaluation_ids = fields.One2many('pv.evaluation', 'intervention_id', string='Evaluations')
     evaluation_count = fields.Integer(compute='_compute_evaluation_count', string='Evaluation Count')
 
-    name = fields.Char(string='Référence', required=True, copy=False, readonly=True,
-                       default=lambda self: self.env['ir.sequence'].next_by_code(
-                           'fiche.intervention.sequence') or 'Nouveau')
+    name = fields.Char(string='Référence', required=True, copy=False, readonly=True, default='Nouveau')
     # Type d'intervention (new field)
     type_intervention = fields.Selection([
         ('maintenance', 'Maintenance'),
@@ -33,7 +32,7 @@ class FicheIntervention(models.Model):
     agenda_line_ids = fields.One2many('agenda.intervention.line', 'fiche_intervention_id', string='Agenda', help="Programme prévu pour l'intervention")
     installation_id = fields.Many2one('pv.installation', string='Installation', readonly=True)
     adresse = fields.Char(string='Adresse', readonly=True)
-    reclamation_id = fields.Many2one('reclamation', string='Réclamation associée', readonly=True)
+    reclamation_id = fields.Many2one('reclamation', string='Réclamation associée', readonly=True, index=True)
     code_alarm_id = fields.Char(string='Code Alarme' , readonly=True)
 
 
@@ -57,9 +56,25 @@ class FicheIntervention(models.Model):
     intervention_text = fields.Text(string='Bilan d\'intervention',
                                     help="Bilan final de l'intervention après fermeture")
 
+    def init(self):
+        # Première intervention d'une réclamation (ORDER BY id LIMIT 1) et filtres par période
+        tools.create_index(self._cr, 'fiche_intervention_reclamation_id_id_idx', self._table,
+                           ['reclamation_id', 'id'])
+        tools.create_index(self._cr, 'fiche_intervention_create_date_idx', self._table, ['create_date'])
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        self.env['pv.sequence.service']._assign(vals_list, 'name', 'fiche.intervention.sequence', 'Nouveau')
+        return super(FicheIntervention, self).create(vals_list)
+
+    @instrumented('compute')
     def _compute_evaluation_count(self):
+        # Une requête groupée pour tout le recordset
+        groups = self.env['pv.evaluation']._read_group(
+            [('intervention_id', 'in', self.ids)], ['intervention_id'], ['intervention_id'])
+        counts = {group['intervention_id'][0]: group['intervention_id_count'] for group in groups}
         for rec in self:
-            rec.evaluation_count = self.env['pv.evaluation'].search_count([('intervention_id', '=', rec.id)])
+            rec.evaluation_count = counts.get(rec.id, 0)
 
     def action_view_evaluations(self):
         self.ensure_one()
@@ -85,9 +100,13 @@ class FicheIntervention(models.Model):
                 'default_installation_id': self.installation_id.id,
             }
         }
+    @instrumented('compute')
     def _compute_reponse_count(self):
+        groups = self.env['fiche.reponse']._read_group(
+            [('intervention_id', 'in', self.ids)], ['intervention_id'], ['intervention_id'])
+        counts = {group['intervention_id'][0]: group['intervention_id_count'] for group in groups}
         for rec in self:
-            rec.reponse_count = self.env['fiche.reponse'].search_count([('intervention_id', '=', rec.id)])
+            rec.reponse_count = counts.get(rec.id, 0)
 
     def action_view_reponses(self):
         self.ensure_one()
@@ -129,11 +148,14 @@ class FicheIntervention(models.Model):
         }
 
     # Add state change methods
+    @instrumented('action')
     def action_draft(self):
         self.write({'state': 'draft'})
 
+    @instrumented('action')
     def action_in_progress(self):
         self.write({'state': 'in_progress'})
 
+    @instrumented('action')
     def action_closed(self):
         self.write({'state': 'closed'})
\ No newline at end of file
@@ -1,6 +1,22 @@
 # Update pv_management/models/hr_employee.py
 
 from odoo import models, fields, api, _
+from odoo.exceptions import UserError
+import json
+import logging
+import operator
+from .pv_perf_metric import instrumented
+
+_logger = logging.getLogger(__name__)
+
+COUNT_OPERATORS = {
+    '=': operator.eq,
+    '!=': operator.ne,
+    '<': operator.lt,
+    '<=': operator.le,
+    '>': operator.gt,
+    '>=': operator.ge,
+}
 
 
 class HrEmployee(models.Model):
@@ -9,6 +25,10 @@ class HrEmployee(models.Model):
     # Add fields to store AI analysis
     last_ai_analysis_date = fields.Datetime(string='Dernière Analyse IA', readonly=True)
     ai_analysis_html = fields.Html(string='Analyse IA Performance', readonly=True)
+    # Analyse structurée (JSON, sans le HTML): base des analyses incrémentales suivantes
+    ai_analysis_data = fields.Text(string='Analyse IA (JSON)', readonly=True, copy=False)
+    # Évaluations couvertes par cette analyse: {id d'évaluation: write_date} (JSON)
+    ai_analyzed_evaluations = fields.Text(string='Évaluations analysées (JSON)', readonly=True, copy=False)
     performance_rating = fields.Selection([
         ('excellent', 'Excellent'),
         ('good', 'Bon'),
@@ -16,74 +36,256 @@ class HrEmployee(models.Model):
         ('needs_improvement', 'À améliorer')
     ], string='Évaluation IA', readonly=True)
 
-    # Count evaluations - FIX: Remove depends and store=True, make it compute-only
+    # Asynchronous analysis tracking
+    ai_job_id = fields.Many2one('pv.ai.job', string='Dernière tâche IA', readonly=True, copy=False)
+    ai_job_state = fields.Selection(related='ai_job_id.state', string='État de l\'analyse')
+    ai_job_progress = fields.Integer(related='ai_job_id.progress', string='Progression')
+    ai_job_error = fields.Text(related='ai_job_id.error_message', string='Erreur d\'analyse')
+
+    # Count evaluations - compute-only, searchable through _search_evaluation_count
     evaluation_count = fields.Integer(
         string='Nombre d\'évaluations',
-        compute='_compute_evaluation_count'
+        compute='_compute_evaluation_count',
+        search='_search_evaluation_count'
     )
 
-    # FIX: Correct the compute method
+    @api.model
+    def _get_evaluation_counts(self, employee_ids=None):
+        """{id du technicien: nombre d'évaluations} en une requête groupée"""
+        domain = [('technicien_id', '!=', False)]
+        if employee_ids is not None:
+            domain = [('technicien_id', 'in', employee_ids)]
+        groups = self.env['pv.evaluation']._read_group(domain, ['technicien_id'], ['technicien_id'])
+        return {group['technicien_id'][0]: group['technicien_id_count'] for group in groups}
+
+    @instrumented('compute')
     def _compute_evaluation_count(self):
+        counts = self._get_evaluation_counts(self.ids)
         for employee in self:
-            # Search for evaluations where this employee is the technician
-            count = self.env['pv.evaluation'].search_count([
-                ('technicien_id', '=', employee.id)
-            ])
-            employee.evaluation_count = count
+            employee.evaluation_count = counts.get(employee.id, 0)
 
+    def _search_evaluation_count(self, operator, value):
+        if operator not in COUNT_OPERATORS or not isinstance(value, int):
+            raise UserError(_('Opération non supportée sur le nombre d\'évaluations.'))
+        compare = COUNT_OPERATORS[operator]
+        counts = self._get_evaluation_counts()
+        if compare(0, value):
+            # Les techniciens sans évaluation correspondent: exclure ceux qui ne correspondent pas
+            return [('id', 'not in', [emp_id for emp_id, count in counts.items() if not compare(count, value)])]
+        return [('id', 'in', [emp_id for emp_id, count in counts.items() if compare(count, value)])]
+
+    @instrumented('action')
     def action_analyze_performance_ai(self):
         """
-        Launch AI analysis for this technician
+        Queue the AI analysis for this technician and return immediately
         """
         self.ensure_one()
 
-        try:
-            openai_service = self.env['pv.management.openai.service']
-            result = openai_service.analyze_technician_performance(self.id)
-
-            if result['success']:
-                analysis = result['analysis']
-
-                # Update technician record with analysis
-                self.write({
-                    'last_ai_analysis_date': fields.Datetime.now(),
-                    'ai_analysis_html': analysis.get('html_content', ''),
-                    'performance_rating': analysis.get('overall_rating', 'average')
-                })
-
-                # Show success message and reload form
-                return {
-                    'type': 'ir.actions.client',
-                    'tag': 'reload',
-                    'params': {
-                        'title': _('Analyse Terminée'),
-                        'message': _('L\'analyse IA a été générée avec succès.'),
-                    }
+        if not self.evaluation_count:
+            return {
+                'type': 'ir.actions.client',
+                'tag': 'display_notification',
+                'params': {
+                    'title': _('Erreur'),
+                    'message': _('Aucune évaluation trouvée pour ce technicien'),
+                    'sticky': True,
+                    'type': 'warning'
                 }
-            else:
-                return {
-                    'type': 'ir.actions.client',
-                    'tag': 'display_notification',
-                    'params': {
-                        'title': _('Erreur'),
-                        'message': result.get('message', 'Erreur inconnue'),
-                        'sticky': True,
-                        'type': 'warning'
-                    }
+            }
+
+        force_refresh = self.env.context.get('pv_ai_force_refresh', False)
+        if not force_refresh and self._is_ai_analysis_up_to_date():
+            return {
+                'type': 'ir.actions.client',
+                'tag': 'display_notification',
+                'params': {
+                    'title': _('Analyse à jour'),
+                    'message': _('Aucune évaluation nouvelle ou modifiée depuis la dernière analyse IA.'),
+                    'sticky': False,
+                    'type': 'info',
                 }
+            }
 
-        except Exception as e:
+        _job, created = self.env['pv.ai.job']._enqueue(
+            'technician_analysis', self, force_refresh=force_refresh)
+        if not created:
             return {
                 'type': 'ir.actions.client',
                 'tag': 'display_notification',
                 'params': {
-                    'title': _('Erreur Technique'),
-                    'message': f'Une erreur s\'est produite: {str(e)}',
-                    'sticky': True,
-                    'type': 'danger'
+                    'title': _('Analyse déjà en cours'),
+                    'message': _('Une analyse IA de ce technicien est déjà en cours. '
+                                 'Vous serez notifié dès qu\'elle sera terminée.'),
+                    'sticky': False,
+                    'type': 'info',
+                    'next': {'type': 'ir.actions.client', 'tag': 'reload'},
                 }
             }
 
+        return {
+            'type': 'ir.actions.client',
+            'tag': 'display_notification',
+            'params': {
+                'title': _('Analyse en cours'),
+                'message': _('L\'analyse IA a été lancée. Vous serez notifié dès qu\'elle sera terminée.'),
+                'sticky': False,
+                'type': 'info',
+                'next': {'type': 'ir.actions.client', 'tag': 'reload'},
+            }
+        }
+
+    def _run_performance_analysis(self, force_refresh=False):
+        """
+        Run the AI analysis (called by the pv.ai.job runner)
+        """
+        self.ensure_one()
+        openai_service = self.env['pv.management.openai.service']
+        # Incrémentale: analyse précédente + évaluations nouvelles ou modifiées depuis
+        previous_analysis = None if force_refresh else self._get_previous_ai_analysis()
+        versions, changed_ids = self._get_ai_evaluation_versions().get(self.id, ({}, set()))
+        result = openai_service.analyze_technician_performance(
+            self.id, force_refresh=force_refresh, previous_analysis=previous_analysis,
+            evaluation_ids=changed_ids if previous_analysis else None)
+
+        if not result['success']:
+            raise UserError(result.get('message', _('Erreur inconnue')))
+        if result.get('unchanged'):
+            return _('Aucune nouvelle évaluation: l\'analyse IA précédente est toujours à jour.')
+
+        self._apply_ai_analysis(result['analysis'], versions)
+        return _('L\'analyse IA a été générée avec succès.')
+
+    def _get_ai_evaluation_versions(self):
+        """{id du technicien: (versions, ids modifiés)} des techniciens de self, en une requête
+
+        versions: {id d'évaluation: write_date} de toutes les évaluations visibles, enregistrées avec
+        l'analyse qui les couvre (_apply_ai_analysis). ids modifiés: évaluations nouvelles ou modifiées
+        depuis la dernière analyse, c'est-à-dire absentes de ses versions ou de write_date différente.
+        La comparaison porte sur chaque évaluation et non sur une date de reprise: une évaluation
+        validée après l'analyse par une transaction plus ancienne n'est pas perdue, et une évaluation
+        déjà analysée n'est jamais renvoyée. Les write_date sont comparées sous la forme JSON produite
+        par PostgreSQL, enregistrée telle quelle.
+        """
+        if not self:
+            return {}
+        self.env['pv.evaluation'].flush_model(['technicien_id', 'write_date'])
+        self.flush_model(['ai_analyzed_evaluations'])
+        self.env.cr.execute("""
+            SELECT evaluation.technicien_id, evaluation.id, to_jsonb(evaluation.write_date) #>> '{}',
+                   (employee.ai_analyzed_evaluations::jsonb -> evaluation.id::text)
+                       IS DISTINCT FROM to_jsonb(evaluation.write_date)
+              FROM pv_evaluation evaluation
+              JOIN hr_employee employee ON employee.id = evaluation.technicien_id
+             WHERE evaluation.technicien_id IN %s
+        """, (tuple(self.ids),))
+        result = {}
+        for technician_id, evaluation_id, write_date, changed in self.env.cr.fetchall():
+            versions, changed_ids = result.setdefault(technician_id, ({}, set()))
+            versions[str(evaluation_id)] = write_date
+            if changed:
+                changed_ids.add(evaluation_id)
+        return result
+
+    def _apply_ai_analysis(self, analysis, versions):
+        """Update technician record with analysis
+
+        versions: évaluations couvertes par l'analyse (voir _get_ai_evaluation_versions)
+        """
+        self.ensure_one()
+        self.write({
+            'last_ai_analysis_date': fields.Datetime.now(),
+            'ai_analyzed_evaluations': json.dumps(versions),
+            'ai_analysis_html': analysis.get('html_content', ''),
+            'ai_analysis_data': json.dumps({key: value for key, value in analysis.items() if key != 'html_content'},
+                                           ensure_ascii=False),
+            'performance_rating': analysis.get('overall_rating', 'average')
+        })
+
+    def _get_previous_ai_analysis(self):
+        """Analyse structurée précédente, None si absente, illisible ou sans évaluations couvertes"""
+        self.ensure_one()
+        if not self.ai_analysis_data or not self.ai_analyzed_evaluations:
+            return None
+        try:
+            return json.loads(self.ai_analysis_data)
+        except ValueError:
+            return None
+
+    def _is_ai_analysis_up_to_date(self):
+        """Vrai si aucune évaluation n'a été créée ou modifiée depuis la dernière analyse structurée"""
+        self.ensure_one()
+        if not self._get_previous_ai_analysis():
+            return False
+        return not self._get_ai_evaluation_versions().get(self.id, ({}, set()))[1]
+
+    # ========== ANALYSE EN MASSE ==========
+
+    @api.model
+    def _get_technicians_to_analyze(self, limit=None):
+        """Techniciens dont une évaluation a été créée ou modifiée depuis leur dernière analyse"""
+        self.env['pv.evaluation'].flush_model(['technicien_id', 'write_date'])
+        self.flush_model(['last_ai_analysis_date', 'ai_analyzed_evaluations'])
+        # Même critère que _get_ai_evaluation_versions
+        self.env.cr.execute("""
+            SELECT employee.id
+              FROM hr_employee employee
+             WHERE EXISTS (SELECT 1
+                             FROM pv_evaluation evaluation
+                            WHERE evaluation.technicien_id = employee.id
+                              AND (employee.ai_analyzed_evaluations::jsonb -> evaluation.id::text)
+                                      IS DISTINCT FROM to_jsonb(evaluation.write_date))
+             ORDER BY employee.last_ai_analysis_date ASC NULLS FIRST, employee.id
+             LIMIT %s
+        """, (limit,))
+        return self.browse([row[0] for row in self.env.cr.fetchall()])
+
+    def _bulk_analyze_performance(self, force_refresh=False, batch_size=50, max_workers=None, commit=False):
+        """Analyse la performance de tous les techniciens de self.
+
+        Les évaluations d'un lot sont chargées en une recherche; les appels OpenAI d'un lot
+        partent en parallèle (pool de threads borné) et les résultats sont écrits depuis le
+        curseur principal, lot par lot (voir pv.ai.job._run_in_batches).
+        Retourne les statistiques du traitement.
+        """
+        openai_service = self.env['pv.management.openai.service']
+        if max_workers is None:
+            max_workers = openai_service._get_int_param('pv_management.ai_bulk_max_workers', 4)
+
+        def analyze_batch(batch):
+            batch_stats = dict.fromkeys(('ai', 'fallback', 'unchanged', 'failed'), 0)
+            versions_by_id = batch._get_ai_evaluation_versions()
+            requests_by_id = {}
+            for employee in batch:
+                previous_analysis = None if force_refresh else employee._get_previous_ai_analysis()
+                changed_ids = versions_by_id.get(employee.id, ({}, set()))[1]
+                requests_by_id[employee.id] = (previous_analysis, changed_ids if previous_analysis else None)
+            results = openai_service.analyze_technicians_performance(
+                requests_by_id, force_refresh=force_refresh, max_workers=max_workers)
+            for employee in batch:
+                result = results.get(employee.id) or {}
+                if result.get('unchanged'):
+                    batch_stats['unchanged'] += 1
+                elif not result.get('success'):
+                    batch_stats['failed'] += 1
+                else:
+                    employee._apply_ai_analysis(result['analysis'], versions_by_id[employee.id][0])
+                    batch_stats['fallback' if result.get('is_fallback') else 'ai'] += 1
+            return batch_stats
+
+        stats = {'total': len(self), 'ai': 0, 'fallback': 0, 'unchanged': 0, 'skipped': 0, 'failed': 0}
+        self.env['pv.ai.job']._run_in_batches(self, analyze_batch, stats, batch_size=batch_size, commit=commit)
+        _logger.info(
+            f"Analyse des techniciens: {stats['total']} techniciens en {stats['duration']:.1f}s "
+            f"({stats['throughput']:.1f} analyses/min) - IA: {stats['ai']}, secours: {stats['fallback']}, "
+            f"inchangées: {stats['unchanged']}, ignorées (analyse en cours): {stats['skipped']}, "
+            f"échecs: {stats['failed']}")
+        return stats
+
+    @api.model
+    def _cron_analyze_performance(self, limit=1000):
+        """Cron: analyse les techniciens ayant de nouvelles évaluations depuis leur dernière analyse"""
+        return self._get_technicians_to_analyze(limit=limit)._bulk_analyze_performance(commit=True)
+
     def action_view_evaluations(self):
         """
         View all evaluations for this technician
@@ -98,6 +300,7 @@ class HrEmployee(models.Model):
             'context': {'default_technicien_id': self.id}
         }
 
+    @instrumented('action')
     def action_test_ai_simple(self):
         """
         Simple test function to verify AI analysis is working
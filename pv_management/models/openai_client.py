@@ -0,0 +1,249 @@
+"""Client HTTP partagé pour l'API OpenAI.
+
+Une session requests par processus (worker Odoo) réutilise les connexions
+TCP/TLS. Les erreurs transitoires (429, 5xx, coupures réseau) sont rejouées
+avec un backoff exponentiel à jitter, en respectant l'en-tête Retry-After.
+Le mode streaming (server-sent events) ne rejoue que les erreurs survenues
+avant le premier fragment de la réponse.
+
+Ce module n'utilise ni l'environnement ni le curseur Odoo: il peut être appelé
+depuis des threads.
+"""
+import json
+import logging
+import os
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+import requests
+from requests.adapters import HTTPAdapter
+
+_logger = logging.getLogger(__name__)
+
+OPENAI_API_URL = "https://api.openai.com/v1"
+RETRYABLE_STATUS_CODES = frozenset({408, 409, 429, 500, 502, 503, 504})
+
+DEFAULT_CONNECT_TIMEOUT = 5.0
+DEFAULT_READ_TIMEOUT = 60.0
+DEFAULT_MAX_RETRIES = 3
+DEFAULT_BACKOFF_BASE = 1.0
+DEFAULT_BACKOFF_MAX = 30.0
+DEFAULT_POOL_SIZE = 10
+
+_session = None
+_session_pid = None
+_session_lock = threading.Lock()
+
+
+def get_session(pool_size=DEFAULT_POOL_SIZE):
+    """Retourne la session keep-alive du processus courant.
+
+    La session est recréée après un fork pour ne jamais partager de socket
+    entre workers.
+    """
+    global _session, _session_pid
+    pid = os.getpid()
+    if _session is None or _session_pid != pid:
+        with _session_lock:
+            if _session is None or _session_pid != pid:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+                session.mount('https://', adapter)
+                _session = session
+                _session_pid = pid
+    return _session
+
+
+def _retry_after_seconds(response):
+    """Délai demandé par l'en-tête Retry-After (secondes ou date HTTP)"""
+    value = response.headers.get('Retry-After') if response is not None else None
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        retry_date = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_date.tzinfo is None:
+        retry_date = retry_date.replace(tzinfo=timezone.utc)
+    return max((retry_date - datetime.now(timezone.utc)).total_seconds(), 0.0)
+
+
+def _backoff_delay(attempt, base, maximum):
+    """Backoff exponentiel avec full jitter"""
+    return random.uniform(0, min(maximum, base * (2 ** attempt)))
+
+
+def request_with_retry(method, path, api_key, payload=None,
+                       connect_timeout=DEFAULT_CONNECT_TIMEOUT,
+                       read_timeout=DEFAULT_READ_TIMEOUT,
+                       max_retries=DEFAULT_MAX_RETRIES,
+                       backoff_base=DEFAULT_BACKOFF_BASE,
+                       backoff_max=DEFAULT_BACKOFF_MAX,
+                       stream=False):
+    """Envoie une requête à l'API OpenAI avec rejeu des erreurs transitoires.
+
+    Retourne (response, attempts): response est la dernière réponse HTTP reçue
+    (None si aucune), attempts la liste des tentatives avec leur latence:
+    [{'attempt': 1, 'status': 429, 'latency_ms': 812.4, 'error': None}, ...]
+    """
+    headers = {
+        "Content-Type": "application/json",
+        "Authorization": f"Bearer {api_key}"
+    }
+    url = f"{OPENAI_API_URL}{path}"
+    session = get_session()
+    attempts = []
+    response = None
+
+    for attempt in range(max_retries + 1):
+        started = time.monotonic()
+        error = None
+        response = None
+        try:
+            response = session.request(
+                method, url,
+                headers=headers,
+                json=payload,
+                timeout=(connect_timeout, read_timeout),
+                stream=stream,
+            )
+        except (requests.ConnectionError, requests.Timeout) as e:
+            error = str(e)
+        latency_ms = (time.monotonic() - started) * 1000
+        attempts.append({
+            'attempt': attempt + 1,
+            'status': response.status_code if response is not None else None,
+            'latency_ms': round(latency_ms, 1),
+            'error': error,
+        })
+        _logger.info(f"OpenAI {method} {path} tentative {attempt + 1}: "
+                     f"{response.status_code if response is not None else error} en {latency_ms:.0f} ms")
+
+        retryable = response is None or response.status_code in RETRYABLE_STATUS_CODES
+        if not retryable or attempt >= max_retries:
+            break
+
+        delay = _retry_after_seconds(response)
+        if delay is None:
+            delay = _backoff_delay(attempt, backoff_base, backoff_max)
+        delay = min(delay, backoff_max)
+        if response is not None:
+            response.close()
+        _logger.warning(f"OpenAI: nouvelle tentative dans {delay:.1f}s")
+        time.sleep(delay)
+
+    return response, attempts
+
+
+def chat_completion(api_key, payload, **options):
+    """Appel /chat/completions qui ne lève jamais d'exception.
+
+    Retourne un dict: content (texte de la réponse ou False), status (code HTTP),
+    attempts (voir request_with_retry), usage (bloc usage de l'API) et error.
+    """
+    result = {'content': False, 'status': None, 'attempts': [], 'usage': {}, 'error': None}
+    try:
+        response, attempts = request_with_retry('POST', '/chat/completions', api_key, payload=payload, **options)
+    except Exception as e:
+        result['error'] = str(e)
+        return result
+
+    result['attempts'] = attempts
+    if response is None:
+        result['error'] = attempts[-1]['error'] if attempts else 'Aucune réponse'
+        return result
+
+    result['status'] = response.status_code
+    if response.status_code != 200:
+        result['error'] = f"Erreur API OpenAI {response.status_code}: {response.text}"
+        return result
+
+    try:
+        data = response.json()
+    except ValueError as e:
+        result['error'] = f"Réponse JSON invalide: {str(e)}"
+        return result
+
+    choices = data.get('choices') or []
+    if not choices:
+        result['error'] = f"Format de réponse inattendu: {data}"
+        return result
+
+    result['content'] = choices[0]['message']['content']
+    result['usage'] = data.get('usage') or {}
+    return result
+
+
+def chat_completion_stream(api_key, payload, on_delta, **options):
+    """Appel /chat/completions en streaming (server-sent events) qui ne lève jamais d'exception.
+
+    on_delta(contenu) est appelé avec le texte reçu jusqu'ici à chaque fragment.
+    Retourne le même dict que chat_completion, plus first_token_ms (délai avant
+    le premier fragment, en ms).
+    """
+    result = {'content': False, 'status': None, 'attempts': [], 'usage': {}, 'error': None,
+              'first_token_ms': None}
+    payload = dict(payload, stream=True, stream_options={'include_usage': True})
+    started = time.monotonic()
+    try:
+        response, attempts = request_with_retry('POST', '/chat/completions', api_key, payload=payload,
+                                                stream=True, **options)
+    except Exception as e:
+        result['error'] = str(e)
+        return result
+
+    result['attempts'] = attempts
+    if response is None:
+        result['error'] = attempts[-1]['error'] if attempts else 'Aucune réponse'
+        return result
+
+    result['status'] = response.status_code
+    if response.status_code != 200:
+        result['error'] = f"Erreur API OpenAI {response.status_code}: {response.text}"
+        return result
+
+    body_started = time.monotonic()
+    # text/event-stream sans charset: requests décoderait en ISO-8859-1
+    response.encoding = 'utf-8'
+    content = ''
+    try:
+        with response:
+            for line in response.iter_lines(decode_unicode=True):
+                if not line or not line.startswith('data:'):
+                    continue
+                data = line[5:].strip()
+                if data == '[DONE]':
+                    break
+                chunk = json.loads(data)
+                if chunk.get('usage'):
+                    result['usage'] = chunk['usage']
+                for choice in chunk.get('choices') or []:
+                    delta = (choice.get('delta') or {}).get('content')
+                    if not delta:
+                        continue
+                    if result['first_token_ms'] is None:
+                        result['first_token_ms'] = round((time.monotonic() - started) * 1000, 1)
+                    content += delta
+                    try:
+                        on_delta(content)
+                    except Exception as e:
+                        _logger.warning(f"OpenAI: erreur du traitement d'un fragment: {str(e)}")
+    except (requests.RequestException, ValueError) as e:
+        result['error'] = f"Flux interrompu: {str(e)}"
+        return result
+    finally:
+        # La latence de la dernière tentative couvre tout le flux, pas seulement les en-têtes
+        attempts[-1]['latency_ms'] = round(attempts[-1]['latency_ms'] + (time.monotonic() - body_started) * 1000, 1)
+
+    if not content:
+        result['error'] = 'Réponse vide'
+        return result
+    result['content'] = content
+    return result
@@ -0,0 +1,146 @@
+"""Construction des prompts OpenAI sous budget de tokens.
+
+Un prompt est composé de sections fixes (données de l'enregistrement analysé)
+et de sections d'historique. Quand le budget est dépassé, l'historique est
+compacté: seuls les éléments les plus récents et les plus informatifs restent
+cités tels quels, les autres sont résumés par période (effectifs et
+distributions). Les sections fixes ne sont jamais tronquées.
+
+Ce module n'utilise ni l'environnement ni le curseur Odoo.
+"""
+import json
+import logging
+from collections import Counter, OrderedDict
+
+_logger = logging.getLogger(__name__)
+
+# Nombre moyen de caractères par token (estimation avant appel, corrigée par le bloc usage)
+CHARS_PER_TOKEN = 4
+
+DEFAULT_TOKEN_BUDGET = 6000
+
+
+def estimate_tokens(text):
+    """Estimation du nombre de tokens d'un texte (ou d'une structure JSON)"""
+    if not isinstance(text, str):
+        text = json.dumps(text, ensure_ascii=False)
+    return len(text) // CHARS_PER_TOKEN
+
+
+def format_distribution(values, labels=None):
+    """Distribution d'une liste de valeurs: 'excellent 4, good 2' (les plus fréquentes d'abord)"""
+    labels = labels or {}
+    counts = Counter(value for value in values if value)
+    return ', '.join(f"{labels.get(value, value)} {count}" for value, count in counts.most_common()) or 'n/a'
+
+
+class PromptBuilder:
+    """Assemble les messages système + utilisateur d'un appel sous un budget de tokens
+
+        builder = PromptBuilder(system_prompt, token_budget=6000)
+        builder.add_section('INFORMATIONS DE BASE', ['- Nom: ...'])
+        builder.add_history('ÉVALUATIONS', evaluations, render=..., period=..., summarize=..., keep=10)
+        builder.add_section(None, ['MISSION: ...'])
+        messages = builder.build()
+    """
+
+    def __init__(self, system_prompt, token_budget=DEFAULT_TOKEN_BUDGET):
+        self.system_prompt = system_prompt.strip()
+        self.token_budget = token_budget
+        self.sections = []
+        self.stats = {}
+
+    def add_section(self, title, lines):
+        """Section fixe, toujours envoyée en entier"""
+        self.sections.append({'title': title, 'lines': [line for line in lines if line is not None]})
+        return self
+
+    def add_history(self, title, items, render, period, summarize, keep=10, informativeness=None):
+        """Section d'historique compactable
+
+        items: éléments du plus récent au plus ancien.
+        render(item): ligne (ou bloc) citant l'élément tel quel.
+        period(item): clé de la période de regroupement (ex. '2024-T1').
+        summarize(period, items): ligne résumant les éléments compactés d'une période.
+        keep: nombre maximal d'éléments cités tels quels. La moitié est prise parmi les plus
+        récents, le reste parmi les plus informatifs (informativeness(item), plus grand d'abord).
+        """
+        self.sections.append({
+            'title': title,
+            'items': list(items),
+            'render': render,
+            'period': period,
+            'summarize': summarize,
+            'keep': keep,
+            'informativeness': informativeness,
+        })
+        return self
+
+    def _select_verbatim(self, section, keep):
+        items = section['items']
+        if keep >= len(items):
+            return set(range(len(items)))
+        recent = (keep + 1) // 2
+        selected = set(range(recent))
+        if section['informativeness'] and keep > recent:
+            older = sorted(range(recent, len(items)),
+                           key=lambda index: (-section['informativeness'](items[index]), index))
+            selected.update(older[:keep - recent])
+        else:
+            selected.update(range(recent, keep))
+        return selected
+
+    def _render_history(self, section, keep, max_periods=None):
+        items = section['items']
+        verbatim = self._select_verbatim(section, keep)
+        lines = [section['render'](items[index]) for index in sorted(verbatim)]
+        compacted = OrderedDict()
+        for index, item in enumerate(items):
+            if index not in verbatim:
+                compacted.setdefault(section['period'](item), []).append(item)
+        if compacted:
+            lines.append(f"Historique plus ancien résumé par période ({sum(map(len, compacted.values()))} éléments):")
+            periods = list(compacted.items())
+            if max_periods is not None and len(periods) > max_periods:
+                omitted = periods[max_periods:]
+                periods = periods[:max_periods]
+                lines.extend(section['summarize'](key, period_items) for key, period_items in periods)
+                lines.append(f"- {sum(len(period_items) for _key, period_items in omitted)} éléments plus "
+                             f"anciens sur {len(omitted)} période(s) non détaillés")
+            else:
+                lines.extend(section['summarize'](key, period_items) for key, period_items in periods)
+        return lines, len(verbatim), len(items) - len(verbatim)
+
+    def _render(self, keep_ratio=1.0, max_periods=None):
+        blocks = []
+        self.stats = {'verbatim': 0, 'compacted': 0}
+        for section in self.sections:
+            if 'items' in section:
+                keep = int(section['keep'] * keep_ratio)
+                lines, verbatim_count, compacted_count = self._render_history(section, keep, max_periods)
+                self.stats['verbatim'] += verbatim_count
+                self.stats['compacted'] += compacted_count
+            else:
+                lines = section['lines']
+            block = '\n'.join(lines)
+            if section['title']:
+                block = f"=== {section['title']} ===\n{block}"
+            blocks.append(block)
+        return '\n\n'.join(blocks)
+
+    def build(self):
+        """Messages de l'appel: réduit les citations puis le détail des périodes jusqu'au budget"""
+        system_tokens = estimate_tokens(self.system_prompt)
+        user_prompt = None
+        for keep_ratio, max_periods in ((1.0, None), (0.5, None), (0.25, None), (0.25, 12), (0.0, 6)):
+            user_prompt = self._render(keep_ratio, max_periods)
+            if system_tokens + estimate_tokens(user_prompt) <= self.token_budget:
+                break
+        self.stats['tokens'] = system_tokens + estimate_tokens(user_prompt)
+        if self.stats['tokens'] > self.token_budget:
+            _logger.warning(f"Prompt au-delà du budget après compactage: {self.stats['tokens']} / "
+                            f"{self.token_budget} tokens")
+        return [
+            {"role": "system", "content": self.system_prompt},
+            {"role": "user", "content": user_prompt},
+        ]
@@ -0,0 +1,117 @@
+from odoo import models, fields, api
+from odoo.tools.lru import LRU
+import hashlib
+import json
+import logging
+
+_logger = logging.getLogger(__name__)
+
+# HTML rendu des plans, borné et propre à ce cache (l'ormcache du registre est partagé par tous
+# les modèles: un rendu par couple plan/en-tête d'alarme en évincerait les autres entrées)
+_HTML_CACHE = LRU(512)
+
+SEVERITY_COLORS = {
+    'low': '#28a745',
+    'medium': '#ffc107',
+    'high': '#fd7e14',
+    'critical': '#dc3545'
+}
+
+PLAN_SECTIONS = [
+    ('🛡️ Mesures Préventives', 'prevention_measures', '#e8f5e8'),
+    ('📊 Points de Surveillance', 'monitoring_points', '#e3f2fd'),
+    ('🔺 Critères d\'Escalade', 'escalation_criteria', '#ffebee'),
+    ('📚 Références Documentation', 'documentation_references', '#fff8e1'),
+    ('🔄 Actions de Suivi', 'follow_up_actions', '#f1f8e9')
+]
+
+
+class PVAIActionPlan(models.Model):
+    _name = 'pv.ai.action.plan'
+    _description = 'Plan d\'action IA (JSON, stockage par empreinte)'
+
+    content_hash = fields.Char(string='Empreinte', required=True, readonly=True)
+    data = fields.Text(string='Plan (JSON)', required=True, readonly=True)
+    is_fallback = fields.Boolean(string='Plan de secours', readonly=True)
+
+    _sql_constraints = [
+        ('content_hash_unique', 'unique(content_hash)', 'Un plan identique existe déjà.'),
+    ]
+
+    @api.model
+    def _get_or_create(self, plan):
+        """Retourne l'enregistrement du plan, créé seulement si aucun plan identique n'existe"""
+        plan = {key: value for key, value in plan.items() if key != 'html_content'}
+        data = json.dumps(plan, sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+        content_hash = hashlib.sha256(data.encode('utf-8')).hexdigest()
+        self.env.cr.execute("""
+            INSERT INTO pv_ai_action_plan (content_hash, data, is_fallback,
+                                           create_uid, create_date, write_uid, write_date)
+            VALUES (%(hash)s, %(data)s, %(is_fallback)s,
+                    %(uid)s, (now() AT TIME ZONE 'UTC'), %(uid)s, (now() AT TIME ZONE 'UTC'))
+            ON CONFLICT (content_hash) DO NOTHING
+        """, {'hash': content_hash, 'data': data, 'is_fallback': bool(plan.get('is_fallback')),
+              'uid': self.env.uid})
+        self.env.cr.execute("SELECT id FROM pv_ai_action_plan WHERE content_hash = %s", (content_hash,))
+        return self.browse(self.env.cr.fetchone()[0])
+
+    def _get_plan(self):
+        self.ensure_one()
+        return json.loads(self.data)
+
+    def _render_html_cached(self, header):
+        """HTML du plan, mis en cache par empreinte (contenu immuable) et en-tête d'alarme
+
+        header: tuple (code_alarm, name, description, severity, occurrence_count, generated_on)
+        La séquence du registre fait partie de la clé: une mise à jour du module (template) invalide les rendus.
+        """
+        self.ensure_one()
+        key = (self.env.cr.dbname, self.pool.registry_sequence, self.content_hash, header, self.env.lang)
+        html = _HTML_CACHE.get(key)
+        if html is None:
+            html = _HTML_CACHE[key] = self._render_html(header)
+        return html
+
+    def _render_html(self, header):
+        code_alarm, name, description, severity, occurrence_count, generated_on = header
+        alarm_data = {
+            'code_alarm': code_alarm,
+            'name': name,
+            'description': description,
+            'severity': severity,
+            'occurrence_count': occurrence_count,
+        }
+        plan = self._get_plan()
+        if plan.get('is_fallback'):
+            plan = self.env['pv.management.openai.service']._fill_plan_placeholders(plan, alarm_data)
+        return self._render_plan_html(plan, alarm_data, generated_on)
+
+    @api.model
+    def _render_plan_html(self, plan, alarm_data, generated_on):
+        """Rend un plan d'action avec le template QWeb précompilé"""
+        steps = plan.get('action_steps', [])
+        severity = plan.get('severity', 'medium')
+        values = {
+            'plan': plan,
+            'alarm_data': alarm_data,
+            'severity': severity,
+            'severity_color': SEVERITY_COLORS.get(severity, '#ffc107'),
+            'confidence_score': plan.get('confidence_score', 70),
+            'total_cost': sum(step.get('cost_estimate', 0) or 0 for step in steps),
+            'total_time': sum(step.get('estimated_time', 0) or 0 for step in steps),
+            'sections': [(title, plan.get(key), bg_color) for title, key, bg_color in PLAN_SECTIONS
+                         if plan.get(key)],
+            'generated_on': generated_on.strftime('%d/%m/%Y à %H:%M') if generated_on else '',
+        }
+        return str(self.env['ir.qweb']._render('pv_management.action_plan_template', values))
+
+    @api.autovacuum
+    def _gc_orphan_plans(self):
+        """Supprime les plans qui ne sont plus référencés par aucune alarme"""
+        self.env.cr.execute("""
+            DELETE FROM pv_ai_action_plan plan
+             WHERE NOT EXISTS (SELECT 1 FROM alarm_management am WHERE am.action_plan_id = plan.id)
+               AND plan.create_date < (now() AT TIME ZONE 'UTC') - interval '1 day'
+        """)
+        if self.env.cr.rowcount:
+            _logger.info(f"Plans d'action: {self.env.cr.rowcount} plan(s) orphelin(s) supprimé(s)")
@@ -0,0 +1,152 @@
+from odoo import models, fields, api
+import hashlib
+import json
+import logging
+from .committed_cursor import committed_cursor
+
+_logger = logging.getLogger(__name__)
+
+# Compteurs propres au worker courant (les hits persistants sont portés par chaque entrée)
+_CACHE_STATS = {'hits': 0, 'misses': 0}
+
+
+class PVAICache(models.Model):
+    _name = 'pv.ai.cache'
+    _description = 'Cache des réponses OpenAI'
+    _order = 'last_access desc'
+
+    key = fields.Char(string='Clé', required=True, readonly=True)
+    model = fields.Char(string='Modèle', readonly=True)
+    response = fields.Text(string='Réponse', readonly=True)
+    expires_at = fields.Datetime(string='Expire le', required=True, index=True, readonly=True)
+    last_access = fields.Datetime(string='Dernier accès', index=True, readonly=True)
+    hit_count = fields.Integer(string='Nombre de hits', readonly=True)
+
+    _sql_constraints = [
+        ('key_unique', 'unique(key)', 'La clé de cache doit être unique.'),
+    ]
+
+    @api.model
+    def _make_key(self, messages, model, temperature):
+        """Empreinte SHA-256 de (modèle, température, messages)"""
+        payload = json.dumps([model, temperature, messages], sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    @api.model
+    def _get_ttl(self):
+        """Durée de vie des entrées en secondes (0 désactive le cache)"""
+        return self.env['pv.management.openai.service']._get_int_param('pv_management.ai_cache_duration', 3600)
+
+    @api.model
+    def _get_max_entries(self):
+        return self.env['pv.management.openai.service']._get_int_param('pv_management.ai_cache_max_entries', 1000)
+
+    @api.model
+    def _lookup(self, key):
+        """Retourne la réponse en cache si elle est encore valide, sinon False.
+
+        Lecture simple, sans verrou: les lecteurs d'une même clé ne s'attendent jamais.
+        La mise à jour LRU (dernier accès, compteur) est faite au mieux par _touch.
+        """
+        if self._get_ttl() <= 0:
+            return False
+        self.env.cr.execute("""
+            SELECT id, response FROM pv_ai_cache
+             WHERE key = %s
+               AND expires_at > (now() AT TIME ZONE 'UTC')
+        """, (key,))
+        row = self.env.cr.fetchone()
+        if row:
+            _CACHE_STATS['hits'] += 1
+            self._touch(row[0])
+            return row[1]
+        _CACHE_STATS['misses'] += 1
+        return False
+
+    @api.model
+    def _touch(self, entry_id):
+        """Mise à jour LRU d'une entrée lue, au mieux
+
+        Curseur séparé validé immédiatement: la transaction de l'appelant (souvent une tâche ou
+        un lot longs) ne garde pas de verrou sur l'entrée. Une entrée déjà verrouillée par un
+        autre worker est ignorée (SKIP LOCKED): le compteur de hits est approximatif.
+        """
+        try:
+            with committed_cursor(self.pool) as cr:
+                cr.execute("""
+                    UPDATE pv_ai_cache
+                       SET hit_count = hit_count + 1,
+                           last_access = (now() AT TIME ZONE 'UTC')
+                     WHERE id = (SELECT id FROM pv_ai_cache WHERE id = %s FOR UPDATE SKIP LOCKED)
+                """, (entry_id,))
+        except Exception as e:
+            # La réponse en cache reste servie: seul l'ordre LRU de l'entrée n'est pas rafraîchi
+            _logger.warning(f"Cache IA: mise à jour LRU de l'entrée {entry_id} ignorée: {e}")
+
+    @api.model
+    def _store(self, key, model, response):
+        """Insère ou rafraîchit une entrée puis applique l'éviction LRU
+
+        Comme _touch, dans un curseur séparé validé immédiatement: une réponse facturée reste en
+        cache même si la transaction de l'appelant est annulée, et l'écriture concurrente d'une
+        même clé par deux workers n'échoue pas en conflit de sérialisation.
+        """
+        ttl = self._get_ttl()
+        if ttl <= 0 or not response:
+            return
+        with committed_cursor(self.pool) as cr:
+            cr.execute("""
+                INSERT INTO pv_ai_cache (key, model, response, expires_at, last_access, hit_count,
+                                         create_uid, create_date, write_uid, write_date)
+                VALUES (%(key)s, %(model)s, %(response)s,
+                        (now() AT TIME ZONE 'UTC') + make_interval(secs => %(ttl)s),
+                        (now() AT TIME ZONE 'UTC'), 0,
+                        %(uid)s, (now() AT TIME ZONE 'UTC'), %(uid)s, (now() AT TIME ZONE 'UTC'))
+                ON CONFLICT (key) DO UPDATE
+                   SET response = EXCLUDED.response,
+                       model = EXCLUDED.model,
+                       expires_at = EXCLUDED.expires_at,
+                       last_access = EXCLUDED.last_access,
+                       write_uid = EXCLUDED.write_uid,
+                       write_date = EXCLUDED.write_date
+            """, {'key': key, 'model': model, 'response': response, 'ttl': ttl, 'uid': self.env.uid})
+            self._evict_lru(cr)
+        self.invalidate_model()
+
+    @api.model
+    def _evict_lru(self, cr):
+        """Supprime les entrées les moins récemment utilisées au-delà de la taille maximale"""
+        max_entries = self._get_max_entries()
+        cr.execute("""
+            DELETE FROM pv_ai_cache
+             WHERE id IN (
+                SELECT id FROM pv_ai_cache
+                 ORDER BY last_access DESC NULLS LAST, id DESC
+                OFFSET %s
+             )
+        """, (max(max_entries, 0),))
+        if cr.rowcount:
+            _logger.info(f"Cache IA: {cr.rowcount} entrée(s) évincée(s) (LRU)")
+
+    @api.autovacuum
+    def _gc_expired_entries(self):
+        """Purge des entrées expirées"""
+        self.env.cr.execute("""
+            DELETE FROM pv_ai_cache WHERE expires_at <= (now() AT TIME ZONE 'UTC')
+        """)
+        if self.env.cr.rowcount:
+            _logger.info(f"Cache IA: {self.env.cr.rowcount} entrée(s) expirée(s) supprimée(s)")
+
+    @api.model
+    def get_cache_stats(self):
+        """Statistiques du cache: compteurs du worker et totaux persistants"""
+        self.env.cr.execute("SELECT COUNT(*), COALESCE(SUM(hit_count), 0) FROM pv_ai_cache")
+        entries, total_hits = self.env.cr.fetchone()
+        return {
+            'worker_hits': _CACHE_STATS['hits'],
+            'worker_misses': _CACHE_STATS['misses'],
+            'entries': entries,
+            'total_hits': total_hits,
+            'ttl': self._get_ttl(),
+            'max_entries': self._get_max_entries(),
+        }
@@ -0,0 +1,105 @@
+from odoo import models, fields, api, tools
+import logging
+
+_logger = logging.getLogger(__name__)
+
+AI_CALLERS = [
+    ('alarm_action_plan', 'Plan d\'action alarme'),
+    ('technician_analysis', 'Analyse technicien'),
+    ('other', 'Autre'),
+]
+
+# Prix publics OpenAI en USD par million de tokens: (prompt, réponse)
+MODEL_PRICES = {
+    'gpt-4o-mini': (0.15, 0.60),
+    'gpt-4o': (2.50, 10.00),
+}
+
+LOG_RETENTION_PARAM = 'pv_management.ai_call_log_retention_days'
+
+
+class PVAICallLog(models.Model):
+    _name = 'pv.ai.call.log'
+    _description = 'Journal des appels OpenAI'
+    _order = 'id desc'
+
+    caller = fields.Selection(AI_CALLERS, string='Origine', required=True, readonly=True, index=True)
+    model = fields.Char(string='Modèle', readonly=True)
+    status = fields.Integer(string='Statut HTTP', readonly=True)
+    attempt_count = fields.Integer(string='Tentatives', readonly=True)
+    latency_ms = fields.Float(string='Latence (ms)', readonly=True, group_operator='avg')
+    prompt_tokens = fields.Integer(string='Tokens prompt', readonly=True)
+    completion_tokens = fields.Integer(string='Tokens réponse', readonly=True)
+    cost = fields.Float(string='Coût estimé (USD)', readonly=True, digits=(12, 6))
+    cache_hit = fields.Boolean(string='Servi par le cache', readonly=True)
+    fallback_used = fields.Boolean(string='Secours utilisé', readonly=True,
+                                   help="Aucune réponse exploitable: le plan ou l'analyse de secours a été utilisé")
+    error = fields.Char(string='Erreur', readonly=True)
+
+    def init(self):
+        # Dépense du jour / du mois (plafonds) et synthèse journalière
+        tools.create_index(self._cr, 'pv_ai_call_log_create_date_idx', self._table, ['create_date'])
+
+    @api.model
+    def _estimate_cost(self, model, prompt_tokens, completion_tokens):
+        prompt_price, completion_price = MODEL_PRICES.get(model, (0.0, 0.0))
+        return (prompt_tokens * prompt_price + completion_tokens * completion_price) / 1e6
+
+    @api.model
+    def _log_calls(self, entries):
+        """Enregistre les appels en une requête (le journal ne passe pas par l'ORM)
+
+        Comme le disjoncteur et les seaux de débit, le journal est écrit dans un curseur séparé
+        validé immédiatement: un appel facturé reste compté (plafonds de dépense) même si la
+        transaction de l'appelant est annulée.
+        entries: liste de dicts caller, model, et optionnellement status, attempts, latency_ms,
+        usage (bloc usage de l'API), cache_hit, fallback_used, error.
+        """
+        if not entries:
+            return
+        with self.pool.cursor() as cr:
+            rows = []
+            for entry in entries:
+                usage = entry.get('usage') or {}
+                prompt_tokens = usage.get('prompt_tokens', 0) or 0
+                completion_tokens = usage.get('completion_tokens', 0) or 0
+                rows.append(cr.mogrify(
+                    "(%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, "
+                    "%s, (now() AT TIME ZONE 'UTC'), %s, (now() AT TIME ZONE 'UTC'))",
+                    (entry.get('caller') or 'other', entry.get('model'), entry.get('status'),
+                     entry.get('attempts', 0), entry.get('latency_ms', 0.0), prompt_tokens, completion_tokens,
+                     self._estimate_cost(entry.get('model'), prompt_tokens, completion_tokens),
+                     bool(entry.get('cache_hit')), bool(entry.get('fallback_used')),
+                     (entry.get('error') or '')[:250] or None, self.env.uid, self.env.uid),
+                ).decode())
+            cr.execute("""
+                INSERT INTO pv_ai_call_log (caller, model, status, attempt_count, latency_ms, prompt_tokens,
+                                            completion_tokens, cost, cache_hit, fallback_used, error,
+                                            create_uid, create_date, write_uid, write_date)
+                VALUES %s
+            """ % ', '.join(rows))
+
+    @api.model
+    def _entry_from_result(self, caller, model, result):
+        """Entrée de journal d'un appel /chat/completions (voir openai_client.chat_completion)"""
+        return {
+            'caller': caller,
+            'model': model,
+            'status': result['status'],
+            'attempts': len(result['attempts']),
+            'latency_ms': sum(attempt['latency_ms'] for attempt in result['attempts']),
+            'usage': result['usage'],
+            'fallback_used': not result['content'],
+            'error': result['error'],
+        }
+
+    @api.autovacuum
+    def _gc_old_calls(self):
+        """Purge des appels au-delà de la durée de conservation"""
+        retention_days = self.env['pv.management.openai.service']._get_int_param(LOG_RETENTION_PARAM, 365)
+        self.env.cr.execute("""
+            DELETE FROM pv_ai_call_log
+             WHERE create_date < (now() AT TIME ZONE 'UTC') - make_interval(days => %s)
+        """, (retention_days,))
+        if self.env.cr.rowcount:
+            _logger.info(f"Journal OpenAI: {self.env.cr.rowcount} appel(s) ancien(s) supprimé(s)")
@@ -0,0 +1,163 @@
+from odoo import models, fields, api
+import logging
+from .committed_cursor import committed_cursor
+
+_logger = logging.getLogger(__name__)
+
+# Statuts HTTP qui indiquent une indisponibilité du service (et non une requête invalide)
+BREAKER_FAILURE_STATUSES = frozenset({401, 403, 429})
+
+
+class PVAICircuitBreaker(models.Model):
+    _name = 'pv.ai.circuit.breaker'
+    _description = 'Disjoncteur des appels OpenAI'
+
+    name = fields.Char(string='Service', required=True, readonly=True)
+    state = fields.Selection([
+        ('closed', 'Fermé'),
+        ('open', 'Ouvert'),
+        ('half_open', 'Semi-ouvert'),
+    ], string='État', default='closed', required=True, readonly=True)
+    failure_count = fields.Integer(string='Échecs consécutifs', readonly=True)
+    opened_at = fields.Datetime(string='Ouvert le', readonly=True)
+    probe_started_at = fields.Datetime(string='Sonde lancée le', readonly=True)
+    last_failure_date = fields.Datetime(string='Dernier échec', readonly=True)
+    last_failure_message = fields.Text(string='Dernière erreur', readonly=True)
+    last_success_date = fields.Datetime(string='Dernier succès', readonly=True)
+
+    _sql_constraints = [
+        ('name_unique', 'unique(name)', 'Un seul disjoncteur par service.'),
+    ]
+
+    # Les transitions sont écrites dans un curseur séparé et validées immédiatement: elles doivent
+    # être visibles par tous les workers, même si la transaction courante est annulée. Le curseur est
+    # en READ COMMITTED (voir committed_cursor): quand le service tombe, les échecs enregistrés en même
+    # temps par plusieurs workers sont tous comptés au lieu d'échouer en conflit de sérialisation.
+
+    @api.model
+    def _get_settings(self):
+        service = self.env['pv.management.openai.service']
+        return {
+            'threshold': max(service._get_int_param('pv_management.ai_breaker_threshold', 5), 1),
+            'cooldown': max(service._get_int_param('pv_management.ai_breaker_cooldown', 60), 0),
+        }
+
+    @api.model
+    def _read_state(self, name='openai'):
+        # Lecture hors de la transaction courante: son instantané peut précéder la dernière transition
+        with committed_cursor(self.pool) as cr:
+            cr.execute("""
+                SELECT state, failure_count,
+                       EXTRACT(EPOCH FROM (now() AT TIME ZONE 'UTC') - opened_at),
+                       EXTRACT(EPOCH FROM (now() AT TIME ZONE 'UTC') - probe_started_at)
+                  FROM pv_ai_circuit_breaker WHERE name = %s
+            """, (name,))
+            row = cr.fetchone()
+        if not row:
+            return {'state': 'closed', 'failure_count': 0, 'open_for': None, 'probe_for': None}
+        return {'state': row[0], 'failure_count': row[1], 'open_for': row[2], 'probe_for': row[3]}
+
+    @api.model
+    def _allow_request(self, name='openai'):
+        """Retourne 'closed' si l'appel est autorisé, 'probe' pour un appel de sonde
+        (semi-ouvert), ou False si le disjoncteur est ouvert.
+        """
+        current = self._read_state(name)
+        if current['state'] == 'closed':
+            return 'closed'
+
+        cooldown = self._get_settings()['cooldown']
+        cooldown_elapsed = current['state'] == 'open' and (current['open_for'] or 0) >= cooldown
+        probe_stalled = current['state'] == 'half_open' and (current['probe_for'] or 0) >= cooldown
+        if not (cooldown_elapsed or probe_stalled):
+            return False
+
+        # Un seul worker obtient la sonde: la transition est conditionnelle et atomique
+        with committed_cursor(self.pool) as cr:
+            cr.execute("""
+                UPDATE pv_ai_circuit_breaker
+                   SET state = 'half_open',
+                       probe_started_at = (now() AT TIME ZONE 'UTC'),
+                       write_date = (now() AT TIME ZONE 'UTC')
+                 WHERE name = %s
+                   AND ((state = 'open' AND opened_at <= (now() AT TIME ZONE 'UTC') - make_interval(secs => %s))
+                     OR (state = 'half_open' AND probe_started_at <= (now() AT TIME ZONE 'UTC') - make_interval(secs => %s)))
+             RETURNING id
+            """, (name, cooldown, cooldown))
+            won = bool(cr.fetchone())
+        if won:
+            _logger.info(f"Disjoncteur {name}: semi-ouvert, appel de sonde autorisé")
+            return 'probe'
+        return False
+
+    @api.model
+    def _record_success(self, name='openai'):
+        current = self._read_state(name)
+        if current['state'] == 'closed' and not current['failure_count']:
+            return
+        with committed_cursor(self.pool) as cr:
+            cr.execute("""
+                UPDATE pv_ai_circuit_breaker
+                   SET state = 'closed', failure_count = 0, opened_at = NULL, probe_started_at = NULL,
+                       last_success_date = (now() AT TIME ZONE 'UTC'),
+                       write_date = (now() AT TIME ZONE 'UTC')
+                 WHERE name = %s
+            """, (name,))
+        if current['state'] != 'closed':
+            _logger.info(f"Disjoncteur {name}: service rétabli, disjoncteur fermé")
+
+    @api.model
+    def _record_failure(self, message, name='openai'):
+        threshold = self._get_settings()['threshold']
+        with committed_cursor(self.pool) as cr:
+            cr.execute("""
+                INSERT INTO pv_ai_circuit_breaker (name, state, failure_count, create_date, write_date)
+                VALUES (%s, 'closed', 0, (now() AT TIME ZONE 'UTC'), (now() AT TIME ZONE 'UTC'))
+                ON CONFLICT (name) DO NOTHING
+            """, (name,))
+            cr.execute("""
+                UPDATE pv_ai_circuit_breaker
+                   SET failure_count = failure_count + 1,
+                       state = CASE WHEN state = 'half_open' OR failure_count + 1 >= %(threshold)s
+                                    THEN 'open' ELSE state END,
+                       opened_at = CASE WHEN state = 'half_open'
+                                          OR (state = 'closed' AND failure_count + 1 >= %(threshold)s)
+                                        THEN (now() AT TIME ZONE 'UTC') ELSE opened_at END,
+                       last_failure_date = (now() AT TIME ZONE 'UTC'),
+                       last_failure_message = %(message)s,
+                       write_date = (now() AT TIME ZONE 'UTC')
+                 WHERE name = %(name)s
+             RETURNING state, failure_count
+            """, {'name': name, 'threshold': threshold, 'message': (message or '')[:2000]})
+            state, failure_count = cr.fetchone()
+        if state == 'open':
+            _logger.warning(f"Disjoncteur {name} ouvert après {failure_count} échec(s): "
+                            f"plans de secours servis immédiatement")
+
+    @api.model
+    def _record_result(self, result, name='openai'):
+        """Met à jour le disjoncteur à partir d'un résultat de openai_client.chat_completion"""
+        if result['content']:
+            self._record_success(name)
+        elif result['status'] is None or result['status'] >= 500 or result['status'] in BREAKER_FAILURE_STATUSES:
+            self._record_failure(result['error'], name)
+
+    @api.model
+    def _get_status_summary(self, name='openai'):
+        current = self._read_state(name)
+        state_label = dict(self._fields['state'].selection)[current['state']]
+        summary = f"Disjoncteur: {state_label} ({current['failure_count']} échec(s) consécutif(s))"
+        if current['state'] == 'open':
+            remaining = self._get_settings()['cooldown'] - (current['open_for'] or 0)
+            summary += f", prochaine sonde dans {max(remaining, 0):.0f}s"
+        return summary
+
+    @api.model
+    def _reset(self, name='openai'):
+        with committed_cursor(self.pool) as cr:
+            cr.execute("""
+                UPDATE pv_ai_circuit_breaker
+                   SET state = 'closed', failure_count = 0, opened_at = NULL, probe_started_at = NULL,
+                       write_date = (now() AT TIME ZONE 'UTC')
+                 WHERE name = %s
+            """, (name,))
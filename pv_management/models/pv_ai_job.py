@@ -0,0 +1,372 @@
+from odoo import models, fields, api, _
+from odoo.exceptions import UserError
+from odoo.tools import split_every
+from datetime import timedelta
+import logging
+import threading
+import time
+from .committed_cursor import committed_cursor
+from .pv_perf_metric import instrumented
+
+_logger = logging.getLogger(__name__)
+
+# Cibles des tâches: type de tâche -> (modèle, méthode d'exécution)
+JOB_TARGETS = {
+    'alarm_action_plan': ('alarm.management', '_run_action_plan_generation'),
+    'technician_analysis': ('hr.employee', '_run_performance_analysis'),
+}
+
+STALE_JOB_MINUTES = 15
+MAX_JOB_ATTEMPTS = 3
+
+
+class PVAIJob(models.Model):
+    _name = 'pv.ai.job'
+    _description = 'Tâche IA asynchrone'
+    _order = 'id desc'
+
+    name = fields.Char(string='Description', required=True, readonly=True)
+    job_type = fields.Selection([
+        ('alarm_action_plan', 'Plan d\'action alarme'),
+        ('technician_analysis', 'Analyse technicien'),
+    ], string='Type', required=True, readonly=True, index=True)
+    res_model = fields.Char(string='Modèle cible', required=True, readonly=True)
+    res_id = fields.Many2oneReference(string='ID cible', model_field='res_model', required=True,
+                                      readonly=True, index=True)
+    state = fields.Selection([
+        ('pending', 'En attente'),
+        ('running', 'En cours'),
+        ('done', 'Terminée'),
+        ('failed', 'Échouée'),
+    ], string='État', default='pending', required=True, readonly=True, index=True)
+    progress = fields.Integer(string='Progression (%)', readonly=True)
+    force_refresh = fields.Boolean(string='Forcer la régénération', readonly=True)
+    user_id = fields.Many2one('res.users', string='Demandé par', default=lambda self: self.env.user,
+                              readonly=True)
+    # Demandeur et utilisateurs ayant rejoint la tâche en cours: tous notifiés à la fin
+    subscriber_ids = fields.Many2many('res.users', 'pv_ai_job_res_users_rel', 'job_id', 'user_id',
+                                      string='Utilisateurs notifiés', readonly=True)
+    date_started = fields.Datetime(string='Démarrée le', readonly=True)
+    date_done = fields.Datetime(string='Terminée le', readonly=True)
+    attempt_count = fields.Integer(string='Tentatives', readonly=True)
+    result_message = fields.Text(string='Résultat', readonly=True)
+    error_message = fields.Text(string='Erreur', readonly=True)
+
+    def init(self):
+        # Single-flight: une seule tâche en attente ou en cours par cible, même entre transactions concurrentes
+        self.env.cr.execute("""
+            UPDATE pv_ai_job
+               SET state = 'failed', error_message = 'Tâche en double'
+             WHERE id IN (SELECT id
+                            FROM (SELECT id, row_number() OVER (PARTITION BY job_type, res_model, res_id
+                                                                    ORDER BY id) AS rank
+                                    FROM pv_ai_job
+                                   WHERE state IN ('pending', 'running')) duplicates
+                           WHERE rank > 1)
+        """)
+        self.env.cr.execute("""
+            CREATE UNIQUE INDEX IF NOT EXISTS pv_ai_job_active_target_uniq
+                ON pv_ai_job (job_type, res_model, res_id)
+             WHERE state IN ('pending', 'running')
+        """)
+
+    @api.model
+    def _enqueue(self, job_type, record, force_refresh=False, subscribe=True):
+        """Met en file une tâche IA pour record, ou rejoint la tâche identique déjà en attente ou en cours
+
+        Retourne (tâche, créée). L'insertion passe par un curseur séparé validé immédiatement
+        (READ COMMITTED) et par l'index unique partiel: deux demandes simultanées pour la même
+        cible aboutissent à une seule tâche. La tâche créée est rattachée à la cible (ai_job_id)
+        dans ce même curseur: la transaction de l'appelant n'écrit pas la cible et ne peut donc
+        pas échouer en conflit de sérialisation. subscribe=True inscrit l'utilisateur courant
+        parmi les utilisateurs notifiés de la tâche, qu'il l'ait créée ou rejointe.
+        """
+        record.ensure_one()
+        name = f"{dict(self._fields['job_type'].selection)[job_type]} - {record.display_name}"
+        with committed_cursor(self.pool) as cr:
+            cr.execute("""
+                INSERT INTO pv_ai_job (name, job_type, res_model, res_id, state, progress, force_refresh,
+                                       attempt_count, user_id, create_uid, create_date, write_uid, write_date)
+                VALUES (%(name)s, %(job_type)s, %(res_model)s, %(res_id)s, 'pending', 0, %(force_refresh)s,
+                        0, %(uid)s, %(uid)s, (now() AT TIME ZONE 'UTC'), %(uid)s, (now() AT TIME ZONE 'UTC'))
+                ON CONFLICT (job_type, res_model, res_id) WHERE state IN ('pending', 'running') DO NOTHING
+                RETURNING id
+            """, {'name': name, 'job_type': job_type, 'res_model': record._name, 'res_id': record.id,
+                  'force_refresh': bool(force_refresh), 'uid': self.env.uid})
+            row = cr.fetchone()
+            created = bool(row)
+            if created:
+                cr.execute(f'UPDATE "{record._table}" SET ai_job_id = %s WHERE id = %s', (row[0], record.id))
+            else:
+                # Tâche déjà active: la régénération forcée n'est reportée que si elle n'a pas démarré
+                cr.execute("""
+                    SELECT id FROM pv_ai_job
+                     WHERE job_type = %s AND res_model = %s AND res_id = %s AND state IN ('pending', 'running')
+                """, (job_type, record._name, record.id))
+                row = cr.fetchone()
+                if row and force_refresh:
+                    cr.execute("""
+                        UPDATE pv_ai_job SET force_refresh = TRUE, write_date = (now() AT TIME ZONE 'UTC')
+                         WHERE id = %s AND state = 'pending' AND NOT force_refresh
+                    """, (row[0],))
+            if row and subscribe:
+                cr.execute("""
+                    INSERT INTO pv_ai_job_res_users_rel (job_id, user_id) VALUES (%s, %s)
+                    ON CONFLICT DO NOTHING
+                """, (row[0], self.env.uid))
+        if not row:
+            # La tâche active vient de se terminer entre les deux requêtes: nouvelle tentative
+            return self._enqueue(job_type, record, force_refresh=force_refresh, subscribe=subscribe)
+
+        job = self.browse(row[0])
+        if created:
+            record.invalidate_recordset(['ai_job_id'])
+            cron = self.env.ref('pv_management.ir_cron_process_ai_jobs', raise_if_not_found=False)
+            if cron:
+                cron._trigger()
+        else:
+            _logger.info(f"Tâche IA {job.id} déjà active pour {record._name}({record.id}): demande regroupée")
+        return job, created
+
+    @api.model
+    def _enqueue_many(self, job_type, records, force_refresh=False):
+        """Met en file une tâche IA par enregistrement de records, en une seule transaction séparée
+
+        Même garantie que _enqueue (index unique partiel): les cibles ayant déjà une tâche en
+        attente ou en cours la conservent. Le demandeur n'est pas inscrit aux tâches (pas une
+        notification par cible); l'avancement se suit dans le menu Tâches IA.
+        Retourne (nombre de tâches créées, nombre de cibles déjà en cours).
+        """
+        if not records:
+            return 0, 0
+        label = dict(self._fields['job_type'].selection)[job_type]
+        with committed_cursor(self.pool) as cr:
+            cr.execute("""
+                INSERT INTO pv_ai_job (name, job_type, res_model, res_id, state, progress, force_refresh,
+                                       attempt_count, user_id, create_uid, create_date, write_uid, write_date)
+                SELECT target.name, %(job_type)s, %(res_model)s, target.res_id, 'pending', 0, %(force_refresh)s,
+                       0, %(uid)s, %(uid)s, (now() AT TIME ZONE 'UTC'), %(uid)s, (now() AT TIME ZONE 'UTC')
+                  FROM unnest(%(names)s::varchar[], %(res_ids)s::int[]) AS target(name, res_id)
+                ON CONFLICT (job_type, res_model, res_id) WHERE state IN ('pending', 'running') DO NOTHING
+                RETURNING id, res_id
+            """, {'job_type': job_type, 'res_model': records._name, 'force_refresh': bool(force_refresh),
+                  'uid': self.env.uid, 'names': [f"{label} - {record.display_name}" for record in records],
+                  'res_ids': records.ids})
+            created_rows = cr.fetchall()
+            if created_rows:
+                cr.execute(f"""
+                    UPDATE "{records._table}" target
+                       SET ai_job_id = created.job_id
+                      FROM unnest(%s::int[], %s::int[]) AS created(job_id, res_id)
+                     WHERE target.id = created.res_id
+                """, ([row[0] for row in created_rows], [row[1] for row in created_rows]))
+            if force_refresh and len(created_rows) < len(records):
+                # Cibles déjà en file: la régénération forcée n'est reportée que si la tâche n'a pas démarré
+                cr.execute("""
+                    UPDATE pv_ai_job SET force_refresh = TRUE, write_date = (now() AT TIME ZONE 'UTC')
+                     WHERE job_type = %s AND res_model = %s AND res_id = ANY(%s)
+                       AND state = 'pending' AND NOT force_refresh
+                """, (job_type, records._name, records.ids))
+
+        if created_rows:
+            records.invalidate_recordset(['ai_job_id'])
+            cron = self.env.ref('pv_management.ir_cron_process_ai_jobs', raise_if_not_found=False)
+            if cron:
+                cron._trigger()
+        return len(created_rows), len(records) - len(created_rows)
+
+    @api.model
+    def _try_lock_target(self, record):
+        """Verrou consultatif (transactionnel) sur la cible d'une génération IA
+
+        Empêche une tâche et une régénération en masse d'écrire le même enregistrement en parallèle.
+        Retourne False sans attendre si le verrou est déjà pris.
+        """
+        self.env.cr.execute("SELECT pg_try_advisory_xact_lock(hashtext(%s), %s)",
+                            (f'pv.ai.job:{record._name}', record.id))
+        return self.env.cr.fetchone()[0]
+
+    @api.model
+    def _run_in_batches(self, records, process_batch, stats, batch_size=50, commit=False):
+        """Traitement en masse des cibles records, lot par lot (régénérations et analyses IA)
+
+        Les cibles verrouillées par une tâche en cours sont ignorées (stats['skipped']).
+        process_batch(lot) retourne les compteurs du lot, ajoutés à stats si le lot aboutit.
+        Chaque lot s'exécute dans un savepoint: un lot en échec est annulé en entier et compté
+        dans stats['failed'] sans affecter les suivants. commit=True valide en plus chaque lot
+        (cron) pour ne pas garder une transaction ouverte. Complète stats de la durée et du débit.
+        """
+        started = time.monotonic()
+        for batch in split_every(batch_size, records.ids, records.browse):
+            locked = batch.filtered(self._try_lock_target)
+            stats['skipped'] += len(batch) - len(locked)
+            if locked:
+                try:
+                    with self.env.cr.savepoint():
+                        batch_stats = process_batch(locked)
+                except Exception as e:
+                    _logger.error(f"Échec du traitement du lot {records._name} {locked.ids}: {str(e)}")
+                    batch_stats = {'failed': len(locked)}
+                for key, count in batch_stats.items():
+                    stats[key] += count
+            if commit:
+                self.env.cr.commit()
+
+        stats['duration'] = time.monotonic() - started
+        processed = stats['ai'] + stats['fallback']
+        stats['throughput'] = processed / stats['duration'] * 60 if stats['duration'] else 0.0
+        stats['fallback_rate'] = stats['fallback'] / processed * 100 if processed else 0.0
+        return stats
+
+    def _commit(self):
+        # Pas de commit pendant les tests: la transaction de test doit rester annulable
+        if not getattr(threading.current_thread(), 'testing', False):
+            self.env.cr.commit()
+
+    @api.model
+    def _requeue_stale_jobs(self):
+        """Remet en attente les tâches bloquées en cours (worker interrompu)"""
+        limit_date = fields.Datetime.now() - timedelta(minutes=STALE_JOB_MINUTES)
+        stale_jobs = self.search([('state', '=', 'running'), ('date_started', '<', limit_date)])
+        for job in stale_jobs:
+            if job.attempt_count >= MAX_JOB_ATTEMPTS:
+                job.write({'state': 'failed', 'error_message': _('Tâche interrompue trop de fois.')})
+            else:
+                job.write({'state': 'pending', 'progress': 0})
+
+    @api.model
+    def _acquire_next_job(self, skipped_ids=()):
+        """Verrouille la prochaine tâche en attente (SKIP LOCKED: plusieurs runners possibles)"""
+        self.env.cr.execute("""
+            SELECT id FROM pv_ai_job
+             WHERE state = 'pending'
+               AND id != ALL(%s)
+             ORDER BY id
+             LIMIT 1
+               FOR UPDATE SKIP LOCKED
+        """, (list(skipped_ids),))
+        row = self.env.cr.fetchone()
+        return self.browse(row[0]) if row else self.browse()
+
+    @api.model
+    def _cron_process_jobs(self, limit=20):
+        """Exécute les tâches en attente hors du cycle des requêtes HTTP"""
+        self._requeue_stale_jobs()
+        self._commit()
+
+        skipped_ids = set()
+        for _i in range(limit):
+            job = self._acquire_next_job(skipped_ids)
+            if not job:
+                break
+            job.write({
+                'state': 'running',
+                'progress': 10,
+                'date_started': fields.Datetime.now(),
+                'attempt_count': job.attempt_count + 1,
+                'error_message': False,
+            })
+            self._commit()
+            target = self.env[job.res_model].browse(job.res_id)
+            if not self._try_lock_target(target):
+                # Cible en cours d'écriture par une régénération en masse: reprise au prochain passage
+                job.write({'state': 'pending', 'progress': 0, 'attempt_count': job.attempt_count - 1})
+                self._commit()
+                skipped_ids.add(job.id)
+                continue
+            job._run()
+        else:
+            # Limite atteinte (mise en file en masse): reprise immédiate plutôt qu'au prochain intervalle,
+            # sauf si des cibles sont verrouillées (pas de relance en boucle pendant une régénération en masse)
+            cron = self.env.ref('pv_management.ir_cron_process_ai_jobs', raise_if_not_found=False)
+            if cron and not skipped_ids:
+                cron._trigger()
+
+    @instrumented('action')
+    def _run(self):
+        self.ensure_one()
+        try:
+            model_name, method_name = JOB_TARGETS[self.job_type]
+            target = self.env[model_name].with_user(self.user_id).browse(self.res_id).exists()
+            if not target:
+                raise UserError(_('L\'enregistrement cible n\'existe plus.'))
+            # Savepoint: un échec n'annule que le travail de la cible, pas la transaction entière
+            with self.env.cr.savepoint():
+                message = getattr(target, method_name)(force_refresh=self.force_refresh)
+            self.write({
+                'state': 'done',
+                'progress': 100,
+                'date_done': fields.Datetime.now(),
+                'result_message': message or _('Terminé'),
+            })
+            self._notify_user(_('Tâche IA terminée'), self.name, 'success')
+        except Exception as e:
+            _logger.error(f"Échec de la tâche IA {self.id} ({self.name}): {str(e)}")
+            self.write({
+                'state': 'failed',
+                'progress': 100,
+                'date_done': fields.Datetime.now(),
+                'error_message': str(e),
+            })
+            self._notify_user(_('Échec de la tâche IA'), f"{self.name}: {str(e)}", 'danger')
+        self._commit()
+
+    def _notify_user(self, title, message, notification_type):
+        """Notifie les utilisateurs inscrits à la tâche"""
+        self.ensure_one()
+        # Inscriptions relues hors de l'instantané de la tâche: un utilisateur a pu la rejoindre
+        # pendant son exécution
+        with self.pool.cursor() as cr:
+            cr.execute("SELECT user_id FROM pv_ai_job_res_users_rel WHERE job_id = %s", (self.id,))
+            user_ids = [row[0] for row in cr.fetchall()]
+        for partner in self.env['res.users'].sudo().browse(user_ids).partner_id:
+            self.env['bus.bus']._sendone(partner, 'simple_notification', {
+                'title': title,
+                'message': message,
+                'sticky': notification_type == 'danger',
+                'type': notification_type,
+            })
+
+    def action_view_target(self):
+        self.ensure_one()
+        return {
+            'name': self.name,
+            'type': 'ir.actions.act_window',
+            'res_model': self.res_model,
+            'res_id': self.res_id,
+            'view_mode': 'form',
+            'target': 'current',
+        }
+
+    @instrumented('action')
+    def action_retry(self):
+        """Remet en file les tâches échouées (nouvelle tâche via _enqueue)
+
+        Une cible qui a déjà une tâche en attente ou en cours n'en reçoit pas de seconde:
+        l'utilisateur est inscrit à la tâche active.
+        """
+        retried = already_active = 0
+        for job in self.filtered(lambda job: job.state == 'failed'):
+            target = self.env[job.res_model].browse(job.res_id).exists()
+            if not target:
+                continue
+            _new_job, created = self._enqueue(job.job_type, target, force_refresh=job.force_refresh)
+            if created:
+                retried += 1
+            else:
+                already_active += 1
+        message = _('%s tâche(s) relancée(s).') % retried
+        if already_active:
+            message += ' ' + _('%s tâche(s) déjà en attente ou en cours pour la même cible: '
+                               'vous serez notifié à leur fin.') % already_active
+        return {
+            'type': 'ir.actions.client',
+            'tag': 'display_notification',
+            'params': {
+                'title': _('Tâches IA'),
+                'message': message,
+                'sticky': False,
+                'type': 'info',
+                'next': {'type': 'ir.actions.client', 'tag': 'reload'},
+            }
+        }
@@ -0,0 +1,162 @@
+from odoo import models, fields, api, SUPERUSER_ID
+import logging
+import time
+from .committed_cursor import committed_cursor
+from .prompt_builder import estimate_tokens
+
+_logger = logging.getLogger(__name__)
+
+
+class PVAIRateLimiter(models.Model):
+    _name = 'pv.ai.rate.limiter'
+    _description = 'Seaux de jetons des appels OpenAI (requêtes et tokens par minute)'
+
+    name = fields.Char(string='Seau', required=True, readonly=True)
+    level = fields.Float(string='Jetons disponibles', readonly=True)
+    refilled_at = fields.Datetime(string='Dernier remplissage', readonly=True)
+
+    _sql_constraints = [
+        ('name_unique', 'unique(name)', 'Un seul seau par nom.'),
+    ]
+
+    # Comme le disjoncteur, les seaux sont mis à jour dans un curseur séparé validé immédiatement
+    # (READ COMMITTED, voir committed_cursor): la consommation doit être visible par tous les workers,
+    # ne pas être annulée avec la transaction, et des prélèvements concurrents sur un même seau
+    # s'attendent au lieu d'échouer en conflit de sérialisation.
+
+    @api.model
+    def _get_settings(self):
+        """Limites lues dans les paramètres système (0 désactive la limite)"""
+        service = self.env['pv.management.openai.service']
+        params = self.env['ir.config_parameter'].sudo()
+
+        def _float_param(key, default):
+            try:
+                return max(float(params.get_param(key, default)), 0.0)
+            except (TypeError, ValueError):
+                return default
+
+        return {
+            'requests_per_minute': max(service._get_int_param('pv_management.ai_requests_per_minute', 60), 0),
+            'tokens_per_minute': max(service._get_int_param('pv_management.ai_tokens_per_minute', 150000), 0),
+            'max_wait': max(service._get_int_param('pv_management.ai_rate_max_wait', 20), 0),
+            'completion_estimate': max(service._get_int_param('pv_management.ai_completion_token_estimate', 1000), 0),
+            'daily_budget': _float_param('pv_management.ai_daily_budget', 0.0),
+            'monthly_budget': _float_param('pv_management.ai_monthly_budget', 0.0),
+            'user_daily_quota': max(service._get_int_param('pv_management.ai_user_daily_quota', 0), 0),
+        }
+
+    @api.model
+    def _estimate_tokens(self, messages):
+        """Estimation des tokens d'un appel: prompt (taille du texte) et réponse attendue"""
+        return estimate_tokens(messages) + self._get_settings()['completion_estimate']
+
+    @api.model
+    def _take(self, name, amount, per_minute):
+        """Prélève amount jetons du seau name (rempli de per_minute jetons par minute)
+
+        Retourne 0 si les jetons ont été pris, sinon l'attente estimée en secondes.
+        Le remplissage et le prélèvement sont faits par une seule mise à jour conditionnelle.
+        """
+        amount = min(amount, per_minute)
+        with committed_cursor(self.pool) as cr:
+            cr.execute("""
+                INSERT INTO pv_ai_rate_limiter (name, level, refilled_at, create_date, write_date)
+                VALUES (%s, %s, (now() AT TIME ZONE 'UTC'), (now() AT TIME ZONE 'UTC'), (now() AT TIME ZONE 'UTC'))
+                ON CONFLICT (name) DO NOTHING
+            """, (name, per_minute))
+            cr.execute("""
+                WITH bucket AS (
+                    SELECT id, LEAST(%(capacity)s, level + EXTRACT(EPOCH FROM (now() AT TIME ZONE 'UTC') - refilled_at)
+                                                          * %(capacity)s / 60.0) AS available
+                      FROM pv_ai_rate_limiter
+                     WHERE name = %(name)s
+                       FOR UPDATE
+                )
+                UPDATE pv_ai_rate_limiter limiter
+                   SET level = CASE WHEN bucket.available >= %(amount)s
+                                    THEN bucket.available - %(amount)s ELSE bucket.available END,
+                       refilled_at = (now() AT TIME ZONE 'UTC'),
+                       write_date = (now() AT TIME ZONE 'UTC')
+                  FROM bucket
+                 WHERE limiter.id = bucket.id
+             RETURNING bucket.available
+            """, {'name': name, 'amount': amount, 'capacity': per_minute})
+            available = cr.fetchone()[0]
+        if available >= amount:
+            return 0
+        return (amount - available) * 60.0 / per_minute
+
+    @api.model
+    def _give_back(self, name, amount):
+        """Rend (amount > 0) ou prélève (amount < 0) des jetons sans condition"""
+        if not amount:
+            return
+        with committed_cursor(self.pool) as cr:
+            cr.execute("""
+                UPDATE pv_ai_rate_limiter
+                   SET level = level + %s, write_date = (now() AT TIME ZONE 'UTC')
+                 WHERE name = %s
+            """, (amount, name))
+
+    @api.model
+    def _check_budget(self, settings):
+        """Motif du refus si un plafond de dépense ou le quota de l'utilisateur est atteint, sinon False"""
+        if not (settings['daily_budget'] or settings['monthly_budget'] or settings['user_daily_quota']):
+            return False
+        # Lu dans un curseur séparé: le journal est validé hors de la transaction courante, dont
+        # l'instantané ne verrait pas les appels enregistrés depuis son début
+        with committed_cursor(self.pool) as cr:
+            cr.execute("""
+                SELECT COALESCE(SUM(cost) FILTER (WHERE create_date >= date_trunc('day', now() AT TIME ZONE 'UTC')), 0),
+                       COALESCE(SUM(cost), 0),
+                       COUNT(*) FILTER (WHERE create_uid = %s AND attempt_count > 0
+                                          AND create_date >= date_trunc('day', now() AT TIME ZONE 'UTC'))
+                  FROM pv_ai_call_log
+                 WHERE create_date >= date_trunc('month', now() AT TIME ZONE 'UTC')
+            """, (self.env.uid,))
+            daily_spend, monthly_spend, user_calls = cr.fetchone()
+        if settings['daily_budget'] and daily_spend >= settings['daily_budget']:
+            return f"Plafond de dépense journalier atteint ({daily_spend:.2f} / {settings['daily_budget']:.2f} USD)"
+        if settings['monthly_budget'] and monthly_spend >= settings['monthly_budget']:
+            return f"Plafond de dépense mensuel atteint ({monthly_spend:.2f} / {settings['monthly_budget']:.2f} USD)"
+        if settings['user_daily_quota'] and self.env.uid != SUPERUSER_ID and user_calls >= settings['user_daily_quota']:
+            return f"Quota journalier de l'utilisateur atteint ({user_calls} appels)"
+        return False
+
+    @api.model
+    def _acquire(self, estimated_tokens):
+        """Réserve un appel OpenAI: plafonds de dépense, quota utilisateur, puis requêtes et tokens par minute
+
+        Attend (au plus pv_management.ai_rate_max_wait secondes) que les seaux se remplissent.
+        Retourne False si l'appel peut partir, sinon le motif du refus (l'appelant sert le plan de secours).
+        """
+        settings = self._get_settings()
+        refusal = self._check_budget(settings)
+        if refusal:
+            return refusal
+
+        deadline = time.monotonic() + settings['max_wait']
+        while True:
+            wait = 0
+            if settings['requests_per_minute']:
+                wait = self._take('requests', 1, settings['requests_per_minute'])
+            if not wait and settings['tokens_per_minute']:
+                wait = self._take('tokens', estimated_tokens, settings['tokens_per_minute'])
+                if wait and settings['requests_per_minute']:
+                    self._give_back('requests', 1)
+            if not wait:
+                return False
+            if time.monotonic() + wait > deadline:
+                return f"Limite de débit OpenAI atteinte (attente estimée {wait:.0f}s)"
+            _logger.info(f"Limite de débit OpenAI: appel mis en attente {wait:.1f}s")
+            time.sleep(wait)
+
+    @api.model
+    def _settle(self, estimated_tokens, usage):
+        """Corrige le seau de tokens avec la consommation réelle (bloc usage de l'API)"""
+        settings = self._get_settings()
+        if not settings['tokens_per_minute'] or not usage:
+            return
+        reserved = min(estimated_tokens, settings['tokens_per_minute'])
+        self._give_back('tokens', reserved - (usage.get('total_tokens') or 0))
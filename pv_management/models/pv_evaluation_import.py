@@ -0,0 +1,173 @@
+from odoo import models, fields, api, _
+from odoo.exceptions import UserError
+from odoo.tools import split_every
+from datetime import date, datetime
+import base64
+import csv
+import io
+import logging
+
+_logger = logging.getLogger(__name__)
+
+try:
+    import openpyxl
+except ImportError:
+    openpyxl = None
+
+# Champ de pv.evaluation -> en-têtes acceptés (minuscules) dans les exports d'enquêtes
+COLUMN_ALIASES = {
+    'intervention': ['intervention', 'fiche intervention', 'référence intervention', 'intervention_id'],
+    'date_evaluation': ['date', "date d'évaluation", 'date_evaluation'],
+    'technician_rating': ['note globale', 'note', 'technician_rating'],
+    'technician_knowledge': ['connaissances', 'connaissances techniques', 'technician_knowledge'],
+    'technician_professionalism': ['professionnalisme', 'technician_professionalism'],
+    'technician_communication': ['communication', 'technician_communication'],
+    'technician_feedback': ['commentaire', 'commentaires', 'feedback', 'technician_feedback'],
+}
+
+RATING_FIELDS = ['technician_rating', 'technician_knowledge', 'technician_professionalism',
+                 'technician_communication']
+
+# Valeurs de note acceptées -> valeur de la sélection
+RATING_VALUES = {
+    'excellent': 'excellent', 'excellente': 'excellent', '4': 'excellent',
+    'good': 'good', 'bon': 'good', 'bonne': 'good', '3': 'good',
+    'average': 'average', 'moyen': 'average', 'moyenne': 'average', '2': 'average',
+    'poor': 'poor', 'mauvais': 'poor', 'mauvaise': 'poor', 'faible': 'poor', '1': 'poor',
+}
+
+DATE_FORMATS = ('%Y-%m-%d', '%d/%m/%Y', '%d-%m-%Y', '%Y-%m-%d %H:%M:%S', '%d/%m/%Y %H:%M')
+
+CREATE_BATCH_SIZE = 1000
+
+
+class PVEvaluationImport(models.TransientModel):
+    _name = 'pv.evaluation.import'
+    _description = 'Import des enquêtes de satisfaction (évaluations)'
+
+    file = fields.Binary(string='Fichier', required=True,
+                         help="Export CSV ou XLSX: une ligne par évaluation, colonne Intervention obligatoire")
+    filename = fields.Char(string='Nom du fichier')
+    delimiter = fields.Selection([
+        (',', 'Virgule'),
+        (';', 'Point-virgule'),
+        ('\t', 'Tabulation'),
+    ], string='Séparateur CSV', default=';', required=True)
+
+    def _read_rows(self):
+        """Lignes du fichier: liste de dicts {en-tête en minuscules: valeur}"""
+        self.ensure_one()
+        content = base64.b64decode(self.file)
+        if (self.filename or '').lower().endswith('.xlsx'):
+            if openpyxl is None:
+                raise UserError(_('La bibliothèque openpyxl est requise pour importer un fichier XLSX.'))
+            sheet = openpyxl.load_workbook(io.BytesIO(content), read_only=True, data_only=True).active
+            rows = sheet.iter_rows(values_only=True)
+        else:
+            text = content.decode('utf-8-sig', errors='replace')
+            rows = csv.reader(io.StringIO(text), delimiter=self.delimiter)
+        header = next(rows, None)
+        if not header:
+            raise UserError(_('Le fichier est vide.'))
+        header = [str(column or '').strip().lower() for column in header]
+        return [dict(zip(header, row)) for row in rows if any(cell not in (None, '') for cell in row)]
+
+    @api.model
+    def _map_columns(self, header):
+        """{champ: en-tête du fichier} pour les colonnes reconnues"""
+        mapping = {}
+        for field_name, aliases in COLUMN_ALIASES.items():
+            for alias in aliases:
+                if alias in header:
+                    mapping[field_name] = alias
+                    break
+        if 'intervention' not in mapping:
+            raise UserError(_('Colonne Intervention introuvable. En-têtes acceptés: %s')
+                            % ', '.join(COLUMN_ALIASES['intervention']))
+        return mapping
+
+    @api.model
+    def _parse_date(self, value):
+        if isinstance(value, datetime):
+            return value.date()
+        if isinstance(value, date):
+            return value
+        for date_format in DATE_FORMATS:
+            try:
+                return datetime.strptime(str(value).strip(), date_format).date()
+            except ValueError:
+                continue
+        return None
+
+    def action_import(self):
+        self.ensure_one()
+        rows = self._read_rows()
+        if not rows:
+            raise UserError(_('Aucune évaluation à importer.'))
+        mapping = self._map_columns(rows[0].keys())
+
+        # Interventions du fichier en une recherche
+        references = {str(row.get(mapping['intervention']) or '').strip() for row in rows}
+        interventions = self.env['fiche.intervention'].search_read(
+            [('name', 'in', list(references - {''}))], ['name', 'installation_id'])
+        intervention_by_name = {intervention['name']: intervention for intervention in interventions}
+
+        vals_list, errors = [], []
+        for line_number, row in enumerate(rows, start=2):
+            reference = str(row.get(mapping['intervention']) or '').strip()
+            intervention = intervention_by_name.get(reference)
+            if not intervention:
+                errors.append(_('Ligne %s: intervention "%s" introuvable') % (line_number, reference))
+                continue
+            if not intervention['installation_id']:
+                errors.append(_('Ligne %s: intervention "%s" sans installation') % (line_number, reference))
+                continue
+            vals = {
+                'intervention_id': intervention['id'],
+                'installation_id': intervention['installation_id'][0],
+                'state': 'done',
+            }
+            if 'date_evaluation' in mapping and row.get(mapping['date_evaluation']):
+                evaluation_date = self._parse_date(row[mapping['date_evaluation']])
+                if not evaluation_date:
+                    errors.append(_('Ligne %s: date "%s" invalide') % (line_number, row[mapping['date_evaluation']]))
+                    continue
+                vals['date_evaluation'] = evaluation_date
+            for field_name in RATING_FIELDS:
+                value = row.get(mapping.get(field_name))
+                if value in (None, ''):
+                    continue
+                text = str(value).strip().lower()
+                rating = RATING_VALUES.get(text[:-2] if text.endswith('.0') else text)
+                if rating:
+                    vals[field_name] = rating
+                else:
+                    errors.append(_('Ligne %s: note "%s" non reconnue (%s), ignorée') % (line_number, value, field_name))
+            if 'technician_feedback' in mapping and row.get(mapping['technician_feedback']):
+                vals['technician_feedback'] = str(row[mapping['technician_feedback']]).strip()
+            vals_list.append(vals)
+
+        # Création par lots: une insertion, une réservation de références, un recalcul des compteurs par lot
+        evaluation_model = self.env['pv.evaluation'].with_context(
+            tracking_disable=True, mail_create_nolog=True, mail_notrack=True)
+        created = 0
+        for batch in split_every(CREATE_BATCH_SIZE, vals_list, list):
+            created += len(evaluation_model.create(batch))
+        _logger.info(f"Import des évaluations ({self.filename}): {created} créée(s), {len(errors)} erreur(s)")
+
+        message = _('%s évaluation(s) importée(s) sur %s ligne(s).') % (created, len(rows))
+        if errors:
+            message += ' ' + _('Erreurs: %s') % ' • '.join(errors[:10])
+            if len(errors) > 10:
+                message += ' ' + _('(et %s autres)') % (len(errors) - 10)
+        return {
+            'type': 'ir.actions.client',
+            'tag': 'display_notification',
+            'params': {
+                'title': _('Import des évaluations'),
+                'message': message,
+                'sticky': bool(errors),
+                'type': 'warning' if errors else 'success',
+                'next': {'type': 'ir.actions.act_window_close'},
+            }
+        }
@@ -0,0 +1,253 @@
+from odoo import models, fields, api
+from datetime import timedelta
+import logging
+import random
+import threading
+import time
+
+_logger = logging.getLogger(__name__)
+
+# Préfixe des données synthétiques (catalogue réutilisé d'un appel à l'autre)
+SYNTHETIC_PREFIX = 'SYN'
+
+# Profil du parc: volumes du catalogue et distributions par installation
+FLEET_PROFILE = {
+    'brands': 8,
+    'modules': 40,
+    'inverters': 25,
+    'alarms': 60,
+    'districts': 12,
+    'installations_per_technician': 200,
+    'clients_per_installation': 0.8,
+    'reclamations_per_installation': 1.5,    # moyenne (loi exponentielle)
+    'alarm_zipf_exponent': 1.1,              # quelques codes d'alarme concentrent la majorité des réclamations
+    'intervention_rate': 0.85,
+    'response_rate_closed': 0.9,
+    'paid_rate': 0.75,
+    'evaluation_rate_closed': 0.6,
+    'history_days': 730,
+}
+
+INSTALLATION_TYPES = [('bt_residentiel', 70), ('bt_commercial', 20), ('mt_industriel', 10)]
+INSTALLATION_STATES = [('in_progress', 75), ('draft', 15), ('in_stop', 10)]
+INTERVENTION_TYPES = [('reparation', 45), ('maintenance', 30), ('inspection', 15), ('installation', 5), ('autre', 5)]
+INTERVENTION_STATES = [('closed', 70), ('in_progress', 20), ('draft', 10)]
+PRIORITIES = [('moyenne', 55), ('basse', 25), ('haute', 20)]
+RATINGS = [('good', 40), ('excellent', 30), ('average', 20), ('poor', 10)]
+ALARM_PARTS = [('onduleur', 50), ('module', 25), ('installation', 15), ('batterie', 5), ('autre', 5)]
+ALARM_SEVERITIES = [('warning', 45), ('error', 30), ('info', 15), ('critical', 10)]
+
+
+def _pick(rng, weighted):
+    values, weights = zip(*weighted)
+    return rng.choices(values, weights=weights)[0]
+
+
+class PVFleetGenerator(models.AbstractModel):
+    _name = 'pv.fleet.generator'
+    _description = 'Générateur de parc PV synthétique (tests de charge)'
+
+    @api.model
+    def _generate(self, installations=1000, seed=42, batch_size=1000, commit=False):
+        """Crée un parc synthétique et son historique (réclamations, interventions, réponses, évaluations)
+
+        Utilisation depuis le shell Odoo:
+            env['pv.fleet.generator']._generate(installations=10000, commit=True)
+
+        Les appels successifs ajoutent des installations au parc existant (catalogue partagé).
+        commit=True valide chaque lot (hors tests). Retourne le nombre d'enregistrements créés par modèle.
+        """
+        rng = random.Random(seed)
+        self = self.with_context(tracking_disable=True, mail_create_nolog=True, mail_notrack=True)
+        started = time.monotonic()
+        catalog = self._ensure_catalog(rng)
+        counts = dict.fromkeys(['res.partner', 'pv.installation', 'reclamation', 'fiche.intervention',
+                                'fiche.reponse', 'pv.evaluation'], 0)
+
+        remaining = installations
+        while remaining > 0:
+            size = min(batch_size, remaining)
+            batch_counts = self._generate_batch(rng, catalog, size)
+            for model_name, count in batch_counts.items():
+                counts[model_name] += count
+            remaining -= size
+            if commit and not getattr(threading.current_thread(), 'testing', False):
+                self.env.cr.commit()
+            _logger.info(f"Parc synthétique: {installations - remaining}/{installations} installations générées")
+
+        self.env.flush_all()
+        _logger.info(f"Parc synthétique généré en {time.monotonic() - started:.1f}s: {counts}")
+        return counts
+
+    @api.model
+    def _ensure_catalog(self, rng):
+        """Marques, modules, onduleurs, districts, codes d'alarme et techniciens synthétiques (créés une fois)"""
+        profile = FLEET_PROFILE
+
+        def _ensure(model_name, field_name, count, make_vals):
+            model = self.env[model_name]
+            existing = model.search([(field_name, '=like', f'{SYNTHETIC_PREFIX}-%')])
+            if len(existing) < count:
+                existing |= model.create([make_vals(i) for i in range(len(existing), count)])
+            return existing
+
+        brands = _ensure('marque.onduleur', 'name', profile['brands'], lambda i: {
+            'name': f'{SYNTHETIC_PREFIX}-Marque {i:02d}', 'code': f'M{i:02d}'})
+        districts = _ensure('configuration.district.steg', 'name', profile['districts'], lambda i: {
+            'name': f'{SYNTHETIC_PREFIX}-District {i:02d}'})
+        modules = _ensure('pv.module', 'reference', profile['modules'], lambda i: {
+            'reference': f'{SYNTHETIC_PREFIX}-MOD-{i:03d}',
+            'brand': brands[i % len(brands)].id,
+            'power': str(rng.choice([330, 375, 400, 450, 550])),
+        })
+        inverters = _ensure('pv.inverter', 'reference_onduleur_pv_id', profile['inverters'], lambda i: {
+            'reference_onduleur_pv_id': f'{SYNTHETIC_PREFIX}-OND-{i:03d}',
+            'marque_onduleur_pv_id': brands[i % len(brands)].id,
+            'puissance_onduleur_pv': str(rng.choice([3, 5, 8, 10, 20, 50])),
+        })
+        alarms = _ensure('alarm.management', 'code_alarm', profile['alarms'], lambda i: {
+            'name': f'Alarme synthétique {i:03d}',
+            'code_alarm': f'{SYNTHETIC_PREFIX}-{i:03d}',
+            'partie': _pick(rng, ALARM_PARTS),
+            'severity': _pick(rng, ALARM_SEVERITIES),
+            'marque_onduleur_id': brands[i % len(brands)].id,
+        })
+        technicians = self.env['hr.employee'].search([('name', '=like', f'{SYNTHETIC_PREFIX}-%')])
+        return {
+            'brands': brands,
+            'districts': districts,
+            'modules': modules,
+            'inverters': inverters,
+            'alarms': alarms.sorted('id'),
+            # Loi de Zipf: le rang k est tiré avec un poids 1 / k^s
+            'alarm_weights': [1 / (rank ** profile['alarm_zipf_exponent']) for rank in range(1, len(alarms) + 1)],
+            'technicians': technicians,
+        }
+
+    @api.model
+    def _ensure_technicians(self, catalog, installation_count):
+        """Ajoute des techniciens pour garder le ratio installations / technicien"""
+        technicians = catalog['technicians']
+        needed = max(5, installation_count // FLEET_PROFILE['installations_per_technician'])
+        if len(technicians) < needed:
+            technicians |= self.env['hr.employee'].create([
+                {'name': f'{SYNTHETIC_PREFIX}-Technicien {i:04d}'} for i in range(len(technicians), needed)
+            ])
+            catalog['technicians'] = technicians
+        return technicians
+
+    @api.model
+    def _generate_batch(self, rng, catalog, size):
+        profile = FLEET_PROFILE
+        now = fields.Datetime.now()
+        installation_total = self.env['pv.installation'].search_count([('name', '=like', f'{SYNTHETIC_PREFIX}-%')])
+        technicians = self._ensure_technicians(catalog, installation_total + size)
+
+        clients = self.env['res.partner'].create([
+            {'name': f'{SYNTHETIC_PREFIX}-Client {installation_total + i:06d}'}
+            for i in range(max(1, int(size * profile['clients_per_installation'])))
+        ])
+
+        installation_vals = []
+        for i in range(size):
+            installation_type = _pick(rng, INSTALLATION_TYPES)
+            installation_vals.append({
+                'name': f'{SYNTHETIC_PREFIX}-Installation {installation_total + i:06d}',
+                'client': rng.choice(clients).id,
+                'type_installation': installation_type,
+                'state': _pick(rng, INSTALLATION_STATES),
+                'district_steg_id': rng.choice(catalog['districts']).id,
+                'date_mise_en_service': (now - timedelta(days=rng.randint(30, 3650))).date(),
+                'puissance_souscrite': round(rng.lognormvariate(2.0 if installation_type == 'bt_residentiel' else 4.0, 0.5), 1),
+                'consommation_annuelle': int(rng.lognormvariate(8.5, 0.6)),
+                'module_ids': [(6, 0, rng.sample(catalog['modules'].ids, rng.randint(1, 3)))],
+                'inverters_ids': [(6, 0, rng.sample(catalog['inverters'].ids, rng.randint(1, 2)))],
+            })
+        installations = self.env['pv.installation'].create(installation_vals)
+
+        # Réclamations: nombre par installation suivant une loi exponentielle, codes d'alarme suivant Zipf
+        reclamation_vals = []
+        for installation in installations:
+            for _i in range(int(rng.expovariate(1 / profile['reclamations_per_installation']))):
+                alarm = rng.choices(catalog['alarms'], weights=catalog['alarm_weights'])[0]
+                date_heure = now - timedelta(minutes=rng.randint(60, profile['history_days'] * 24 * 60))
+                reclamation_vals.append({
+                    'date_heure': date_heure,
+                    'date_disponibilite': date_heure + timedelta(hours=rng.randint(1, 72)),
+                    'client_id': installation.client.id,
+                    'nom_central_id': installation.id,
+                    'code_alarm_id': alarm.id,
+                    'priorite_urgence': _pick(rng, PRIORITIES),
+                })
+        reclamations = self.env['reclamation'].create(reclamation_vals)
+
+        # Interventions: délai avant intervention en heures suivant une loi log-normale (médiane ~20 h)
+        intervention_vals, intervention_dates = [], []
+        for reclamation in reclamations:
+            if rng.random() > profile['intervention_rate']:
+                continue
+            delay_hours = min(rng.lognormvariate(3.0, 1.0), 24 * 60)
+            intervention_vals.append({
+                'type_intervention': _pick(rng, INTERVENTION_TYPES),
+                'state': _pick(rng, INTERVENTION_STATES),
+                'installation_id': reclamation.nom_central_id.id,
+                'reclamation_id': reclamation.id,
+                'code_alarm_id': reclamation.code_alarm_id.name,
+                'technicien_id': rng.choice(technicians).id,
+            })
+            intervention_dates.append(min(reclamation.date_heure + timedelta(hours=delay_hours), now))
+        interventions = self.env['fiche.intervention'].create(intervention_vals)
+        self._backdate_interventions(interventions, intervention_dates)
+
+        response_vals, evaluation_vals = [], []
+        for intervention, created in zip(interventions, intervention_dates):
+            if intervention.state != 'closed':
+                continue
+            if rng.random() < profile['response_rate_closed']:
+                response_vals.append({
+                    'intervention_id': intervention.id,
+                    'date_cloture': min(created + timedelta(hours=rng.lognormvariate(1.5, 0.8)), now),
+                    'montant_a_payer': round(rng.lognormvariate(5.0, 0.9), 2),
+                    'est_paye': 'oui' if rng.random() < profile['paid_rate'] else 'non',
+                })
+            if rng.random() < profile['evaluation_rate_closed']:
+                evaluation_vals.append({
+                    'intervention_id': intervention.id,
+                    'installation_id': intervention.installation_id.id,
+                    'date_evaluation': created.date(),
+                    'technician_rating': _pick(rng, RATINGS),
+                    'technician_knowledge': _pick(rng, RATINGS),
+                    'technician_professionalism': _pick(rng, RATINGS),
+                    'technician_communication': _pick(rng, RATINGS),
+                    'state': 'done',
+                })
+        self.env['fiche.reponse'].create(response_vals)
+        self.env['pv.evaluation'].create(evaluation_vals)
+
+        return {
+            'res.partner': len(clients),
+            'pv.installation': len(installations),
+            'reclamation': len(reclamations),
+            'fiche.intervention': len(interventions),
+            'fiche.reponse': len(response_vals),
+            'pv.evaluation': len(evaluation_vals),
+        }
+
+    @api.model
+    def _backdate_interventions(self, interventions, dates):
+        """create_date est un champ automatique: réaligné en SQL sur l'historique généré"""
+        if not interventions:
+            return
+        self.env.flush_all()
+        self.env.cr.execute("""
+            UPDATE fiche_intervention fi
+               SET create_date = data.create_date
+              FROM unnest(%s::int[], %s::timestamp[]) AS data(id, create_date)
+             WHERE fi.id = data.id
+        """, (interventions.ids, dates))
+        interventions.invalidate_recordset(['create_date'])
+        # Les statistiques de résolution dépendent de create_date, modifié hors ORM
+        alarms = interventions.reclamation_id.code_alarm_id
+        alarm_model = self.env['alarm.management']
+        for field_name in ('avg_resolution_time', 'resolution_rate'):
+            self.env.add_to_compute(alarm_model._fields[field_name], alarms)
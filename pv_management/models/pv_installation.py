@@ -14,7 +14,7 @@ class PVInstallation(models.Model):
     # Fields
     active = fields.Boolean(string='Active', default=True)
     name = fields.Char(string='Nom Instalation',required=True)
-    code = fields.Char(string='Code', readonly=True, copy=False, default=lambda self: self.env['ir.sequence'].next_by_code('pv.installation.sequence') or 'Nouveau')
+    code = fields.Char(string='Code', readonly=True, copy=False, default='Nouveau')
     client = fields.Many2one('res.partner', string='Client')
     cli = fields.Char(related='client.name', string='CLient', readonly=True)
     date_mise_en_service = fields.Date(string='Date d\'installation')
@@ -48,11 +48,10 @@ class PVInstallation(models.Model):
         tracking=True
     )
 
-    @api.model
-    def create(self, vals):
-        if vals.get('code', 'Nouveau') == 'Nouveau':
-            vals['code'] = self.env['ir.sequence'].next_by_code('pv.installation.sequence') or 'Nouveau'
-        return super(PVInstallation, self).create(vals)
+    @api.model_create_multi
+    def create(self, vals_list):
+        self.env['pv.sequence.service']._assign(vals_list, 'code', 'pv.installation.sequence', 'Nouveau')
+        return super(PVInstallation, self).create(vals_list)
 
     # State Change Methods
     def action_draft(self):
@@ -1,12 +1,23 @@
 from odoo import models, fields, api, _
 import json
 import logging
+import re
+from collections import defaultdict
 from datetime import datetime, timedelta
-import requests
+from concurrent.futures import ThreadPoolExecutor, wait, ALL_COMPLETED, FIRST_COMPLETED
 from odoo.exceptions import UserError, ValidationError
+from . import openai_client
+from . import prompt_builder
+from .pv_perf_metric import instrumented, add_token_usage
 
 _logger = logging.getLogger(__name__)
 
+# Lecture incrémentale d'un plan d'action JSON reçu en streaming
+_PLAN_DECODER = json.JSONDecoder()
+_PLAN_DIAGNOSTIC_RE = re.compile(r'"diagnostic"\s*:\s*')
+_PLAN_STEPS_RE = re.compile(r'"action_steps"\s*:\s*\[')
+_PLAN_SEPARATOR_RE = re.compile(r'[\s,]*')
+
 
 class PVOpenAIService(models.AbstractModel):
     _name = 'pv.management.openai.service'
@@ -25,6 +36,33 @@ class PVOpenAIService(models.AbstractModel):
             _logger.error(f"Erreur lors de la récupération de la clé API: {str(e)}")
             return False
 
+    @api.model
+    def _get_int_param(self, key, default):
+        """Paramètre système entier, valeur par défaut si absent ou invalide"""
+        value = self.env['ir.config_parameter'].sudo().get_param(key, default)
+        try:
+            return int(value)
+        except (TypeError, ValueError):
+            _logger.warning(f"Paramètre {key} invalide ({value}), valeur par défaut utilisée: {default}")
+            return default
+
+    @api.model
+    def _get_http_options(self):
+        """Timeouts et politique de rejeu lus dans les paramètres système"""
+        params = self.env['ir.config_parameter'].sudo()
+
+        def _param(key, default, cast):
+            try:
+                return cast(params.get_param(key, default))
+            except (TypeError, ValueError):
+                return default
+
+        return {
+            'connect_timeout': _param('pv_management.ai_connect_timeout', openai_client.DEFAULT_CONNECT_TIMEOUT, float),
+            'read_timeout': _param('pv_management.ai_read_timeout', openai_client.DEFAULT_READ_TIMEOUT, float),
+            'max_retries': _param('pv_management.ai_max_retries', openai_client.DEFAULT_MAX_RETRIES, int),
+        }
+
     @api.model
     def _test_api_key(self):
         """Teste si la clé API est valide"""
@@ -32,42 +70,87 @@ class PVOpenAIService(models.AbstractModel):
         if not api_key:
             return False, "Clé API non trouvée"
 
-        headers = {
-            "Authorization": f"Bearer {api_key}",
-            "Content-Type": "application/json"
-        }
-
         # Test simple avec l'endpoint models
-        try:
-            response = requests.get(
-                "https://api.openai.com/v1/models",
-                headers=headers,
-                timeout=10
-            )
-
-            if response.status_code == 200:
-                return True, "Clé API valide"
-            elif response.status_code == 401:
-                return False, "Clé API invalide"
-            else:
-                return False, f"Erreur {response.status_code}: {response.text}"
-
-        except Exception as e:
-            return False, f"Erreur de connexion: {str(e)}"
+        options = self._get_http_options()
+        options.update(read_timeout=10, max_retries=1)
+        response, attempts = openai_client.request_with_retry('GET', '/models', api_key, **options)
+
+        if response is None:
+            return False, f"Erreur de connexion: {attempts[-1]['error']}"
+        if response.status_code == 200:
+            return True, "Clé API valide"
+        elif response.status_code == 401:
+            return False, "Clé API invalide"
+        else:
+            return False, f"Erreur {response.status_code}: {response.text}"
 
     @api.model
-    def _make_openai_request(self, messages, model="gpt-4o-mini", temperature=0.7):
-        """Faire une requête à l'API OpenAI"""
+    @instrumented('openai')
+    def _make_openai_request(self, messages, model="gpt-4o-mini", temperature=0.7, use_cache=True, caller='other',
+                             on_delta=None):
+        """Faire une requête à l'API OpenAI
+
+        Les réponses sont mises en cache (pv.ai.cache) selon pv_management.ai_cache_duration.
+        use_cache=False force un nouvel appel, dont la réponse rafraîchit le cache.
+        caller: origine de l'appel dans le journal pv.ai.call.log.
+        on_delta: si fourni, la réponse est reçue en streaming et on_delta(contenu reçu) est
+        appelé à chaque fragment (une réponse servie par le cache est retournée directement).
+        """
+        call_log = self.env['pv.ai.call.log'].sudo()
         api_key = self._get_api_key()
         if not api_key:
+            call_log._log_calls([{'caller': caller, 'model': model, 'fallback_used': True,
+                                  'error': 'Clé API non configurée'}])
             return False
 
-        headers = {
-            "Content-Type": "application/json",
-            "Authorization": f"Bearer {api_key}"
-        }
+        cache = self.env['pv.ai.cache'].sudo()
+        cache_key = cache._make_key(messages, model, temperature)
+        if use_cache:
+            cached_content = cache._lookup(cache_key)
+            if cached_content:
+                _logger.info("Réponse OpenAI servie depuis le cache")
+                call_log._log_calls([{'caller': caller, 'model': model, 'cache_hit': True}])
+                return cached_content
+
+        # Limites de débit et de dépense avant le disjoncteur: un refus ne doit pas consommer la sonde
+        limiter = self.env['pv.ai.rate.limiter'].sudo()
+        estimated_tokens = limiter._estimate_tokens(messages)
+        refusal = limiter._acquire(estimated_tokens)
+        if refusal:
+            _logger.warning(f"{refusal}: appel ignoré, plan de secours")
+            call_log._log_calls([{'caller': caller, 'model': model, 'fallback_used': True, 'error': refusal}])
+            return False
 
-        payload = {
+        breaker = self.env['pv.ai.circuit.breaker'].sudo()
+        if not breaker._allow_request():
+            _logger.warning("Disjoncteur OpenAI ouvert: appel ignoré, plan de secours")
+            limiter._settle(estimated_tokens, {'total_tokens': 0})
+            call_log._log_calls([{'caller': caller, 'model': model, 'fallback_used': True,
+                                  'error': 'Disjoncteur ouvert'}])
+            return False
+
+        _logger.info("Envoi de la requête à OpenAI...")
+        payload = self._prepare_chat_payload(messages, model, temperature)
+        if on_delta:
+            result = openai_client.chat_completion_stream(api_key, payload, on_delta, **self._get_http_options())
+            if result['first_token_ms'] is not None:
+                _logger.info(f"Premier fragment OpenAI reçu en {result['first_token_ms']:.0f} ms")
+        else:
+            result = openai_client.chat_completion(api_key, payload, **self._get_http_options())
+        self._log_chat_result(result)
+        breaker._record_result(result)
+        limiter._settle(estimated_tokens, result['usage'] or {'total_tokens': 0})
+        call_log._log_calls([call_log._entry_from_result(caller, model, result)])
+
+        if not result['content']:
+            return False
+
+        cache._store(cache_key, model, result['content'])
+        return result['content']
+
+    @api.model
+    def _prepare_chat_payload(self, messages, model="gpt-4o-mini", temperature=0.7):
+        return {
             "model": model,
             "messages": messages,
             "temperature": temperature,
@@ -75,212 +158,383 @@ class PVOpenAIService(models.AbstractModel):
             "max_tokens": 3000
         }
 
+    @api.model
+    def _log_chat_result(self, result):
+        add_token_usage(result['usage'])
+        total_latency = sum(attempt['latency_ms'] for attempt in result['attempts'])
+        _logger.info(f"Status Code: {result['status'] or 'N/A'} "
+                     f"({len(result['attempts'])} tentative(s), {total_latency:.0f} ms)")
+        if result['content']:
+            _logger.info("Réponse OpenAI reçue avec succès")
+        else:
+            _logger.error(f"Erreur lors de la requête OpenAI: {result['error']}")
+
+    @api.model
+    @instrumented('openai')
+    def _make_openai_requests_parallel(self, messages_by_key, model="gpt-4o-mini", temperature=0.7,
+                                       use_cache=True, max_workers=4, caller='other'):
+        """Envoie plusieurs requêtes OpenAI en parallèle.
+
+        messages_by_key: {clé: messages}. Retourne {clé: contenu ou False}.
+        Seuls les appels HTTP tournent dans le pool de threads; cache, curseur
+        et journal des appels restent sur le thread principal.
+        """
+        call_log = self.env['pv.ai.call.log'].sudo()
+        api_key = self._get_api_key()
+        if not api_key:
+            call_log._log_calls([{'caller': caller, 'model': model, 'fallback_used': True,
+                                  'error': 'Clé API non configurée'}] * len(messages_by_key))
+            return dict.fromkeys(messages_by_key, False)
+
+        cache = self.env['pv.ai.cache'].sudo()
+        contents = {}
+        pending = {}
+        for key, messages in messages_by_key.items():
+            cache_key = cache._make_key(messages, model, temperature)
+            cached_content = cache._lookup(cache_key) if use_cache else False
+            if cached_content:
+                contents[key] = cached_content
+            else:
+                pending[key] = (cache_key, self._prepare_chat_payload(messages, model, temperature))
+
+        log_entries = [{'caller': caller, 'model': model, 'cache_hit': True}] * len(contents)
+        if not pending:
+            call_log._log_calls(log_entries)
+            return contents
+
+        # Limites de débit et de dépense: chaque requête réserve ses jetons juste avant son envoi
+        # (au plus max_workers en vol) et les règle dès sa réponse; les refusées passent en secours.
+        # Le disjoncteur est consulté après la première réservation: un refus ne consomme pas la sonde.
+        limiter = self.env['pv.ai.rate.limiter'].sudo()
+        breaker = self.env['pv.ai.circuit.breaker'].sudo()
+        options = self._get_http_options()
+        workers = max(max_workers, 1)
+        estimated_tokens = {}
+        skipped = {'rate': 0, 'breaker': 0}
+        breaker_state = None
+        in_flight = {}
+
+        def _collect(key, cache_key, result):
+            self._log_chat_result(result)
+            breaker._record_result(result)
+            limiter._settle(estimated_tokens[key], result['usage'] or {'total_tokens': 0})
+            log_entries.append(call_log._entry_from_result(caller, model, result))
+            if result['content']:
+                cache._store(cache_key, model, result['content'])
+            contents[key] = result['content']
+
+        def _skip(key, error):
+            contents[key] = False
+            log_entries.append({'caller': caller, 'model': model, 'fallback_used': True, 'error': error})
+
+        def _drain(return_when):
+            done, _not_done = wait(in_flight, return_when=return_when)
+            for future in done:
+                key, cache_key = in_flight.pop(future)
+                _collect(key, cache_key, future.result())
+
+        _logger.info(f"Envoi de {len(pending)} requêtes OpenAI ({workers} en parallèle, "
+                     f"{len(contents)} servies par le cache)")
         try:
-            _logger.info("Envoi de la requête à OpenAI...")
-
-            response = requests.post(
-                "https://api.openai.com/v1/chat/completions",
-                headers=headers,
-                json=payload,
-                timeout=60
-            )
-
-            _logger.info(f"Status Code: {response.status_code}")
-
-            if response.status_code == 200:
-                result = response.json()
-                if 'choices' in result and len(result['choices']) > 0:
-                    content = result['choices'][0]['message']['content']
-                    _logger.info("Réponse OpenAI reçue avec succès")
-                    return content
-                else:
-                    _logger.error(f"Format de réponse inattendu: {result}")
-                    return False
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                for key, (cache_key, payload) in pending.items():
+                    if breaker_state is False:
+                        skipped['breaker'] += 1
+                        _skip(key, 'Disjoncteur ouvert')
+                        continue
+                    if len(in_flight) >= workers:
+                        _drain(FIRST_COMPLETED)
+                    estimated_tokens[key] = limiter._estimate_tokens(messages_by_key[key])
+                    refusal = limiter._acquire(estimated_tokens[key])
+                    if refusal:
+                        skipped['rate'] += 1
+                        _skip(key, refusal)
+                        continue
+                    if breaker_state != 'closed':
+                        breaker_state = breaker._allow_request()
+                        if not breaker_state:
+                            limiter._settle(estimated_tokens[key], {'total_tokens': 0})
+                            skipped['breaker'] += 1
+                            _skip(key, 'Disjoncteur ouvert')
+                            continue
+                        if breaker_state == 'probe':
+                            # Semi-ouvert: une seule requête de sonde avant de relancer le lot
+                            _collect(key, cache_key, openai_client.chat_completion(api_key, payload, **options))
+                            breaker_state = None
+                            continue
+                    in_flight[executor.submit(openai_client.chat_completion, api_key, payload, **options)] = (
+                        key, cache_key)
+                if in_flight:
+                    _drain(ALL_COMPLETED)
+        finally:
+            call_log._log_calls(log_entries)
+
+        if skipped['rate']:
+            _logger.warning(f"Limites OpenAI: {skipped['rate']} requête(s) en secours")
+        if skipped['breaker']:
+            _logger.warning(f"Disjoncteur OpenAI ouvert: {skipped['breaker']} requête(s) ignorée(s), plans de secours")
+        return contents
+
+    @api.model
+    def _collect_technicians_evaluations(self, technician_ids, new_ids_by_id=None):
+        """Evaluation data of several technicians in one prefetched search: {technician id: eval_data}
+
+        Evaluations are listed most recent first (see _build_technician_messages).
+        new_ids_by_id: {technician id: evaluation ids} for incremental analyses. 'evaluations' then
+        only holds these evaluations (new or modified since the previous analysis, see
+        hr.employee._get_ai_evaluation_versions), 'all_evaluations' the whole history (fallback
+        analysis). Technicians without any matching evaluation are left out.
+        """
+        new_ids_by_id = new_ids_by_id or {}
+        evaluations = self.env['pv.evaluation'].search([('technicien_id', 'in', list(technician_ids))],
+                                                       order='date_evaluation desc nulls first, id desc')
+        evaluations_by_technician = defaultdict(list)
+        for evaluation in evaluations:
+            evaluations_by_technician[evaluation.technicien_id.id].append(evaluation)
+
+        result = {}
+        for technician_id, technician_evaluations in evaluations_by_technician.items():
+            new_ids = new_ids_by_id.get(technician_id)
+            all_infos = [{
+                'date': str(evaluation.date_evaluation),
+                'technician_rating': evaluation.technician_rating,
+                'technical_knowledge': evaluation.technician_knowledge,
+                'professionalism': evaluation.technician_professionalism,
+                'communication': evaluation.technician_communication,
+                'feedback': evaluation.technician_feedback or 'Aucun commentaire'
+            } for evaluation in technician_evaluations]
+            if new_ids is not None:
+                infos = [info for evaluation, info in zip(technician_evaluations, all_infos)
+                         if evaluation.id in new_ids]
             else:
-                error_text = response.text
-                _logger.error(f"Erreur API OpenAI {response.status_code}: {error_text}")
-                return False
+                infos = all_infos
+            if not infos:
+                continue
+            result[technician_id] = {
+                'technician_id': technician_id,
+                'technician_name': technician_evaluations[0].technicien_id.name,
+                'total_evaluations': len(all_infos),
+                'new_evaluations': len(infos) if new_ids is not None else None,
+                'evaluations': infos,
+                'all_evaluations': all_infos,
+            }
+        return result
 
-        except Exception as e:
-            _logger.error(f"Erreur lors de la requête OpenAI: {str(e)}")
-            return False
+    @api.model
+    def _collect_technician_evaluations(self, technician_id, evaluation_ids=None):
+        """Evaluation data of one technician (see _collect_technicians_evaluations), None if none"""
+        new_ids_by_id = {technician_id: evaluation_ids} if evaluation_ids is not None else None
+        return self._collect_technicians_evaluations([technician_id], new_ids_by_id).get(technician_id)
+
+    def _parse_technician_analysis(self, response, eval_data):
+        """Result of an analysis from the OpenAI response, fallback analysis on the whole history otherwise"""
+        if response:
+            try:
+                analysis = json.loads(response)
+                analysis['html_content'] = self._format_technician_analysis_html(analysis, eval_data)
+                return {
+                    'success': True,
+                    'analysis': analysis
+                }
+            except json.JSONDecodeError:
+                pass  # Will fallback to simple analysis
+        return self._get_fallback_technician_analysis(dict(eval_data, evaluations=eval_data['all_evaluations']))
 
     @api.model
-    def analyze_technician_performance(self, technician_id):
+    def analyze_technician_performance(self, technician_id, force_refresh=False, previous_analysis=None,
+                                       evaluation_ids=None):
         """
         Analyze technician evaluations and provide improvement recommendations
+        force_refresh: ignore the response cache and regenerate the analysis
+        previous_analysis, evaluation_ids: incremental mode. Only the previous structured analysis and
+        the evaluations of evaluation_ids (new or modified since that analysis) are sent. Without any
+        such evaluation the previous analysis is still valid: returns {'success': True, 'unchanged': True}
+        without API call.
         """
         try:
             _logger.info(f"Starting technician analysis for ID: {technician_id}")
-
-            # Get all evaluations for this technician
-            evaluations = self.env['pv.evaluation'].search([
-                ('technicien_id', '=', technician_id)
-            ])
-
-            if not evaluations:
+            incremental = bool(previous_analysis) and evaluation_ids is not None
+
+            eval_data = self._collect_technician_evaluations(
+                technician_id, evaluation_ids=evaluation_ids if incremental else None)
+            if not eval_data:
+                if incremental:
+                    _logger.info(f"Aucune nouvelle évaluation pour le technicien {technician_id}: analyse conservée")
+                    return {'success': True, 'unchanged': True}
                 return {
                     'success': False,
                     'message': 'Aucune évaluation trouvée pour ce technicien'
                 }
 
-            # Prepare evaluation data
-            eval_data = {
-                'technician_name': evaluations[0].technicien_id.name,
-                'total_evaluations': len(evaluations),
-                'evaluations': []
-            }
-
-            # Collect evaluation details
-            for evaluation in evaluations:
-                eval_info = {
-                    'date': str(evaluation.date_evaluation),
-                    'technician_rating': evaluation.technician_rating,
-                    'technical_knowledge': evaluation.technician_knowledge,
-                    'professionalism': evaluation.technician_professionalism,
-                    'communication': evaluation.technician_communication,
-                    'feedback': evaluation.technician_feedback or 'Aucun commentaire'
-                }
-                eval_data['evaluations'].append(eval_info)
-
             # Try AI analysis first, fallback to simple analysis if it fails
             api_key = self._get_api_key()
             if api_key:
-                # Create AI prompt
-                system_prompt = """
-                Tu es un expert en ressources humaines spécialisé dans l'évaluation des techniciens.
-                Analyse les évaluations d'un technicien et fournis des conseils d'amélioration pratiques.
+                messages = self._build_technician_messages(
+                    eval_data, previous_analysis=previous_analysis if incremental else None)
 
-                Réponds UNIQUEMENT avec un objet JSON dans ce format:
-                {
-                    "overall_rating": "excellent|good|average|needs_improvement",
-                    "strengths": ["Point fort 1", "Point fort 2"],
-                    "areas_for_improvement": ["Domaine 1", "Domaine 2"],
-                    "specific_recommendations": [
-                        {
-                            "area": "Communication",
-                            "current_level": "average", 
-                            "recommendation": "Conseil spécifique",
-                            "action_plan": "Plan d'action concret"
-                        }
-                    ],
-                    "training_suggestions": ["Formation 1", "Formation 2"],
-                    "priority_focus": "Le domaine le plus important à améliorer",
-                    "summary": "Résumé en 2-3 phrases"
-                }
-                """
+                # Make OpenAI request
+                response = self._make_openai_request(messages, use_cache=not force_refresh,
+                                                    caller='technician_analysis')
+                return self._parse_technician_analysis(response, eval_data)
 
-                user_prompt = f"""
-                ANALYSE DU TECHNICIEN: {eval_data['technician_name']}
+            # Fallback to simple analysis (on the whole history)
+            return self._parse_technician_analysis(False, eval_data)
 
-                Nombre total d'évaluations: {eval_data['total_evaluations']}
+        except Exception as e:
+            _logger.error(f"Erreur analyse technicien: {str(e)}")
+            return {
+                'success': False,
+                'message': f'Erreur technique: {str(e)}'
+            }
+
+    @api.model
+    def analyze_technicians_performance(self, requests_by_id, force_refresh=False, max_workers=4):
+        """Analyze several technicians, OpenAI calls in parallel (batch mode)
 
-                Détails des évaluations:
-                """
+        requests_by_id: {technician id: (previous_analysis, evaluation_ids)}, both None for a full analysis.
+        Returns {technician id: result} with the results of analyze_technician_performance.
+        Technicians whose evaluations are unchanged since their last analysis get {'unchanged': True}.
+        """
+        new_ids_by_id = {technician_id: evaluation_ids
+                         for technician_id, (previous, evaluation_ids) in requests_by_id.items()
+                         if previous and evaluation_ids is not None}
+        eval_data_by_id = self._collect_technicians_evaluations(requests_by_id.keys(), new_ids_by_id)
+
+        results = {}
+        messages_by_id = {}
+        for technician_id, (previous, _evaluation_ids) in requests_by_id.items():
+            eval_data = eval_data_by_id.get(technician_id)
+            if not eval_data:
+                results[technician_id] = ({'success': True, 'unchanged': True} if technician_id in new_ids_by_id else
+                                          {'success': False, 'message': 'Aucune évaluation trouvée pour ce technicien'})
+                continue
+            try:
+                messages_by_id[technician_id] = self._build_technician_messages(
+                    eval_data, previous_analysis=previous if technician_id in new_ids_by_id else None)
+            except Exception as e:
+                _logger.error(f"Erreur de préparation du prompt pour le technicien {technician_id}: {str(e)}")
 
-                for i, evaluation in enumerate(eval_data['evaluations'], 1):
-                    user_prompt += f"""
+        contents = self._make_openai_requests_parallel(
+            messages_by_id, use_cache=not force_refresh, max_workers=max_workers, caller='technician_analysis')
 
-                Évaluation {i} ({evaluation['date']}):
-                - Note globale: {evaluation['technician_rating']}
-                - Connaissances techniques: {evaluation['technical_knowledge']}
-                - Professionnalisme: {evaluation['professionalism']}
-                - Communication: {evaluation['communication']}
-                - Commentaires: {evaluation['feedback']}
-                    """
+        # Scores des analyses de secours du lot: une seule requête groupée
+        if not all(contents.get(technician_id) for technician_id in eval_data_by_id):
+            scores_by_id = self.env['pv.evaluation']._get_technician_scores(list(eval_data_by_id))
+            for technician_id, eval_data in eval_data_by_id.items():
+                eval_data['scores'] = scores_by_id.get(technician_id, {})
 
-                user_prompt += """
+        for technician_id, eval_data in eval_data_by_id.items():
+            try:
+                results[technician_id] = self._parse_technician_analysis(contents.get(technician_id), eval_data)
+            except Exception as e:
+                _logger.error(f"Erreur analyse technicien {technician_id}: {str(e)}")
+                results[technician_id] = {'success': False, 'message': f'Erreur technique: {str(e)}'}
+        return results
 
-                Fournis une analyse complète avec des recommandations d'amélioration spécifiques et actionnables.
-                """
+    @api.model
+    def _get_prompt_token_budget(self):
+        return self._get_int_param('pv_management.ai_prompt_token_budget', prompt_builder.DEFAULT_TOKEN_BUDGET)
 
-                messages = [
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_prompt}
-                ]
+    def _build_technician_messages(self, eval_data, previous_analysis=None):
+        """Messages de l'analyse d'un technicien, historique des évaluations compacté au budget
 
-                # Make OpenAI request
-                response = self._make_openai_request(messages)
-
-                if response:
-                    try:
-                        analysis = json.loads(response)
-                        analysis['html_content'] = self._format_technician_analysis_html(analysis, eval_data)
-                        return {
-                            'success': True,
-                            'analysis': analysis
-                        }
-                    except json.JSONDecodeError:
-                        pass  # Will fallback to simple analysis
-
-            # Fallback to simple analysis
-            return self._get_fallback_technician_analysis(eval_data)
+        Les évaluations récentes et celles qui portent un commentaire ou une note faible sont
+        citées; les autres sont résumées par trimestre (effectifs et distributions des notes).
+        previous_analysis: analyse structurée précédente, à mettre à jour avec les seules
+        évaluations de eval_data (nouvelles depuis cette analyse).
+        """
+        system_prompt = """
+        Tu es un expert en ressources humaines spécialisé dans l'évaluation des techniciens.
+        Analyse les évaluations d'un technicien et fournis des conseils d'amélioration pratiques.
+        Les évaluations anciennes peuvent être résumées par trimestre (nombre et distribution des notes).
+
+        Réponds UNIQUEMENT avec un objet JSON dans ce format:
+        {
+            "overall_rating": "excellent|good|average|needs_improvement",
+            "strengths": ["Point fort 1", "Point fort 2"],
+            "areas_for_improvement": ["Domaine 1", "Domaine 2"],
+            "specific_recommendations": [
+                {
+                    "area": "Communication",
+                    "current_level": "average",
+                    "recommendation": "Conseil spécifique",
+                    "action_plan": "Plan d'action concret"
+                }
+            ],
+            "training_suggestions": ["Formation 1", "Formation 2"],
+            "priority_focus": "Le domaine le plus important à améliorer",
+            "summary": "Résumé en 2-3 phrases"
+        }
+        """
 
-        except Exception as e:
-            _logger.error(f"Erreur analyse technicien: {str(e)}")
-            return {
-                'success': False,
-                'message': f'Erreur technique: {str(e)}'
-            }
+        def render(evaluation):
+            return (f"Évaluation du {evaluation['date']}: note globale {evaluation['technician_rating']}, "
+                    f"connaissances {evaluation['technical_knowledge']}, "
+                    f"professionnalisme {evaluation['professionalism']}, "
+                    f"communication {evaluation['communication']}. Commentaires: {evaluation['feedback']}")
+
+        def period(evaluation):
+            if evaluation['date'] in ('False', 'None'):
+                return 'Sans date'
+            year, month = evaluation['date'][:4], int(evaluation['date'][5:7])
+            return f"{year}-T{(month - 1) // 3 + 1}"
+
+        def summarize(key, evaluations):
+            with_feedback = sum(1 for evaluation in evaluations if evaluation['feedback'] != 'Aucun commentaire')
+            return (f"- {key}: {len(evaluations)} évaluation(s); "
+                    f"note globale: {prompt_builder.format_distribution([e['technician_rating'] for e in evaluations])}; "
+                    f"connaissances: {prompt_builder.format_distribution([e['technical_knowledge'] for e in evaluations])}; "
+                    f"professionnalisme: {prompt_builder.format_distribution([e['professionalism'] for e in evaluations])}; "
+                    f"communication: {prompt_builder.format_distribution([e['communication'] for e in evaluations])}; "
+                    f"{with_feedback} avec commentaire")
+
+        def informativeness(evaluation):
+            low_ratings = sum(1 for field in ('technician_rating', 'technical_knowledge', 'professionalism',
+                                              'communication') if evaluation[field] in ('poor', 'average'))
+            has_feedback = evaluation['feedback'] != 'Aucun commentaire'
+            return low_ratings + (2 if has_feedback else 0)
+
+        builder = prompt_builder.PromptBuilder(system_prompt, self._get_prompt_token_budget())
+        builder.add_section(f"ANALYSE DU TECHNICIEN: {eval_data['technician_name']}", [
+            f"Nombre total d'évaluations: {eval_data['total_evaluations']}",
+        ])
+        if previous_analysis:
+            builder.add_section("ANALYSE PRÉCÉDENTE (à mettre à jour)", [
+                json.dumps(previous_analysis, ensure_ascii=False),
+            ])
+            builder.add_history(f"NOUVELLES ÉVALUATIONS DEPUIS L'ANALYSE PRÉCÉDENTE ({eval_data['new_evaluations']})",
+                                eval_data['evaluations'], render, period, summarize,
+                                keep=20, informativeness=informativeness)
+            builder.add_section(None, [
+                "Mets à jour l'analyse précédente en tenant compte des nouvelles évaluations: conserve ce qui "
+                "reste valable, corrige ce que les nouvelles évaluations contredisent. Même format JSON.",
+            ])
+        else:
+            builder.add_history('DÉTAILS DES ÉVALUATIONS', eval_data['evaluations'], render, period, summarize,
+                                keep=20, informativeness=informativeness)
+            builder.add_section(None, [
+                "Fournis une analyse complète avec des recommandations d'amélioration spécifiques et actionnables.",
+            ])
+        messages = builder.build()
+        _logger.info(f"Prompt analyse technicien: {builder.stats['verbatim']} évaluations citées, "
+                     f"{builder.stats['compacted']} résumées, ~{builder.stats['tokens']} tokens")
+        return messages
 
     @api.model
     def _get_fallback_technician_analysis(self, eval_data):
         """Fallback analysis if AI fails"""
         _logger.info("Génération du plan de secours pour l'analyse technicien")
 
-        evaluations = eval_data['evaluations']
-
-        # Calculate averages
-        ratings = {
-            'technician_rating': [],
-            'technical_knowledge': [],
-            'professionalism': [],
-            'communication': []
-        }
-
-        for evaluation in evaluations:
-            for field in ratings.keys():
-                value = evaluation.get(field)
-                if value in ['excellent', 'good', 'average', 'poor']:
-                    score = {'excellent': 4, 'good': 3, 'average': 2, 'poor': 1}[value]
-                    ratings[field].append(score)
-
-        # Determine weak areas
-        weak_areas = []
-        strengths = []
-
-        for field, scores in ratings.items():
-            if scores:
-                avg = sum(scores) / len(scores)
-                field_name = {
-                    'technician_rating': 'Performance globale',
-                    'technical_knowledge': 'Connaissances techniques',
-                    'professionalism': 'Professionnalisme',
-                    'communication': 'Communication'
-                }[field]
-
-                if avg < 2.5:
-                    weak_areas.append(field_name)
-                elif avg > 3.5:
-                    strengths.append(field_name)
-
-        # Determine overall rating
-        all_scores = []
-        for scores in ratings.values():
-            all_scores.extend(scores)
-
-        if all_scores:
-            overall_avg = sum(all_scores) / len(all_scores)
-            if overall_avg >= 3.5:
-                overall_rating = 'excellent'
-            elif overall_avg >= 2.5:
-                overall_rating = 'good'
-            elif overall_avg >= 1.5:
-                overall_rating = 'average'
-            else:
-                overall_rating = 'needs_improvement'
-        else:
-            overall_rating = 'average'
+        # Scores agrégés en SQL sur tout l'historique (colonnes de score de pv.evaluation)
+        scores = eval_data.get('scores')
+        if scores is None:
+            scores = self.env['pv.evaluation']._get_technician_scores([eval_data['technician_id']]).get(
+                eval_data['technician_id'], {})
+        weak_areas = scores.get('weak_areas', [])
+        strengths = scores.get('strengths', [])
+        overall_rating = scores.get('overall_rating', 'average')
+        overall_avg = scores.get('overall')
+        average_text = f"Note moyenne: {overall_avg:.1f}/4" if overall_avg is not None else "Aucune note renseignée"
 
         analysis = {
             'overall_rating': overall_rating,
@@ -296,14 +550,15 @@ class PVOpenAIService(models.AbstractModel):
             ],
             'training_suggestions': ['Formation technique PV', 'Communication client', 'Gestion du temps'],
             'priority_focus': weak_areas[0] if weak_areas else 'Maintenir le niveau actuel',
-            'summary': f'Basé sur {len(evaluations)} évaluations. Note moyenne: {overall_avg:.1f}/4. Focus recommandé sur {weak_areas[0] if weak_areas else "le maintien du niveau actuel"}.'
+            'summary': f'Basé sur {scores.get("count", 0)} évaluations. {average_text}. Focus recommandé sur {weak_areas[0] if weak_areas else "le maintien du niveau actuel"}.'
         }
 
         analysis['html_content'] = self._format_technician_analysis_html(analysis, eval_data)
 
         return {
             'success': True,
-            'analysis': analysis
+            'analysis': analysis,
+            'is_fallback': True,
         }
 
     @api.model
@@ -434,134 +689,201 @@ class PVOpenAIService(models.AbstractModel):
     # ========== ORIGINAL ALARM METHODS - KEEPING YOUR PREFERRED STYLE ==========
 
     @api.model
-    def generate_alarm_action_plan(self, alarm_data):
-        """Génère un plan d'action pour un code d'alarme avec données enrichies"""
+    def generate_alarm_action_plan(self, alarm_data, force_refresh=False, on_section=None):
+        """Génère un plan d'action pour un code d'alarme avec données enrichies
+
+        force_refresh: ignore le cache des réponses et force une nouvelle génération
+        on_section: si fourni, la réponse est reçue en streaming et on_section(section, valeur)
+        est appelé dès qu'une section est complète: ('diagnostic', texte) puis
+        ('action_step', étape) pour chaque étape. Le plan complet reste retourné à la fin.
+        """
         try:
             _logger.info(f"Génération du plan d'action pour: {alarm_data.get('name', 'Inconnu')}")
+            messages = self._build_alarm_messages(alarm_data)
+            on_delta = self._make_action_plan_stream_handler(on_section) if on_section else None
+            content = self._make_openai_request(messages, use_cache=not force_refresh, caller='alarm_action_plan',
+                                                on_delta=on_delta)
+            return self._build_action_plan(content, alarm_data)
 
-            # Prompt système enrichi
-            system_prompt = """
-            Tu es un expert en maintenance d'installations photovoltaïques avec une expertise approfondie.
-            Analyse le code d'alarme, sa description, sa sévérité, et son historique pour générer un plan d'action détaillé et adapté.
-
-            Prends en compte:
-            - La description détaillée de l'alarme
-            - Le niveau de sévérité (info, warning, error, critical)
-            - La catégorie du problème (électrique, mécanique, communication, performance, sécurité)
-            - L'historique des occurrences et le taux de résolution
-            - Le temps moyen de résolution passé
+        except Exception as e:
+            _logger.error(f"Erreur dans generate_alarm_action_plan: {str(e)}")
+            return self._get_fallback_plan(alarm_data)
 
-            Réponds UNIQUEMENT avec un objet JSON valide dans ce format:
-            {
-                "diagnostic": "Description détaillée du problème basée sur toutes les informations",
-                "severity": "low"|"medium"|"high"|"critical",
-                "estimated_resolution_time": 2.0,
-                "requires_specialist": true|false,
-                "confidence_score": 85,
-                "risk_assessment": "Évaluation des risques associés",
-                "action_steps": [
-                    {
-                        "step": 1,
-                        "title": "Titre de l'étape",
-                        "description": "Description détaillée",
-                        "estimated_time": 30,
-                        "requires_tools": ["Multimètre", "Tournevis"],
-                        "requires_parts": ["Fusible 10A"],
-                        "technical_level": "basic"|"intermediate"|"advanced",
-                        "safety_precautions": ["Couper l'alimentation", "Porter des EPI"],
-                        "success_criteria": "Comment valider la réussite",
-                        "failure_indicators": ["Signaux d'échec à surveiller"],
-                        "cost_estimate": 50.0
-                    }
-                ],
-                "prevention_measures": ["Mesures préventives spécifiques"],
-                "monitoring_points": ["Points de surveillance post-intervention"],
-                "escalation_criteria": ["Quand escalader vers un spécialiste"],
-                "additional_notes": "Notes importantes contextuelles",
-                "documentation_references": ["Références techniques pertinentes"],
-                "follow_up_actions": ["Actions de suivi recommandées"],
-                "warranty_considerations": "Considérations de garantie",
-                "environmental_factors": ["Facteurs environnementaux à considérer"]
-            }
-            """
+    def _make_action_plan_stream_handler(self, on_section):
+        """Retourne on_delta: extrait du JSON partiel les sections terminées et les passe à on_section
 
-            # Construction du prompt utilisateur enrichi
-            description_text = alarm_data.get('description', 'Aucune description fournie')
-            severity = alarm_data.get('severity', 'unknown')
-            category = alarm_data.get('category', 'unknown')
-            occurrence_count = alarm_data.get('occurrence_count', 0)
-            avg_resolution_time = alarm_data.get('avg_resolution_time', 0)
-            resolution_rate = alarm_data.get('resolution_rate', 0)
-
-            user_prompt = f"""
-            ANALYSE D'ALARME PV:
-
-            === INFORMATIONS DE BASE ===
-            - Nom: {alarm_data.get('name', 'Inconnu')}
-            - Code: {alarm_data.get('code_alarm', 'Inconnu')}
-            - Description: {description_text}
-            - Partie concernée: {alarm_data.get('partie', 'Inconnu')}
-            - Marque onduleur: {alarm_data.get('marque_onduleur', 'Non spécifiée')}
-
-            === CLASSIFICATION ===
-            - Sévérité: {severity}
-            - Catégorie: {category}
-
-            === HISTORIQUE ET STATISTIQUES ===
-            - Nombre d'occurrences: {occurrence_count}
-            - Temps moyen de résolution: {avg_resolution_time:.1f} heures
-            - Taux de résolution: {resolution_rate:.1f}%
-
-            === HISTORIQUE DES RÉCLAMATIONS ===
-            {len(alarm_data.get('reclamations', []))} réclamations enregistrées
-            """
+        Le diagnostic est le premier champ du format demandé; les étapes déjà transmises ne
+        sont pas relues (l'analyse reprend après la dernière étape complète).
+        """
+        state = {'diagnostic': None, 'position': None}
+
+        def on_delta(content):
+            if state['diagnostic'] is None:
+                match = _PLAN_DIAGNOSTIC_RE.search(content)
+                if not match:
+                    return
+                try:
+                    state['diagnostic'] = _PLAN_DECODER.raw_decode(content, match.end())[0]
+                except ValueError:
+                    return
+                on_section('diagnostic', state['diagnostic'])
+
+            if state['position'] is None:
+                match = _PLAN_STEPS_RE.search(content)
+                if not match:
+                    return
+                state['position'] = match.end()
+            while True:
+                position = _PLAN_SEPARATOR_RE.match(content, state['position']).end()
+                if position >= len(content) or content[position] == ']':
+                    return
+                try:
+                    step, state['position'] = _PLAN_DECODER.raw_decode(content, position)
+                except ValueError:
+                    return
+                if isinstance(step, dict):
+                    on_section('action_step', step)
+
+        return on_delta
 
-            # Ajouter les détails des réclamations si disponibles
-            if alarm_data.get('reclamations'):
-                user_prompt += "\n\nDétails des réclamations récentes:\n"
-                for i, rec in enumerate(alarm_data.get('reclamations', [])[:5], 1):
-                    user_prompt += f"""
-            {i}. Date: {rec.get('date', 'N/A')}
-               Type installation: {rec.get('installation_type', 'N/A')}
-               Priorité: {rec.get('priority', 'N/A')}
-               État intervention: {rec.get('intervention_state', 'N/A')}
-                    """
-
-            user_prompt += """
-
-            MISSION: Génère un plan d'action détaillé, adapté à cette alarme spécifique, 
-            en tenant compte de son historique et de sa criticité. Le plan doit être 
-            pratique, sécurisé et optimisé pour maximiser les chances de résolution.
-            """
+    @api.model
+    def generate_alarm_action_plans(self, alarm_data_list, force_refresh=False, max_workers=4):
+        """Génère les plans d'action de plusieurs alarmes, appels OpenAI en parallèle
 
-            messages = [
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_prompt}
-            ]
+        Retourne {id de l'alarme: plan}. Chaque alarme en échec reçoit le plan de secours.
+        """
+        messages_by_id = {}
+        for alarm_data in alarm_data_list:
+            try:
+                messages_by_id[alarm_data['id']] = self._build_alarm_messages(alarm_data)
+            except Exception as e:
+                _logger.error(f"Erreur de préparation du prompt pour l'alarme {alarm_data.get('id')}: {str(e)}")
 
-            content = self._make_openai_request(messages)
-            if not content:
-                return self._get_fallback_plan(alarm_data)
+        contents = self._make_openai_requests_parallel(
+            messages_by_id, use_cache=not force_refresh, max_workers=max_workers, caller='alarm_action_plan')
 
+        plans = {}
+        for alarm_data in alarm_data_list:
             try:
-                action_plan = json.loads(content)
-                _logger.info("Plan d'action généré avec succès")
-            except json.JSONDecodeError as e:
-                _logger.error(f"Erreur de parsing JSON: {str(e)}")
-                return self._get_fallback_plan(alarm_data)
-
-            # Validation et enrichissement
-            action_plan = self._validate_and_enrich_action_plan(action_plan, alarm_data)
+                plans[alarm_data['id']] = self._build_action_plan(contents.get(alarm_data['id']), alarm_data)
+            except Exception as e:
+                _logger.error(f"Erreur dans generate_alarm_action_plans (alarme {alarm_data.get('id')}): {str(e)}")
+                plans[alarm_data['id']] = self._get_fallback_plan(alarm_data)
+        return plans
+
+    def _build_alarm_messages(self, alarm_data):
+        """Construit les messages (système + utilisateur) du plan d'action d'une alarme"""
+        # Prompt système enrichi
+        system_prompt = """
+        Tu es un expert en maintenance d'installations photovoltaïques avec une expertise approfondie.
+        Analyse le code d'alarme, sa description, sa sévérité, et son historique pour générer un plan d'action détaillé et adapté.
+
+        Prends en compte:
+        - La description détaillée de l'alarme
+        - Le niveau de sévérité (info, warning, error, critical)
+        - La catégorie du problème (électrique, mécanique, communication, performance, sécurité)
+        - L'historique des occurrences et le taux de résolution
+        - Le temps moyen de résolution passé
+
+        Réponds UNIQUEMENT avec un objet JSON valide dans ce format:
+        {
+            "diagnostic": "Description détaillée du problème basée sur toutes les informations",
+            "severity": "low"|"medium"|"high"|"critical",
+            "estimated_resolution_time": 2.0,
+            "requires_specialist": true|false,
+            "confidence_score": 85,
+            "risk_assessment": "Évaluation des risques associés",
+            "action_steps": [
+                {
+                    "step": 1,
+                    "title": "Titre de l'étape",
+                    "description": "Description détaillée",
+                    "estimated_time": 30,
+                    "requires_tools": ["Multimètre", "Tournevis"],
+                    "requires_parts": ["Fusible 10A"],
+                    "technical_level": "basic"|"intermediate"|"advanced",
+                    "safety_precautions": ["Couper l'alimentation", "Porter des EPI"],
+                    "success_criteria": "Comment valider la réussite",
+                    "failure_indicators": ["Signaux d'échec à surveiller"],
+                    "cost_estimate": 50.0
+                }
+            ],
+            "prevention_measures": ["Mesures préventives spécifiques"],
+            "monitoring_points": ["Points de surveillance post-intervention"],
+            "escalation_criteria": ["Quand escalader vers un spécialiste"],
+            "additional_notes": "Notes importantes contextuelles",
+            "documentation_references": ["Références techniques pertinentes"],
+            "follow_up_actions": ["Actions de suivi recommandées"],
+            "warranty_considerations": "Considérations de garantie",
+            "environmental_factors": ["Facteurs environnementaux à considérer"]
+        }
+        """
 
-            # Génération du HTML enrichi - USING YOUR ORIGINAL FORMAT
-            action_plan['html_content'] = self._format_enhanced_action_plan_html(action_plan, alarm_data)
+        builder = prompt_builder.PromptBuilder(system_prompt, self._get_prompt_token_budget())
+        builder.add_section("ANALYSE D'ALARME PV - INFORMATIONS DE BASE", [
+            f"- Nom: {alarm_data.get('name', 'Inconnu')}",
+            f"- Code: {alarm_data.get('code_alarm', 'Inconnu')}",
+            f"- Description: {alarm_data.get('description') or 'Aucune description fournie'}",
+            f"- Partie concernée: {alarm_data.get('partie', 'Inconnu')}",
+            f"- Marque onduleur: {alarm_data.get('marque_onduleur') or 'Non spécifiée'}",
+        ])
+        builder.add_section('CLASSIFICATION', [
+            f"- Sévérité: {alarm_data.get('severity', 'unknown')}",
+            f"- Catégorie: {alarm_data.get('category', 'unknown')}",
+        ])
+        builder.add_section('HISTORIQUE ET STATISTIQUES', [
+            f"- Nombre d'occurrences: {alarm_data.get('occurrence_count', 0)}",
+            f"- Temps moyen de résolution: {alarm_data.get('avg_resolution_time', 0):.1f} heures",
+            f"- Taux de résolution: {alarm_data.get('resolution_rate', 0):.1f}%",
+        ])
+
+        # Tendance récente (fenêtres glissantes)
+        if alarm_data.get('recent_trend'):
+            builder.add_section('TENDANCE RÉCENTE', [
+                f"- {trend['days']} derniers jours: {trend['occurrence_count']} occurrence(s), "
+                f"taux de résolution {trend['resolution_rate']:.1f}%, "
+                f"délai moyen {trend['avg_resolution_time']:.1f} h"
+                for trend in alarm_data['recent_trend']
+            ])
 
-            return action_plan
+        # Réclamations récentes citées, les plus anciennes résumées par mois
+        reclamations = alarm_data.get('reclamations', [])
+        if reclamations:
+            def render(rec):
+                return (f"- Date: {rec.get('date', 'N/A')} • Type installation: {rec.get('installation_type', 'N/A')} "
+                        f"• Priorité: {rec.get('priority', 'N/A')} • État intervention: {rec.get('intervention_state', 'N/A')}")
+
+            def summarize(key, recs):
+                return (f"- {key}: {len(recs)} réclamation(s); priorités: "
+                        f"{prompt_builder.format_distribution([rec.get('priority') for rec in recs])}; "
+                        f"interventions: {prompt_builder.format_distribution([rec.get('intervention_state') for rec in recs])}")
+
+            builder.add_history(f"HISTORIQUE DES RÉCLAMATIONS ({len(reclamations)} enregistrées)", reclamations,
+                                render, lambda rec: str(rec.get('date', ''))[:7] or 'Sans date', summarize, keep=5,
+                                informativeness=lambda rec: rec.get('priority') == 'haute')
+
+        builder.add_section(None, [
+            "MISSION: Génère un plan d'action détaillé, adapté à cette alarme spécifique, "
+            "en tenant compte de son historique et de sa criticité. Le plan doit être "
+            "pratique, sécurisé et optimisé pour maximiser les chances de résolution.",
+        ])
+        return builder.build()
+
+    def _build_action_plan(self, content, alarm_data):
+        """Transforme la réponse OpenAI en plan d'action validé, ou plan de secours"""
+        if not content:
+            return self._get_fallback_plan(alarm_data)
 
-        except Exception as e:
-            _logger.error(f"Erreur dans generate_alarm_action_plan: {str(e)}")
+        try:
+            action_plan = json.loads(content)
+            _logger.info("Plan d'action généré avec succès")
+        except json.JSONDecodeError as e:
+            _logger.error(f"Erreur de parsing JSON: {str(e)}")
             return self._get_fallback_plan(alarm_data)
 
+        # Validation et enrichissement (le HTML est rendu à la lecture, voir pv.ai.action.plan)
+        return self._validate_and_enrich_action_plan(action_plan, alarm_data)
+
     def _validate_and_enrich_action_plan(self, action_plan, alarm_data):
         """Valide et enrichit le plan d'action avec des données contextuelles"""
         # Valeurs par défaut enrichies
@@ -644,23 +966,27 @@ class PVOpenAIService(models.AbstractModel):
     def _get_fallback_plan(self, alarm_data):
         """Plan de secours enrichi si l'IA échoue"""
         _logger.info("Génération du plan de secours enrichi")
+        template = self._get_fallback_plan_template(alarm_data.get('occurrence_count', 0) > 3)
+        return self._fill_plan_placeholders(template, alarm_data)
 
-        description_text = alarm_data.get('description', 'Aucune description disponible')
-        severity = alarm_data.get('severity', 'unknown')
-        occurrence_count = alarm_data.get('occurrence_count', 0)
-
-        plan = {
-            'diagnostic': f"Plan de secours pour l'alarme {alarm_data.get('code_alarm', 'Inconnu')} - {alarm_data.get('name', 'Inconnu')}. Sévérité: {severity}. Description: {description_text}.",
+    def _get_fallback_plan_template(self, requires_specialist):
+        """Plan de secours sans données propres à l'alarme: les champs {code_alarm}, {name},
+        {severity}, {description} et {occurrence_count} sont remplis au rendu.
+        Le même plan stocké est ainsi partagé par toutes les alarmes en secours.
+        """
+        return {
+            'is_fallback': True,
+            'diagnostic': "Plan de secours pour l'alarme {code_alarm} - {name}. Sévérité: {severity}. Description: {description}.",
             'severity': 'medium',
             'estimated_resolution_time': 3.0,
-            'requires_specialist': occurrence_count > 3,
+            'requires_specialist': requires_specialist,
             'confidence_score': 60,
             'risk_assessment': 'Risque modéré - Plan de secours appliqué',
             'action_steps': [
                 {
                     'step': 1,
                     'title': 'Consultation documentation technique',
-                    'description': f"Rechercher dans la documentation technique l'alarme {alarm_data.get('code_alarm', 'Inconnu')} avec description: {description_text}",
+                    'description': "Rechercher dans la documentation technique l'alarme {code_alarm} avec description: {description}",
                     'estimated_time': 30,
                     'requires_tools': ['Documentation technique', 'Accès internet'],
                     'requires_parts': [],
@@ -683,7 +1009,7 @@ class PVOpenAIService(models.AbstractModel):
                 'Réapparition de l\'alarme dans les 24h',
                 'Plus de 3 occurrences en une semaine'
             ],
-            'additional_notes': f'Plan de secours généré automatiquement. Occurrences: {occurrence_count}. Description: {description_text}.',
+            'additional_notes': 'Plan de secours généré automatiquement. Occurrences: {occurrence_count}. Description: {description}.',
             'documentation_references': [
                 'Manuel utilisateur équipement',
                 'Guide de dépannage fabricant'
@@ -699,210 +1025,46 @@ class PVOpenAIService(models.AbstractModel):
             ]
         }
 
-        plan['html_content'] = self._format_enhanced_action_plan_html(plan, alarm_data)
-        return plan
-
-    def _format_enhanced_action_plan_html(self, action_plan, alarm_data):
-        """Formate le plan d'action enrichi en HTML - VOTRE FORMAT ORIGINAL PRÉFÉRÉ"""
-        severity_colors = {
-            'low': '#28a745',
-            'medium': '#ffc107',
-            'high': '#fd7e14',
-            'critical': '#dc3545'
+    def _fill_plan_placeholders(self, plan, alarm_data):
+        """Remplit les champs d'un plan de secours avec les données de l'alarme"""
+        values = {
+            'code_alarm': alarm_data.get('code_alarm') or 'Inconnu',
+            'name': alarm_data.get('name') or 'Inconnu',
+            'severity': alarm_data.get('severity') or 'unknown',
+            'description': alarm_data.get('description') or 'Aucune description disponible',
+            'occurrence_count': alarm_data.get('occurrence_count', 0),
         }
 
-        severity_color = severity_colors.get(action_plan.get('severity', 'medium'), '#ffc107')
-        confidence_score = action_plan.get('confidence_score', 70)
+        def _fill(value):
+            if isinstance(value, str):
+                return value.format_map(values)
+            if isinstance(value, list):
+                return [_fill(item) for item in value]
+            if isinstance(value, dict):
+                return {key: _fill(item) for key, item in value.items()}
+            return value
 
-        html = f"""
-        <div style="font-family: 'Segoe UI', sans-serif; max-width: 100%; background: #f8f9fa; padding: 20px; border-radius: 12px; box-shadow: 0 4px 6px rgba(0,0,0,0.1);">
-
-            <!-- En-tête avec métriques -->
-            <div style="background: linear-gradient(135deg, {severity_color}15, {severity_color}05); padding: 20px; border-radius: 8px; border-left: 5px solid {severity_color}; margin-bottom: 20px;">
-                <div style="display: flex; justify-content: space-between; align-items: center; flex-wrap: wrap;">
-                    <div>
-                        <h2 style="color: #2c3e50; margin: 0; font-size: 24px;">🔧 Plan d'Action Intelligent</h2>
-                        <p style="color: #666; margin: 5px 0 0 0;">Alarme: {alarm_data.get('code_alarm', 'N/A')} - {alarm_data.get('name', 'N/A')}</p>
-                    </div>
-                    <div style="text-align: right;">
-                        <div style="margin-bottom: 5px;">
-                            <span style="background: {severity_color}; color: white; padding: 6px 12px; border-radius: 20px; font-weight: bold; font-size: 14px;">
-                                {action_plan.get('severity', 'medium').upper()}
-                            </span>
-                        </div>
-                        <div style="font-size: 12px; color: #666;">
-                            ⏱️ {action_plan.get('estimated_resolution_time', 0):.1f}h • 
-                            🎯 Confiance: {confidence_score}%
-                        </div>
-                    </div>
-                </div>
-            </div>
+        return _fill(plan)
 
-            <!-- Diagnostic et évaluation des risques -->
-            <div style="background: white; padding: 20px; margin: 15px 0; border-radius: 8px; border-left: 4px solid {severity_color};">
-                <h3 style="color: #2c3e50; margin-top: 0; display: flex; align-items: center;">
-                    🔍 Diagnostic & Évaluation
-                </h3>
-                <div style="background: #f8f9fa; padding: 15px; border-radius: 6px; margin-bottom: 15px;">
-                    <strong>Diagnostic:</strong>
-                    <p style="margin: 8px 0 0 0; line-height: 1.6;">{action_plan.get('diagnostic', 'Non disponible')}</p>
-                </div>
-                <div style="background: #fff3cd; padding: 15px; border-radius: 6px; border-left: 3px solid #ffc107;">
-                    <strong>⚠️ Évaluation des risques:</strong>
-                    <p style="margin: 8px 0 0 0; line-height: 1.6;">{action_plan.get('risk_assessment', 'Non évaluée')}</p>
-                </div>
-            </div>
-
-            <!-- Étapes de résolution -->
-            <div style="background: white; padding: 20px; margin: 15px 0; border-radius: 8px;">
-                <h3 style="color: #2c3e50; margin-top: 0;">📋 Plan de Résolution Détaillé</h3>
-        """
-
-        # Calcul du coût total
-        total_cost = sum(step.get('cost_estimate', 0) for step in action_plan.get('action_steps', []))
-        total_time = sum(step.get('estimated_time', 0) for step in action_plan.get('action_steps', []))
-
-        if total_cost > 0 or total_time > 0:
-            html += f"""
-                <div style="background: #e8f5e8; padding: 12px; border-radius: 6px; margin-bottom: 15px; display: flex; justify-content: space-between;">
-                    <span><strong>⏰ Durée totale estimée:</strong> {total_time} minutes</span>
-                    <span><strong>💰 Coût estimé:</strong> {total_cost:.2f} €</span>
-                </div>
-            """
-
-        for step in action_plan.get('action_steps', []):
-            cost_estimate = step.get('cost_estimate', 0)
-            html += f"""
-                <div style="border: 1px solid #e9ecef; border-radius: 8px; padding: 18px; margin: 15px 0; background: #fdfdfd; box-shadow: 0 2px 4px rgba(0,0,0,0.05);">
-                    <div style="display: flex; align-items: center; margin-bottom: 12px;">
-                        <span style="background: linear-gradient(135deg, #007bff, #0056b3); color: white; width: 35px; height: 35px; border-radius: 50%; display: flex; align-items: center; justify-content: center; font-weight: bold; margin-right: 15px; box-shadow: 0 2px 4px rgba(0,123,255,0.3);">
-                            {step.get('step', '')}
-                        </span>
-                        <div style="flex-grow: 1;">
-                            <h4 style="margin: 0; color: #2c3e50; font-size: 16px;">{step.get('title', '')}</h4>
-                            <div style="font-size: 12px; color: #666; margin-top: 2px;">
-                                Niveau: {step.get('technical_level', 'basic').title()} • 
-                                Durée: {step.get('estimated_time', 0)} min
-                            </div>
-                        </div>
-                    </div>
-
-                    <div style="background: #f8f9fa; padding: 12px; border-radius: 6px; margin-bottom: 12px;">
-                        <strong>📝 Description:</strong>
-                        <p style="margin: 6px 0 0 0; line-height: 1.5; color: #495057;">{step.get('description', '')}</p>
-                    </div>
-
-                    <div style="display: grid; grid-template-columns: 1fr 1fr; gap: 15px; margin-bottom: 12px;">
-                        <div style="background: #e8f4f8; padding: 10px; border-radius: 6px;">
-                            <strong>✅ Critères de succès:</strong>
-                            <div style="margin-top: 5px; font-size: 14px;">{step.get('success_criteria', 'Étape terminée')}</div>
-                        </div>
-                        <div style="background: #ffeaa7; padding: 10px; border-radius: 6px;">
-                            <strong>❌ Indicateurs d'échec:</strong>
-                            <div style="margin-top: 5px; font-size: 14px;">{', '.join(step.get('failure_indicators', ['Procédure non suivie']))}</div>
-                        </div>
-                    </div>
-            """
-
-            if step.get('requires_tools'):
-                html += f"""
-                    <div style="margin-bottom: 10px; padding: 10px; background: #e8f4f8; border-radius: 6px; border-left: 3px solid #17a2b8;">
-                        <strong>🔧 Outils requis:</strong> {', '.join(step.get('requires_tools', []))}
-                    </div>
-                """
-
-            if step.get('safety_precautions'):
-                html += f"""
-                    <div style="margin-bottom: 10px; padding: 10px; background: #fff3cd; border-radius: 6px; border-left: 3px solid #ffc107;">
-                        <strong>⚠️ Précautions sécurité:</strong> {', '.join(step.get('safety_precautions', []))}
-                    </div>
-                """
-
-            html += "</div>"
-
-        html += "</div>"
-
-        # Sections supplémentaires
-        sections = [
-            ('🛡️ Mesures Préventives', 'prevention_measures', '#e8f5e8'),
-            ('📊 Points de Surveillance', 'monitoring_points', '#e3f2fd'),
-            ('🔺 Critères d\'Escalade', 'escalation_criteria', '#ffebee'),
-            ('📚 Références Documentation', 'documentation_references', '#fff8e1'),
-            ('🔄 Actions de Suivi', 'follow_up_actions', '#f1f8e9')
-        ]
-
-        for title, key, bg_color in sections:
-            if action_plan.get(key):
-                html += f"""
-                <div style="background: white; padding: 20px; margin: 15px 0; border-radius: 8px;">
-                    <h3 style="color: #2c3e50; margin-top: 0;">{title}</h3>
-                    <div style="background: {bg_color}; padding: 15px; border-radius: 6px;">
-                        <ul style="margin: 0; padding-left: 20px; line-height: 1.6;">
-                """
-                for item in action_plan.get(key, []):
-                    html += f"<li style='margin-bottom: 5px;'>{item}</li>"
-                html += """
-                        </ul>
-                    </div>
-                </div>
-                """
-
-        # Notes importantes et garantie
-        if action_plan.get('additional_notes') or action_plan.get('warranty_considerations'):
-            html += f"""
-            <div style="background: #e9ecef; padding: 20px; margin: 15px 0; border-radius: 8px; border-left: 4px solid #6c757d;">
-                <h3 style="color: #2c3e50; margin-top: 0;">📝 Informations Importantes</h3>
-            """
-
-            if action_plan.get('additional_notes'):
-                html += f"""
-                <div style="background: white; padding: 15px; border-radius: 6px; margin-bottom: 10px;">
-                    <strong>Notes:</strong>
-                    <p style="margin: 8px 0 0 0; line-height: 1.6;">{action_plan.get('additional_notes', '')}</p>
-                </div>
-                """
-
-            if action_plan.get('warranty_considerations'):
-                html += f"""
-                <div style="background: #fff3cd; padding: 15px; border-radius: 6px; border-left: 3px solid #ffc107;">
-                    <strong>🛡️ Considérations Garantie:</strong>
-                    <p style="margin: 8px 0 0 0; line-height: 1.6;">{action_plan.get('warranty_considerations', '')}</p>
-                </div>
-                """
-
-            html += "</div>"
-
-        # Footer avec timestamp et métadonnées
-        html += f"""
-            <div style="background: #f8f9fa; padding: 15px; margin-top: 20px; border-radius: 8px; border-top: 2px solid {severity_color}; text-align: center; font-size: 12px; color: #666;">
-                <div style="margin-bottom: 8px;">
-                    <strong>Plan généré par IA</strong> • 
-                    Confiance: {confidence_score}% • 
-                    {action_plan.get('requires_specialist', False) and 'Spécialiste requis' or 'Intervention standard'}
-                </div>
-                <div>
-                    📅 Généré le {datetime.now().strftime('%d/%m/%Y à %H:%M')} • 
-                    🔄 Mise à jour recommandée si échec de résolution
-                </div>
-            </div>
-        </div>
-        """
-        return html
+    def _format_enhanced_action_plan_html(self, action_plan, alarm_data):
+        """Formate le plan d'action enrichi en HTML (template QWeb pv_management.action_plan_template)"""
+        return self.env['pv.ai.action.plan']._render_plan_html(action_plan, alarm_data, datetime.now())
 
     @api.model
     def debug_full_process(self):
         """Méthode de debug complète enrichie"""
         _logger.info("🚀 DEBUT DEBUG COMPLET ENRICHI")
+        breaker_status = self.env['pv.ai.circuit.breaker'].sudo()._get_status_summary()
 
         # Test 1: Clé API
         api_key = self._get_api_key()
         if not api_key:
-            return "❌ Échec: Clé API non trouvée"
+            return f"❌ Échec: Clé API non trouvée • {breaker_status}"
 
         # Test 2: Validation clé API
         is_valid, message = self._test_api_key()
         if not is_valid:
-            return f"❌ Échec: {message}"
+            return f"❌ Échec: {message} • {breaker_status}"
 
         # Test 3: Génération de plan enrichi avec description
         test_alarm_data = {
@@ -934,6 +1096,11 @@ class PVOpenAIService(models.AbstractModel):
         if not plan:
             return "❌ Échec: Génération de plan échouée"
 
+        # Le plan de test passe par le disjoncteur: état relu après l'appel
+        breaker_status = self.env['pv.ai.circuit.breaker'].sudo()._get_status_summary()
+        if plan.get('is_fallback'):
+            return f"⚠️ Plan de secours servi (OpenAI indisponible) • {breaker_status}"
+
         # Validation du plan enrichi
         required_keys = ['diagnostic', 'severity', 'action_steps', 'confidence_score', 'risk_assessment']
         missing_keys = [key for key in required_keys if key not in plan]
@@ -941,5 +1108,10 @@ class PVOpenAIService(models.AbstractModel):
         if missing_keys:
             return f"⚠️ Plan généré mais clés manquantes: {', '.join(missing_keys)}"
 
+        cache_stats = self.env['pv.ai.cache'].sudo().get_cache_stats()
+
         _logger.info("✅ DEBUG COMPLET ENRICHI RÉUSSI")
-        return f"✅ Succès: Plan enrichi généré avec {len(plan.get('action_steps', []))} étapes, confiance {plan.get('confidence_score', 0)}%"
\ No newline at end of file
+        return (f"✅ Succès: Plan enrichi généré avec {len(plan.get('action_steps', []))} étapes, "
+                f"confiance {plan.get('confidence_score', 0)}% • "
+                f"Cache: {cache_stats['entries']} entrées, {cache_stats['worker_hits']} hits / "
+                f"{cache_stats['worker_misses']} miss (worker) • {breaker_status}")
\ No newline at end of file
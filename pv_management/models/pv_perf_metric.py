@@ -0,0 +1,213 @@
+from odoo import models, fields, api
+from odoo.tools import str2bool
+import functools
+import logging
+import threading
+import time
+
+_logger = logging.getLogger(__name__)
+
+# Paramètre d'activation, voisin de pv_management.ai_debug_mode
+PERF_PARAM = 'pv_management.perf_instrumentation'
+PERF_RETENTION_PARAM = 'pv_management.perf_retention_days'
+# Jeton attendu par /pv_management/metrics (en-tête Authorization: Bearer); vide: export fermé
+PERF_TOKEN_PARAM = 'pv_management.perf_metrics_token'
+
+# Les mesures sont agrégées en mémoire par worker puis écrites au plus toutes les N secondes
+FLUSH_INTERVAL = 60
+
+METRIC_KINDS = [
+    ('compute', 'Calcul'),
+    ('action', 'Action'),
+    ('openai', 'Appel OpenAI'),
+]
+
+# {(nom, type): [appels, durée totale ms, durée max ms, requêtes SQL, tokens prompt, tokens réponse]}
+_BUFFER = {}
+_BUFFER_LOCK = threading.Lock()
+_LAST_FLUSH = [time.monotonic()]
+# Mesures en cours sur le thread courant (appels imbriqués), pour y imputer les tokens
+_ACTIVE = threading.local()
+
+
+def _active_frames():
+    if not hasattr(_ACTIVE, 'frames'):
+        _ACTIVE.frames = []
+    return _ACTIVE.frames
+
+
+def add_token_usage(usage):
+    """Impute le bloc usage d'une réponse OpenAI à toutes les mesures en cours (inclusives)"""
+    if not usage:
+        return
+    for frame in _active_frames():
+        frame['prompt_tokens'] += usage.get('prompt_tokens', 0) or 0
+        frame['completion_tokens'] += usage.get('completion_tokens', 0) or 0
+
+
+def _is_enabled(env):
+    # get_param est mis en cache (ormcache): pas de requête par appel mesuré
+    return str2bool(env['ir.config_parameter'].sudo().get_param(PERF_PARAM, 'False'), False)
+
+
+def _record(name, kind, elapsed_ms, queries, prompt_tokens, completion_tokens):
+    with _BUFFER_LOCK:
+        entry = _BUFFER.setdefault((name, kind), [0, 0.0, 0.0, 0, 0, 0])
+        entry[0] += 1
+        entry[1] += elapsed_ms
+        entry[2] = max(entry[2], elapsed_ms)
+        entry[3] += queries
+        entry[4] += prompt_tokens
+        entry[5] += completion_tokens
+
+
+def flush_metrics(env, force=False):
+    """Écrit les mesures du worker dans pv.perf.metric, dans un curseur séparé
+
+    Le curseur séparé n'interfère pas avec la transaction mesurée et conserve
+    les mesures même si celle-ci est annulée.
+    """
+    with _BUFFER_LOCK:
+        if not _BUFFER or (not force and time.monotonic() - _LAST_FLUSH[0] < FLUSH_INTERVAL):
+            return
+        pending = dict(_BUFFER)
+        _BUFFER.clear()
+        _LAST_FLUSH[0] = time.monotonic()
+    try:
+        with env.registry.cursor() as cr:
+            env(cr=cr, su=True)['pv.perf.metric']._record_batch(pending)
+    except Exception as e:
+        _logger.warning(f"Mesures de performance non enregistrées: {str(e)}")
+
+
+def instrumented(kind):
+    """Mesure appels, durée, requêtes SQL et tokens IA d'une méthode de modèle
+
+    Sans effet tant que le paramètre pv_management.perf_instrumentation est désactivé.
+    À placer sous les décorateurs api.* :
+
+        @api.depends('reclamation_ids')
+        @instrumented('compute')
+        def _compute_occurrence_stats(self):
+    """
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            if not _is_enabled(self.env):
+                return method(self, *args, **kwargs)
+            cr = self.env.cr
+            frame = {'prompt_tokens': 0, 'completion_tokens': 0}
+            frames = _active_frames()
+            frames.append(frame)
+            queries_before = cr.sql_log_count
+            started = time.perf_counter()
+            try:
+                return method(self, *args, **kwargs)
+            finally:
+                elapsed_ms = (time.perf_counter() - started) * 1000
+                frames.pop()
+                _record(f"{self._name}.{method.__name__}", kind, elapsed_ms,
+                        cr.sql_log_count - queries_before, frame['prompt_tokens'], frame['completion_tokens'])
+                flush_metrics(self.env)
+        return wrapper
+    return decorator
+
+
+class PVPerfMetric(models.Model):
+    _name = 'pv.perf.metric'
+    _description = 'Mesure de performance (agrégat horaire)'
+    _order = 'period_start desc, total_ms desc'
+
+    name = fields.Char(string='Méthode', required=True, readonly=True, index=True)
+    kind = fields.Selection(METRIC_KINDS, string='Type', required=True, readonly=True)
+    period_start = fields.Datetime(string='Heure', required=True, readonly=True, index=True)
+    call_count = fields.Integer(string='Appels', readonly=True)
+    total_ms = fields.Float(string='Durée totale (ms)', readonly=True)
+    max_ms = fields.Float(string='Durée max (ms)', readonly=True, group_operator='max')
+    avg_ms = fields.Float(string='Durée moyenne (ms)', compute='_compute_avg_ms')
+    query_count = fields.Integer(string='Requêtes SQL', readonly=True)
+    prompt_tokens = fields.Integer(string='Tokens prompt', readonly=True)
+    completion_tokens = fields.Integer(string='Tokens réponse', readonly=True)
+
+    _sql_constraints = [
+        ('name_period_unique', 'unique(name, kind, period_start)', 'Une seule mesure par méthode et par heure.'),
+    ]
+
+    @api.depends('total_ms', 'call_count')
+    def _compute_avg_ms(self):
+        for metric in self:
+            metric.avg_ms = metric.total_ms / metric.call_count if metric.call_count else 0.0
+
+    @api.model
+    def _record_batch(self, pending):
+        """Cumule les mesures d'un worker dans l'agrégat de l'heure courante"""
+        for (name, kind), (calls, total_ms, max_ms, queries, prompt_tokens, completion_tokens) in pending.items():
+            self.env.cr.execute("""
+                INSERT INTO pv_perf_metric (name, kind, period_start, call_count, total_ms, max_ms, query_count,
+                                            prompt_tokens, completion_tokens,
+                                            create_uid, create_date, write_uid, write_date)
+                VALUES (%(name)s, %(kind)s, date_trunc('hour', now() AT TIME ZONE 'UTC'), %(calls)s, %(total_ms)s,
+                        %(max_ms)s, %(queries)s, %(prompt_tokens)s, %(completion_tokens)s,
+                        %(uid)s, (now() AT TIME ZONE 'UTC'), %(uid)s, (now() AT TIME ZONE 'UTC'))
+                ON CONFLICT (name, kind, period_start) DO UPDATE
+                   SET call_count = pv_perf_metric.call_count + EXCLUDED.call_count,
+                       total_ms = pv_perf_metric.total_ms + EXCLUDED.total_ms,
+                       max_ms = GREATEST(pv_perf_metric.max_ms, EXCLUDED.max_ms),
+                       query_count = pv_perf_metric.query_count + EXCLUDED.query_count,
+                       prompt_tokens = pv_perf_metric.prompt_tokens + EXCLUDED.prompt_tokens,
+                       completion_tokens = pv_perf_metric.completion_tokens + EXCLUDED.completion_tokens,
+                       write_date = EXCLUDED.write_date
+            """, {'name': name, 'kind': kind, 'calls': calls, 'total_ms': total_ms, 'max_ms': max_ms,
+                  'queries': queries, 'prompt_tokens': prompt_tokens, 'completion_tokens': completion_tokens,
+                  'uid': self.env.uid})
+
+    @api.model
+    def _get_totals(self):
+        """Totaux par méthode sur la période conservée (export Prometheus)"""
+        self.flush_model()
+        self.env.cr.execute("""
+            SELECT name, kind, SUM(call_count), SUM(total_ms), MAX(max_ms), SUM(query_count),
+                   SUM(prompt_tokens), SUM(completion_tokens)
+              FROM pv_perf_metric
+             GROUP BY name, kind
+             ORDER BY name
+        """)
+        return self.env.cr.fetchall()
+
+    @api.model
+    def _export_prometheus(self):
+        """Totaux au format texte Prometheus (version 0.0.4)
+
+        Les totaux portent sur la fenêtre de rétention: ils baissent quand _gc_old_metrics supprime
+        les agrégats expirés. Ils sont donc exportés en gauges, sans suffixe _total: un counter
+        qui baisse serait pris pour un redémarrage par rate() et increase().
+        """
+        retention_days = self.env['pv.management.openai.service']._get_int_param(PERF_RETENTION_PARAM, 30)
+        series = [
+            ('pv_method_calls', 'gauge', 'Nombre d\'appels', 2),
+            ('pv_method_duration_ms', 'gauge', 'Durée cumulée (ms)', 3),
+            ('pv_method_duration_ms_max', 'gauge', 'Durée maximale (ms)', 4),
+            ('pv_method_sql_queries', 'gauge', 'Requêtes SQL', 5),
+            ('pv_method_prompt_tokens', 'gauge', 'Tokens de prompt OpenAI', 6),
+            ('pv_method_completion_tokens', 'gauge', 'Tokens de réponse OpenAI', 7),
+        ]
+        rows = self._get_totals()
+        lines = []
+        for metric, metric_type, help_text, column in series:
+            lines.append(f"# HELP {metric} {help_text} sur les {retention_days} derniers jours")
+            lines.append(f"# TYPE {metric} {metric_type}")
+            for row in rows:
+                method = row[0].replace('\\', '\\\\').replace('"', '\\"')
+                lines.append(f'{metric}{{method="{method}",kind="{row[1]}"}} {row[column] or 0}')
+        return '\n'.join(lines) + '\n'
+
+    @api.autovacuum
+    def _gc_old_metrics(self):
+        """Fenêtre glissante: supprime les agrégats plus anciens que la rétention"""
+        retention_days = self.env['pv.management.openai.service']._get_int_param(PERF_RETENTION_PARAM, 30)
+        self.env.cr.execute("""
+            DELETE FROM pv_perf_metric
+             WHERE period_start < (now() AT TIME ZONE 'UTC') - make_interval(days => %s)
+        """, (retention_days,))
+        if self.env.cr.rowcount:
+            _logger.info(f"Mesures de performance: {self.env.cr.rowcount} agrégat(s) expiré(s) supprimé(s)")
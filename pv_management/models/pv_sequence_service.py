@@ -0,0 +1,66 @@
+from odoo import models, api
+import logging
+
+_logger = logging.getLogger(__name__)
+
+
+class PVSequenceService(models.AbstractModel):
+    _name = 'pv.sequence.service'
+    _description = 'Attribution des références par séquence (réservation par blocs)'
+
+    # Les références ne sont attribuées qu'à la création (jamais en valeur par défaut: ouvrir un
+    # formulaire ne consomme plus de numéro). Une séquence standard est une séquence PostgreSQL:
+    # nextval ne verrouille pas la ligne ir_sequence, les créations concurrentes ne s'attendent pas.
+
+    @api.model
+    def _get_sequence(self, code):
+        return self.env['ir.sequence'].sudo().search([
+            ('code', '=', code),
+            ('company_id', 'in', [self.env.company.id, False]),
+        ], order='company_id', limit=1)
+
+    @api.model
+    def _reserve(self, code, count):
+        """Réserve un bloc de count références de la séquence code, dans l'ordre
+
+        Standard: un seul nextval sur une série (une requête, sans verrou).
+        Sans trou: un seul UPDATE avance le compteur de count (le verrou de ligne est inhérent
+        à une séquence sans trou). Plages de dates: next_by_id par référence.
+        Retourne une liste vide si la séquence n'existe pas.
+        """
+        if count <= 0:
+            return []
+        sequence = self._get_sequence(code)
+        if not sequence:
+            _logger.warning(f"Séquence {code} introuvable: références non attribuées")
+            return []
+        if sequence.use_date_range:
+            return [sequence.next_by_id() for _i in range(count)]
+
+        if sequence.implementation == 'standard':
+            self.env.cr.execute("SELECT nextval(%s) FROM generate_series(1, %s)",
+                                (f'ir_sequence_{sequence.id:03d}', count))
+            numbers = [row[0] for row in self.env.cr.fetchall()]
+        else:
+            self.env.cr.execute("""
+                UPDATE ir_sequence
+                   SET number_next = number_next + number_increment * %s
+                 WHERE id = %s
+             RETURNING number_next - number_increment * %s, number_increment
+            """, (count, sequence.id, count))
+            first, increment = self.env.cr.fetchone()
+            numbers = [first + increment * index for index in range(count)]
+            sequence.invalidate_recordset(['number_next'])
+
+        prefix, suffix = sequence._get_prefix_suffix()
+        return [f"{prefix}{number:0{sequence.padding}d}{suffix}" for number in numbers]
+
+    @api.model
+    def _assign(self, vals_list, field_name, code, placeholder):
+        """Complète field_name des vals sans référence (absente ou placeholder), en un bloc"""
+        unnamed = [vals for vals in vals_list if vals.get(field_name, placeholder) == placeholder]
+        for vals, reference in zip(unnamed, self._reserve(code, len(unnamed))):
+            vals[field_name] = reference
+        for vals in unnamed:
+            vals.setdefault(field_name, placeholder)
+        return vals_list
@@ -1,5 +1,6 @@
-from odoo import models, fields, api, _
+from odoo import models, fields, api, tools, _
 from odoo.exceptions import ValidationError
+from .pv_perf_metric import instrumented
 
 
 class Reclamation(models.Model):
@@ -9,13 +10,12 @@ class Reclamation(models.Model):
     _order = 'id desc'
 
     # Champs principaux
-    name = fields.Char(string='Référence', required=True, copy=False, readonly=True,
-                       default=lambda self: self.env['ir.sequence'].next_by_code('reclamation.sequence') or 'Nouveau')
-    date_heure = fields.Datetime(string='Date et Heure', required=True, default=fields.Datetime.now)
+    name = fields.Char(string='Référence', required=True, copy=False, readonly=True, default='Nouveau')
+    date_heure = fields.Datetime(string='Date et Heure', required=True, default=fields.Datetime.now, index=True)
     client_id = fields.Many2one('res.partner', string='Client')
     nom_central_id = fields.Many2one('pv.installation', string='Nom Instalation')
     adresse = fields.Char(related='nom_central_id.address_id', string='Adresse', readonly=True)
-    code_alarm_id = fields.Many2one('alarm.management', string='Code Alarme')
+    code_alarm_id = fields.Many2one('alarm.management', string='Code Alarme', index=True)
     priorite_urgence = fields.Selection([
         ('basse', 'Basse'),
         ('moyenne', 'Moyenne'),
@@ -46,7 +46,7 @@ class Reclamation(models.Model):
             }
 
         # Si le code d'alarme n'a pas encore de plan d'action, le générer automatiquement
-        if not self.code_alarm_id.action_plan_html:
+        if not self.code_alarm_id.action_plan_id:
             self.code_alarm_id.action_generate_action_plan()
 
         return {
@@ -64,9 +64,19 @@ class Reclamation(models.Model):
         self.nom_central_id = False
         return {'domain': {'nom_central_id': [('client', '=', self.client_id.id)]}}
 
+    def init(self):
+        # Statistiques de résolution par alarme sur une fenêtre de dates
+        tools.create_index(self._cr, 'reclamation_code_alarm_id_date_heure_idx', self._table,
+                           ['code_alarm_id', 'date_heure'])
+
+    @instrumented('compute')
     def _compute_intervention_count(self):
+        # Une requête groupée pour tout le recordset
+        groups = self.env['fiche.intervention']._read_group(
+            [('reclamation_id', 'in', self.ids)], ['reclamation_id'], ['reclamation_id'])
+        counts = {group['reclamation_id'][0]: group['reclamation_id_count'] for group in groups}
         for rec in self:
-            rec.intervention_count = self.env['fiche.intervention'].search_count([('reclamation_id', '=', rec.id)])
+            rec.intervention_count = counts.get(rec.id, 0)
 
     def action_view_interventions(self):
         self.ensure_one()
@@ -81,11 +91,10 @@ class Reclamation(models.Model):
 
 
 
-    @api.model
-    def create(self, vals):
-        if vals.get('name', 'Nouveau') == 'Nouveau':
-            vals['name'] = self.env['ir.sequence'].next_by_code('reclamation.sequence') or 'Nouveau'
-        return super(Reclamation, self).create(vals)
+    @api.model_create_multi
+    def create(self, vals_list):
+        self.env['pv.sequence.service']._assign(vals_list, 'name', 'reclamation.sequence', 'Nouveau')
+        return super(Reclamation, self).create(vals_list)
 
     def _send_notification_email(self):
         """Envoi d'email lors de la fermeture d'une réclamation"""
@@ -97,6 +106,7 @@ class Reclamation(models.Model):
         if template:
             template.send_mail(self.id, force_send=True)
 
+    @instrumented('action')
     def action_create_intervention(self):
         """Bouton pour créer une fiche d'intervention"""
         self.ensure_one()
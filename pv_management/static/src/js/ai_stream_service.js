@@ -0,0 +1,59 @@
+/** @odoo-module **/
+
+import { registry } from "@web/core/registry";
+import { _lt } from "@web/core/l10n/translation";
+
+/**
+ * Affiche le plan d'action IA pendant sa génération (mode streaming).
+ *
+ * Le serveur envoie sur le bus un message pv_ai_action_plan_progress par section
+ * reçue: le diagnostic, puis chaque étape, puis "done". Une seule notification
+ * par alarme est affichée et remplacée à chaque section.
+ */
+export const pvAiStreamService = {
+    dependencies: ["bus_service", "notification"],
+
+    start(env, { bus_service, notification }) {
+        // {id de l'alarme: {close, diagnostic, steps}}
+        const streams = {};
+
+        function render(alarmId, alarmName) {
+            const stream = streams[alarmId];
+            if (stream.close) {
+                stream.close();
+            }
+            const lines = [stream.diagnostic, ...stream.steps].filter(Boolean);
+            stream.close = notification.add(lines.join(" • "), {
+                title: `${_lt("Plan d'action en cours")} - ${alarmName}`,
+                type: "info",
+                sticky: true,
+            });
+        }
+
+        bus_service.addEventListener("notification", ({ detail: notifications }) => {
+            for (const { type, payload } of notifications) {
+                if (type !== "pv_ai_action_plan_progress") {
+                    continue;
+                }
+                const { alarm_id: alarmId, alarm_name: alarmName, section } = payload;
+                if (section === "done") {
+                    if (streams[alarmId] && streams[alarmId].close) {
+                        streams[alarmId].close();
+                    }
+                    delete streams[alarmId];
+                    continue;
+                }
+                streams[alarmId] = streams[alarmId] || { close: null, diagnostic: "", steps: [] };
+                if (section === "diagnostic") {
+                    streams[alarmId].diagnostic = payload.diagnostic;
+                } else if (section === "action_step") {
+                    const { step, title, estimated_time: estimatedTime } = payload.step;
+                    streams[alarmId].steps.push(`${step}. ${title} (${estimatedTime} min)`);
+                }
+                render(alarmId, alarmName);
+            }
+        });
+    },
+};
+
+registry.category("services").add("pv_ai_stream", pvAiStreamService);
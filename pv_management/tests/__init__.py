@@ -0,0 +1,3 @@
+from . import test_performance_budgets
+from . import test_ai_shared_state
+from . import test_ai_incremental_analysis
@@ -0,0 +1,54 @@
+from odoo.tests import TransactionCase, tagged
+
+
+@tagged('post_install', '-at_install')
+class TestAIIncrementalAnalysis(TransactionCase):
+    """Analyses IA incrémentales des techniciens: évaluations nouvelles ou modifiées uniquement"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.env = cls.env(context=dict(cls.env.context, tracking_disable=True,
+                                       mail_create_nolog=True, mail_notrack=True))
+        # Sans clé API: analyses de secours, aucun appel OpenAI
+        cls.env['ir.config_parameter'].sudo().set_param('pv_management.openai_api_key', False)
+        cls.env['pv.fleet.generator']._generate(installations=50, seed=21)
+        evaluation = cls.env['pv.evaluation'].search([('technicien_id', '!=', False)], limit=1)
+        cls.technician = evaluation.technicien_id
+        cls.intervention = evaluation.intervention_id
+
+    def test_nothing_changed(self):
+        technician = self.technician
+        self.assertFalse(technician._is_ai_analysis_up_to_date())
+        technician._run_performance_analysis()
+        versions, changed_ids = technician._get_ai_evaluation_versions()[technician.id]
+        self.assertEqual(len(versions), technician.evaluation_count)
+        self.assertFalse(changed_ids)
+
+        # Aucune évaluation nouvelle: rien n'est renvoyé et l'analyse reste à jour
+        self.assertTrue(technician._is_ai_analysis_up_to_date())
+        self.assertNotIn(technician, self.env['hr.employee']._get_technicians_to_analyze())
+        analysis_data = technician.ai_analysis_data
+        technician._run_performance_analysis()
+        self.assertEqual(technician.ai_analysis_data, analysis_data)
+        self.assertTrue(technician._is_ai_analysis_up_to_date())
+
+    def test_new_evaluation(self):
+        technician = self.technician
+        technician._run_performance_analysis()
+        evaluation = self.env['pv.evaluation'].create({
+            'intervention_id': self.intervention.id,
+            'installation_id': self.intervention.installation_id.id,
+            'technician_rating': 'good',
+        })
+
+        # Seule la nouvelle évaluation est envoyée à l'analyse suivante
+        self.assertFalse(technician._is_ai_analysis_up_to_date())
+        self.assertIn(technician, self.env['hr.employee']._get_technicians_to_analyze())
+        self.assertEqual(technician._get_ai_evaluation_versions()[technician.id][1], {evaluation.id})
+        eval_data = self.env['pv.management.openai.service']._collect_technician_evaluations(
+            technician.id, evaluation_ids={evaluation.id})
+        self.assertEqual(eval_data['new_evaluations'], 1)
+
+        technician._run_performance_analysis()
+        self.assertTrue(technician._is_ai_analysis_up_to_date())
@@ -0,0 +1,104 @@
+from odoo.sql_db import db_connect
+from odoo.tests import TransactionCase, tagged
+import threading
+import time
+
+# Attente maximale (s) que les threads soient bloqués sur le verrou de ligne
+LOCK_WAIT_TIMEOUT = 10
+
+
+@tagged('post_install', '-at_install')
+class TestAISharedState(TransactionCase):
+    """Mises à jour concurrentes de l'état partagé entre workers (seaux de débit, disjoncteur)
+
+    Les curseurs séparés sont de vraies connexions validées (TransactionCase n'active pas le
+    mode test du registre): les lignes créées par ces tests sont supprimées à la fin.
+    """
+
+    def setUp(self):
+        super().setUp()
+        if self.registry.in_test_mode():
+            self.skipTest("Registre en mode test: les curseurs séparés partagent la transaction du test")
+
+    def _cursor(self):
+        cr = db_connect(self.env.cr.dbname).cursor()
+        self.addCleanup(cr.close)
+        return cr
+
+    def _delete_on_cleanup(self, table, name):
+        def delete():
+            with db_connect(self.env.cr.dbname).cursor() as cr:
+                cr.execute(f"DELETE FROM {table} WHERE name = %s", (name,))
+        self.addCleanup(delete)
+
+    def _run_concurrently(self, table, name, blocking_update, func, workers=2):
+        """Exécute func() dans workers threads pendant qu'une autre transaction modifie la ligne name
+
+        Les threads sont bloqués par la transaction concurrente, qui valide sa modification une
+        fois qu'ils sont tous en attente: sous REPEATABLE READ ils échoueraient en conflit de
+        sérialisation. Retourne (résultats, erreurs).
+        """
+        blocker = self._cursor()
+        blocker.execute(f"UPDATE {table} SET {blocking_update} WHERE name = %s", (name,))
+
+        results, errors = [], []
+
+        def run():
+            try:
+                results.append(func())
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=run) for _i in range(workers)]
+        for thread in threads:
+            thread.start()
+
+        monitor = self._cursor()
+        deadline = time.monotonic() + LOCK_WAIT_TIMEOUT
+        waiting = 0
+        while waiting < workers and time.monotonic() < deadline:
+            monitor.execute("""
+                SELECT COUNT(*) FROM pg_stat_activity
+                 WHERE datname = current_database() AND wait_event_type = 'Lock'
+            """)
+            waiting = monitor.fetchone()[0]
+            monitor.rollback()
+            time.sleep(0.05)
+        blocker.commit()
+        for thread in threads:
+            thread.join(LOCK_WAIT_TIMEOUT)
+        self.assertEqual(waiting, workers, "Les threads n'ont pas attendu la transaction concurrente")
+        return results, errors
+
+    def test_rate_limiter_concurrent_take(self):
+        limiter = self.env['pv.ai.rate.limiter']
+        name = 'test_concurrent_take'
+        self._delete_on_cleanup('pv_ai_rate_limiter', name)
+        # Création du seau (6 jetons par minute: remplissage négligeable pendant le test)
+        self.assertEqual(limiter._take(name, 1, 6), 0)
+
+        results, errors = self._run_concurrently(
+            'pv_ai_rate_limiter', name, 'level = 5', lambda: limiter._take(name, 1, 6))
+
+        self.assertFalse(errors, f"Prélèvements concurrents en échec: {errors}")
+        self.assertEqual(results, [0, 0], "Chaque prélèvement concurrent doit obtenir son jeton")
+        cr = self._cursor()
+        cr.execute("SELECT level FROM pv_ai_rate_limiter WHERE name = %s", (name,))
+        self.assertAlmostEqual(cr.fetchone()[0], 3, delta=0.5)
+
+    def test_circuit_breaker_concurrent_failures(self):
+        breaker = self.env['pv.ai.circuit.breaker']
+        name = 'test_concurrent_failures'
+        self._delete_on_cleanup('pv_ai_circuit_breaker', name)
+        threshold = breaker._get_settings()['threshold']
+        breaker._record_failure('Erreur initiale', name)
+
+        # Deux échecs simultanés, alors que le seuil est à deux échecs: le disjoncteur doit s'ouvrir
+        results, errors = self._run_concurrently(
+            'pv_ai_circuit_breaker', name, f"failure_count = {threshold - 2}, state = 'closed'",
+            lambda: breaker._record_failure('Service indisponible', name))
+
+        self.assertFalse(errors, f"Échecs concurrents non comptés: {errors}")
+        current = breaker._read_state(name)
+        self.assertEqual(current['failure_count'], threshold)
+        self.assertEqual(current['state'], 'open')
@@ -0,0 +1,112 @@
+from odoo.tests import TransactionCase, tagged
+import logging
+import os
+import time
+
+_logger = logging.getLogger(__name__)
+
+# Budgets par opération: (requêtes SQL max, durée max en ms).
+# Ils ne dépendent pas de la taille du recordset: un motif N+1 les dépasse dès 1000 enregistrements.
+# Le nombre de requêtes est toujours vérifié. La durée dépend de la machine et de sa charge: elle est
+# journalisée, et vérifiée seulement si PV_PERF_ENFORCE_TIME est défini (machine de mesure dédiée).
+BUDGETS = {
+    'alarm_list': (5, 1000),
+    'employee_counters': (6, 1500),
+    'reclamation_form': (12, 2000),
+    'evaluation_create': (25, 5000),
+    'fallback_plan': (20, 3000),
+}
+
+# Tailles de recordset pour lesquelles chaque budget doit tenir
+SIZES = (1, 1000)
+
+ENFORCE_TIME = bool(os.environ.get('PV_PERF_ENFORCE_TIME'))
+
+ALARM_LIST_FIELDS = ['name', 'code_alarm', 'partie', 'severity', 'category', 'occurrence_count',
+                     'last_occurrence_date', 'resolution_rate', 'marque_onduleur_id', 'action_plan_severity']
+EMPLOYEE_LIST_FIELDS = ['name', 'job_title', 'department_id', 'evaluation_count']
+RECLAMATION_FORM_FIELDS = ['name', 'date_heure', 'client_id', 'nom_central_id', 'adresse', 'date_disponibilite',
+                           'code_alarm_id', 'priorite_urgence', 'intervention_count', 'intervention_ids']
+
+
+@tagged('post_install', '-at_install', 'pv_performance')
+class TestPerformanceBudgets(TransactionCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.env = cls.env(context=dict(cls.env.context, tracking_disable=True,
+                                       mail_create_nolog=True, mail_notrack=True))
+        # Historique réaliste (~1500 réclamations et ~1300 interventions)
+        cls.env['pv.fleet.generator']._generate(installations=1500, seed=14)
+        cls.env['alarm.management'].create([
+            {'name': f'Alarme budget {i:04d}', 'code_alarm': f'BUDGET-{i:04d}', 'severity': 'warning'}
+            for i in range(max(SIZES))
+        ])
+        cls.env['hr.employee'].create([{'name': f'Technicien budget {i:04d}'} for i in range(max(SIZES))])
+        cls.env.flush_all()
+
+        cls.alarms = cls.env['alarm.management'].search([], order='id')
+        cls.employees = cls.env['hr.employee'].search([], order='id')
+        cls.reclamations = cls.env['reclamation'].search([], order='id')
+        cls.interventions = cls.env['fiche.intervention'].search([('technicien_id', '!=', False)], order='id')
+        for records in (cls.alarms, cls.employees, cls.reclamations, cls.interventions):
+            assert len(records) >= max(SIZES), f"Jeu de données insuffisant pour {records._name}"
+
+    def assertBudget(self, budget, operation, records):
+        """operation(records) respecte le budget de requêtes (et de durée, voir ENFORCE_TIME), caches ORM vidés"""
+        max_queries, max_ms = BUDGETS[budget]
+        self.env.flush_all()
+        self.env.invalidate_all()
+        started = time.perf_counter()
+        with self.assertQueryCount(max_queries):
+            operation(records)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        _logger.info(f"Budget {budget} sur {len(records)} enregistrement(s): {elapsed_ms:.0f} ms (max {max_ms} ms)")
+        if ENFORCE_TIME:
+            self.assertLessEqual(elapsed_ms, max_ms,
+                                 f"{budget} sur {len(records)} enregistrement(s): {elapsed_ms:.0f} ms > {max_ms} ms")
+
+    def test_alarm_list(self):
+        for size in SIZES:
+            with self.subTest(size=size):
+                self.assertBudget('alarm_list', lambda alarms: alarms.read(ALARM_LIST_FIELDS), self.alarms[:size])
+
+    def test_employee_counters(self):
+        for size in SIZES:
+            with self.subTest(size=size):
+                self.assertBudget('employee_counters', lambda employees: employees.read(EMPLOYEE_LIST_FIELDS),
+                                  self.employees[:size])
+
+    def test_reclamation_form(self):
+        def open_form(reclamations):
+            reclamations.read(RECLAMATION_FORM_FIELDS)
+            reclamations.intervention_ids.read(['name'])
+
+        for size in SIZES:
+            with self.subTest(size=size):
+                self.assertBudget('reclamation_form', open_form, self.reclamations[:size])
+
+    def _create_evaluations(self, interventions):
+        self.env['pv.evaluation'].create([{
+            'intervention_id': intervention.id,
+            'installation_id': intervention.installation_id.id,
+            'technician_rating': 'good',
+        } for intervention in interventions])
+
+    def test_evaluation_create(self):
+        self.assertBudget('evaluation_create', self._create_evaluations, self.interventions[:1])
+
+    def test_evaluation_create_batch(self):
+        self.assertBudget('evaluation_create', self._create_evaluations, self.interventions[:max(SIZES)])
+
+    def test_fallback_plan(self):
+        service = self.env['pv.management.openai.service']
+
+        def generate_fallback_plans(alarms):
+            for alarm_data in alarms._prepare_alarm_data_batch().values():
+                service._get_fallback_plan(alarm_data)
+
+        for size in SIZES:
+            with self.subTest(size=size):
+                self.assertBudget('fallback_plan', generate_fallback_plans, self.alarms[:size])
@@ -1 +1,9 @@
-from . import models
\ No newline at end of file
+from . import models
+
+
+def uninstall_hook(cr, registry):
+    # Le désinstalleur ne supprime que les tables et vues simples: les vues matérialisées restent sinon
+    from .models.pv_reporting import drop_report_relation
+    for table in ('pv_installation_report', 'pv_reclamation_report', 'pv_intervention_report',
+                  'pv_ai_call_report'):
+        drop_report_relation(cr, table)
@@ -18,9 +18,11 @@
     ],
     'data': [
         'security/ir.model.access.csv',
+        'data/report_refresh_cron.xml',
         'views/pv_installation_report_views.xml',
         'views/pv_intervention_report_views.xml',
         'views/pv_reclamation_report_views.xml',
+        'views/pv_ai_call_views.xml',
         'views/pv_dashboard_views.xml',
         'views/menu_views.xml',
 
@@ -33,4 +35,5 @@
     'application': True,
     'installable': True,
     'auto_install': False,
+    'uninstall_hook': 'uninstall_hook',
 }
@@ -1,2 +1,5 @@
 from . import pv_reporting
-from . import pv_dashboard
\ No newline at end of file
+from . import pv_ai_call_report
+from . import pv_dashboard
+from . import pv_dashboard_kpi_cache
+from . import pv_benchmark
\ No newline at end of file
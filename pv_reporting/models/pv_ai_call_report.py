@@ -0,0 +1,59 @@
+from odoo import models, fields
+
+
+class PVAICallReport(models.Model):
+    _name = 'pv.ai.call.report'
+    _inherit = 'pv.materialized.report'
+    _description = 'Synthèse journalière des appels OpenAI'
+    _auto = False
+    _order = 'date desc'
+
+    date = fields.Date(string='Jour', readonly=True)
+    caller = fields.Selection([
+        ('alarm_action_plan', 'Plan d\'action alarme'),
+        ('technician_analysis', 'Analyse technicien'),
+        ('other', 'Autre'),
+    ], string='Origine', readonly=True)
+    model = fields.Char(string='Modèle', readonly=True)
+    call_count = fields.Integer(string='Appels', readonly=True)
+    api_call_count = fields.Integer(string='Appels API', readonly=True)
+    cache_hit_count = fields.Integer(string='Servis par le cache', readonly=True)
+    fallback_count = fields.Integer(string='Secours utilisés', readonly=True)
+    error_count = fields.Integer(string='Erreurs HTTP', readonly=True)
+    retry_count = fields.Integer(string='Rejeux', readonly=True)
+    prompt_tokens = fields.Integer(string='Tokens prompt', readonly=True)
+    completion_tokens = fields.Integer(string='Tokens réponse', readonly=True)
+    cost = fields.Float(string='Coût estimé (USD)', readonly=True, digits=(12, 4))
+    avg_latency_ms = fields.Float(string='Latence moyenne (ms)', readonly=True, group_operator='avg')
+    p95_latency_ms = fields.Float(string='Latence p95 (ms)', readonly=True, group_operator='max')
+    max_latency_ms = fields.Float(string='Latence max (ms)', readonly=True, group_operator='max')
+
+    def _report_query(self):
+        # Les latences ne portent que sur les appels réellement envoyés à l'API.
+        # id: premier appel du groupe, stable d'un rafraîchissement à l'autre (les nouveaux appels du jour
+        # ne le changent pas), contrairement à un numéro de ligne décalé par chaque nouveau groupe
+        return """
+                SELECT
+                    MIN(id) AS id,
+                    day AS date,
+                    caller,
+                    model,
+                    COUNT(*) AS call_count,
+                    COUNT(*) FILTER (WHERE attempt_count > 0) AS api_call_count,
+                    COUNT(*) FILTER (WHERE cache_hit) AS cache_hit_count,
+                    COUNT(*) FILTER (WHERE fallback_used) AS fallback_count,
+                    COUNT(*) FILTER (WHERE status IS NULL AND attempt_count > 0 OR status >= 400) AS error_count,
+                    COALESCE(SUM(GREATEST(attempt_count - 1, 0)), 0) AS retry_count,
+                    COALESCE(SUM(prompt_tokens), 0) AS prompt_tokens,
+                    COALESCE(SUM(completion_tokens), 0) AS completion_tokens,
+                    COALESCE(SUM(cost), 0) AS cost,
+                    AVG(latency_ms) FILTER (WHERE attempt_count > 0) AS avg_latency_ms,
+                    PERCENTILE_CONT(0.95) WITHIN GROUP (ORDER BY latency_ms)
+                        FILTER (WHERE attempt_count > 0) AS p95_latency_ms,
+                    MAX(latency_ms) FILTER (WHERE attempt_count > 0) AS max_latency_ms
+                FROM (
+                    SELECT l.*, (l.create_date AT TIME ZONE 'UTC')::date AS day
+                      FROM pv_ai_call_log l
+                ) calls
+                GROUP BY day, caller, model
+        """
@@ -0,0 +1,114 @@
+from odoo import models, fields, api, tools
+from datetime import datetime, timedelta
+from .pv_reporting import MATERIALIZED_REPORTS
+import json
+import logging
+import os
+import time
+
+_logger = logging.getLogger(__name__)
+
+# Tailles de parc (installations) mesurées par défaut, cumulatives
+BENCHMARK_SCALES = (1000, 10000, 100000)
+
+# Regroupements mesurés pour chaque rapport: (mesures, regroupements)
+REPORT_GROUPINGS = {
+    'pv.installation.report': (['nb_modules:sum', 'puissance_souscrite:sum'], ['type_installation', 'state']),
+    'pv.reclamation.report': (['nb_interventions:sum', 'delai_intervention_heures:avg'], ['code_alarm_id', 'month']),
+    'pv.intervention.report': (['montant_total:sum', 'duree_intervention_jours:avg'], ['technicien_id', 'type_intervention']),
+    'pv.ai.call.report': (['call_count:sum', 'cost:sum', 'avg_latency_ms:avg'], ['caller', 'model']),
+}
+
+ALARM_LIST_FIELDS = ['name', 'code_alarm', 'severity', 'occurrence_count', 'last_occurrence_date',
+                     'avg_resolution_time', 'resolution_rate']
+
+
+class PVBenchmark(models.AbstractModel):
+    _name = 'pv.benchmark'
+    _description = 'Banc de mesure des rapports et KPIs PV'
+
+    @api.model
+    def _run(self, scales=BENCHMARK_SCALES, output_path=None, seed=42):
+        """Génère le parc par paliers et mesure les rapports à chaque palier
+
+        Utilisation depuis le shell Odoo (base dédiée, les données générées sont validées):
+            env['pv.benchmark']._run(scales=(1000, 10000, 100000))
+
+        Retourne le chemin du fichier JSON de résultats (par défaut dans le data_dir d'Odoo).
+        """
+        generator = self.env['pv.fleet.generator']
+        results = []
+        current = self.env['pv.installation'].search_count([])
+        for scale in sorted(scales):
+            if current < scale:
+                generator._generate(installations=scale - current, seed=seed + scale, commit=True)
+                current = scale
+            results.extend(self._run_benchmarks(scale))
+
+        payload = {
+            'database': self.env.cr.dbname,
+            'date': fields.Datetime.to_string(fields.Datetime.now()),
+            'counts': {model_name: self.env[model_name].search_count([]) for model_name in (
+                'pv.installation', 'reclamation', 'fiche.intervention', 'fiche.reponse', 'pv.evaluation')},
+            'results': results,
+        }
+        if not output_path:
+            output_path = os.path.join(
+                tools.config['data_dir'],
+                f"pv_benchmark_{self.env.cr.dbname}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+        with open(output_path, 'w') as f:
+            json.dump(payload, f, indent=2)
+        _logger.info(f"Résultats du banc de mesure écrits dans {output_path}")
+        return output_path
+
+    @api.model
+    def _run_benchmarks(self, scale):
+        """Mesure KPIs, actualisation et regroupements des rapports et liste des alarmes pour un palier"""
+        results = []
+
+        def measure(name, func):
+            results.append(dict(self._measure(func), name=name, scale=scale))
+
+        today = fields.Date.today()
+        dashboard_vals = {
+            'name': 'Banc de mesure',
+            'date_from': today - timedelta(days=365),
+            'date_to': today,
+            'company_id': self.env.company.id,
+        }
+
+        def read_kpis():
+            return self.env['pv.dashboard'].new(dashboard_vals).nb_installations
+
+        self.env['pv.dashboard.kpi.cache'].sudo()._bump_version()
+        measure('dashboard_kpis_cold', read_kpis)
+        measure('dashboard_kpis_warm', read_kpis)
+
+        for model_name in MATERIALIZED_REPORTS:
+            report = self.env[model_name]
+            measures, groupby = REPORT_GROUPINGS[model_name]
+            measure(f'{model_name}.refresh', report._refresh_materialized_view)
+            measure(f'{model_name}.read_group', lambda: report.read_group([], measures, groupby, lazy=False))
+
+        alarms = self.env['alarm.management']
+        measure('alarm.management.list', lambda: alarms.search_read([], ALARM_LIST_FIELDS, limit=80))
+        measure('alarm.management.resolution_stats_30d', lambda: alarms.search([])._get_resolution_stats(days=30))
+
+        for result in results:
+            _logger.info(f"Banc de mesure [{scale}] {result['name']}: {result['ms']} ms, {result['queries']} requêtes")
+        return results
+
+    @api.model
+    def _measure(self, func):
+        """Durée (ms) et nombre de requêtes SQL d'un appel, caches ORM vidés"""
+        self.env.flush_all()
+        self.env.invalidate_all()
+        cr = self.env.cr
+        queries_before = cr.sql_log_count
+        started = time.perf_counter()
+        func()
+        self.env.flush_all()
+        return {
+            'ms': round((time.perf_counter() - started) * 1000, 1),
+            'queries': cr.sql_log_count - queries_before,
+        }
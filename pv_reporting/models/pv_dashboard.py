@@ -1,6 +1,13 @@
 from odoo import models, fields, api
 from datetime import datetime, timedelta
 import json
+from odoo.addons.pv_management.models.pv_perf_metric import instrumented
+
+KPI_FIELDS = [
+    'nb_installations', 'nb_installations_actives', 'nb_reclamations', 'nb_interventions',
+    'taux_resolution', 'delai_moyen_intervention', 'montant_total_facture', 'montant_total_paye',
+    'taux_paiement',
+]
 
 
 class PVDashboard(models.Model):
@@ -10,6 +17,7 @@ class PVDashboard(models.Model):
     name = fields.Char(string='Nom', required=True)
     date_from = fields.Date(string='Date de début', default=lambda self: fields.Date.today() - timedelta(days=30))
     date_to = fields.Date(string='Date de fin', default=lambda self: fields.Date.today())
+    company_id = fields.Many2one('res.company', string='Société', default=lambda self: self.env.company)
 
     # KPIs
     nb_installations = fields.Integer(string='Nombre d\'installations', compute='_compute_kpis')
@@ -22,50 +30,67 @@ class PVDashboard(models.Model):
     montant_total_paye = fields.Float(string='Montant total payé', compute='_compute_kpis')
     taux_paiement = fields.Float(string='Taux de paiement (%)', compute='_compute_kpis')
 
-    @api.depends('date_from', 'date_to')
+    @api.depends('date_from', 'date_to', 'company_id')
+    @instrumented('compute')
     def _compute_kpis(self):
+        kpi_cache = self.env['pv.dashboard.kpi.cache'].sudo()
         for record in self:
-            # Calcul des KPIs pour les installations
-            installations = self.env['pv.installation'].search([])
-            installations_actives = installations.filtered(lambda i: i.state in ['in_progress'])
-            record.nb_installations = len(installations)
-            record.nb_installations_actives = len(installations_actives)
-
-            # Réclamations dans la période
-            reclamations = self.env['reclamation'].search([
-                ('date_heure', '>=', record.date_from),
-                ('date_heure', '<=', record.date_to)
-            ])
-            record.nb_reclamations = len(reclamations)
-
-            # Interventions dans la période
-            interventions = self.env['fiche.intervention'].search([
-                ('create_date', '>=', record.date_from),
-                ('create_date', '<=', record.date_to)
-            ])
-            record.nb_interventions = len(interventions)
-
-            # Taux de résolution (interventions fermées / total)
-            interventions_fermees = interventions.filtered(lambda i: i.state == 'closed')
-            record.taux_resolution = (len(interventions_fermees) / len(interventions) * 100) if interventions else 0
-
-            # Délai moyen d'intervention
-            delais = []
-            for rec in reclamations:
-                intervention = self.env['fiche.intervention'].search([('reclamation_id', '=', rec.id)], limit=1)
-                if intervention:
-                    delai = (intervention.create_date - rec.date_heure).total_seconds() / 3600  # en heures
-                    delais.append(delai)
-            record.delai_moyen_intervention = sum(delais) / len(delais) if delais else 0
+            kpis = kpi_cache._get_kpis(record.date_from, record.date_to, record.company_id.id)
+            for field_name in KPI_FIELDS:
+                record[field_name] = kpis.get(field_name, 0)
 
-            # Montants facturés et payés
-            facturations = self.env['fiche.reponse'].search([
-                ('date_cloture', '>=', record.date_from),
-                ('date_cloture', '<=', record.date_to)
-            ])
+    @api.model
+    def _compute_kpi_values(self, date_from, date_to):
+        """Calcule tous les KPIs d'une période en une seule requête agrégée"""
+        for model_name in ('pv.installation', 'reclamation', 'fiche.intervention', 'fiche.reponse'):
+            self.env[model_name].flush_model()
+        self.env.cr.execute("""
+            WITH installations AS (
+                SELECT COUNT(*) AS nb_installations,
+                       COUNT(*) FILTER (WHERE state = 'in_progress') AS nb_installations_actives
+                  FROM pv_installation
+                 WHERE active
+            ), reclamations AS (
+                -- Délai jusqu'à la première intervention de chaque réclamation
+                SELECT COUNT(*) AS nb_reclamations,
+                       AVG(EXTRACT(EPOCH FROM fi.create_date - r.date_heure) / 3600.0) AS delai_moyen_intervention
+                  FROM reclamation r
+                  LEFT JOIN LATERAL (
+                        SELECT create_date FROM fiche_intervention
+                         WHERE reclamation_id = r.id
+                         ORDER BY id
+                         LIMIT 1
+                  ) fi ON TRUE
+                 WHERE (%(date_from)s IS NULL OR r.date_heure >= %(date_from)s)
+                   AND (%(date_to)s IS NULL OR r.date_heure <= %(date_to)s)
+            ), interventions AS (
+                SELECT COUNT(*) AS nb_interventions,
+                       COUNT(*) FILTER (WHERE state = 'closed') AS nb_interventions_fermees
+                  FROM fiche_intervention
+                 WHERE (%(date_from)s IS NULL OR create_date >= %(date_from)s)
+                   AND (%(date_to)s IS NULL OR create_date <= %(date_to)s)
+            ), facturations AS (
+                SELECT COALESCE(SUM(montant_a_payer), 0) AS montant_total_facture,
+                       COALESCE(SUM(montant_a_payer) FILTER (WHERE est_paye = 'oui'), 0) AS montant_total_paye
+                  FROM fiche_reponse
+                 WHERE (%(date_from)s IS NULL OR date_cloture >= %(date_from)s)
+                   AND (%(date_to)s IS NULL OR date_cloture <= %(date_to)s)
+            )
+            SELECT * FROM installations, reclamations, interventions, facturations
+        """, {'date_from': date_from or None, 'date_to': date_to or None})
+        row = self.env.cr.dictfetchone()
 
-            record.montant_total_facture = sum(facturations.mapped('montant_a_payer'))
-            montant_paye = sum(f.montant_a_payer for f in facturations if f.est_paye == 'oui')
-            record.montant_total_paye = montant_paye
-            record.taux_paiement = (
-                        montant_paye / record.montant_total_facture * 100) if record.montant_total_facture else 0
\ No newline at end of file
+        montant_total_facture = float(row['montant_total_facture'])
+        montant_total_paye = float(row['montant_total_paye'])
+        return {
+            'nb_installations': row['nb_installations'],
+            'nb_installations_actives': row['nb_installations_actives'],
+            'nb_reclamations': row['nb_reclamations'],
+            'nb_interventions': row['nb_interventions'],
+            'taux_resolution': (row['nb_interventions_fermees'] / row['nb_interventions'] * 100)
+                               if row['nb_interventions'] else 0,
+            'delai_moyen_intervention': float(row['delai_moyen_intervention'] or 0),
+            'montant_total_facture': montant_total_facture,
+            'montant_total_paye': montant_total_paye,
+            'taux_paiement': (montant_total_paye / montant_total_facture * 100) if montant_total_facture else 0,
+        }
@@ -0,0 +1,150 @@
+from odoo import models, fields, api
+import json
+import logging
+from odoo.addons.pv_management.models.committed_cursor import committed_cursor
+
+_logger = logging.getLogger(__name__)
+
+# Durée de vie maximale d'une entrée: filet de sécurité si une modification échappe à l'ORM (SQL direct)
+KPI_CACHE_MAX_AGE_MINUTES = 60
+
+# Champs dont la modification change les KPIs du tableau de bord
+KPI_SOURCE_FIELDS = {
+    'pv.installation': {'active', 'state'},
+    'reclamation': {'date_heure'},
+    'fiche.intervention': {'state', 'reclamation_id'},
+    'fiche.reponse': {'date_cloture', 'montant_a_payer', 'est_paye'},
+}
+
+
+class PVDashboardKpiCache(models.Model):
+    _name = 'pv.dashboard.kpi.cache'
+    _description = 'Cache des KPIs du tableau de bord PV'
+
+    key = fields.Char(string='Clé', required=True, readonly=True)
+    date_from = fields.Date(string='Date de début', readonly=True)
+    date_to = fields.Date(string='Date de fin', readonly=True)
+    company_id = fields.Many2one('res.company', string='Société', readonly=True)
+    kpi_values = fields.Text(string='Valeurs (JSON)', readonly=True)
+    version = fields.Integer(string='Version des données sources', readonly=True)
+
+    _sql_constraints = [
+        ('key_unique', 'unique(key)', 'Une seule entrée de cache par période et société.'),
+    ]
+
+    # Invalidation par numéro de version: une séquence PostgreSQL avancée (nextval) à chaque
+    # modification des données sources. nextval n'est pas transactionnel et ne verrouille rien:
+    # les créations concurrentes ne s'attendent pas et n'échouent pas en conflit de sérialisation.
+    # Une entrée n'est servie que si elle a été calculée pour la version courante.
+    # Les entrées sont lues, calculées et écrites dans un curseur séparé (READ COMMITTED): la lecture
+    # du tableau de bord ne garde aucun verrou de ligne dans sa transaction.
+
+    def init(self):
+        self.env.cr.execute("CREATE SEQUENCE IF NOT EXISTS pv_dashboard_kpi_version_seq")
+
+    @api.model
+    def _get_kpis(self, date_from, date_to, company_id):
+        """KPIs de la période, depuis le cache ou calculés puis mis en cache"""
+        if self.env.cr.postcommit.data.get('pv_dashboard_kpi_invalidated'):
+            # Modifications non validées dans cette transaction: KPIs calculés sur son curseur, non partagés
+            return self.env['pv.dashboard']._compute_kpi_values(date_from, date_to)
+
+        key = f"{date_from or ''}|{date_to or ''}|{company_id or ''}"
+        with committed_cursor(self.pool) as cr:
+            cr.execute("SELECT last_value FROM pv_dashboard_kpi_version_seq")
+            version = cr.fetchone()[0]
+            cr.execute("""
+                SELECT kpi_values FROM pv_dashboard_kpi_cache
+                 WHERE key = %s
+                   AND version = %s
+                   AND create_date > (now() AT TIME ZONE 'UTC') - make_interval(mins => %s)
+            """, (key, version, KPI_CACHE_MAX_AGE_MINUTES))
+            row = cr.fetchone()
+            if row:
+                return json.loads(row[0])
+
+            # Calcul dans ce curseur, après la lecture de la version: en READ COMMITTED, son instantané
+            # est au moins aussi récent que la version. L'instantané de la transaction appelante peut
+            # précéder la dernière modification: des KPIs périmés seraient servis sous la version courante.
+            kpis = self.env(cr=cr)['pv.dashboard']._compute_kpi_values(date_from, date_to)
+            cr.execute("""
+                INSERT INTO pv_dashboard_kpi_cache (key, date_from, date_to, company_id, kpi_values, version,
+                                                    create_uid, create_date, write_uid, write_date)
+                VALUES (%(key)s, %(date_from)s, %(date_to)s, %(company_id)s, %(kpi_values)s, %(version)s,
+                        %(uid)s, (now() AT TIME ZONE 'UTC'), %(uid)s, (now() AT TIME ZONE 'UTC'))
+                ON CONFLICT (key) DO UPDATE
+                   SET kpi_values = EXCLUDED.kpi_values,
+                       version = EXCLUDED.version,
+                       create_date = EXCLUDED.create_date,
+                       write_date = EXCLUDED.write_date
+                 WHERE pv_dashboard_kpi_cache.version <= EXCLUDED.version
+            """, {'key': key, 'date_from': date_from or None, 'date_to': date_to or None,
+                  'company_id': company_id or None, 'kpi_values': json.dumps(kpis), 'version': version,
+                  'uid': self.env.uid})
+        return kpis
+
+    @api.model
+    def _invalidate(self):
+        """Rend obsolètes toutes les entrées (une modification des sources peut changer toute période)
+
+        La version avance immédiatement (la transaction courante calcule ses KPIs sur son propre
+        curseur, voir _get_kpis), puis une seconde fois après la validation: une lecture concurrente qui a recalculé entre-temps,
+        sans voir les modifications non encore validées, ne reste pas servie.
+        """
+        self._bump_version()
+        postcommit = self.env.cr.postcommit
+        if not postcommit.data.get('pv_dashboard_kpi_invalidated'):
+            postcommit.data['pv_dashboard_kpi_invalidated'] = True
+            pool = self.pool
+
+            @postcommit.add
+            def _bump_version_after_commit():
+                with pool.cursor() as cr:
+                    cr.execute("SELECT nextval('pv_dashboard_kpi_version_seq')")
+
+    @api.model
+    def _bump_version(self):
+        """Avance la version des données sources: les entrées existantes ne sont plus servies"""
+        self.env.cr.execute("SELECT nextval('pv_dashboard_kpi_version_seq')")
+
+
+class KpiCacheInvalidationMixin(models.AbstractModel):
+    _name = 'pv.dashboard.kpi.source.mixin'
+    _description = 'Invalidation du cache des KPIs sur modification des données sources'
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        records = super().create(vals_list)
+        self.env['pv.dashboard.kpi.cache'].sudo()._invalidate()
+        return records
+
+    def write(self, vals):
+        result = super().write(vals)
+        if KPI_SOURCE_FIELDS.get(self._name, set()) & set(vals):
+            self.env['pv.dashboard.kpi.cache'].sudo()._invalidate()
+        return result
+
+    def unlink(self):
+        result = super().unlink()
+        self.env['pv.dashboard.kpi.cache'].sudo()._invalidate()
+        return result
+
+
+class PVInstallation(models.Model):
+    _name = 'pv.installation'
+    _inherit = ['pv.installation', 'pv.dashboard.kpi.source.mixin']
+
+
+class Reclamation(models.Model):
+    _name = 'reclamation'
+    _inherit = ['reclamation', 'pv.dashboard.kpi.source.mixin']
+
+
+class FicheIntervention(models.Model):
+    _name = 'fiche.intervention'
+    _inherit = ['fiche.intervention', 'pv.dashboard.kpi.source.mixin']
+
+
+class FicheReponse(models.Model):
+    _name = 'fiche.reponse'
+    _inherit = ['fiche.reponse', 'pv.dashboard.kpi.source.mixin']
@@ -1,9 +1,135 @@
-from odoo import models, fields, api, tools
-from datetime import datetime, timedelta
+from odoo import models, fields, api, _
+import logging
+import time
+from odoo.addons.pv_management.models.pv_perf_metric import instrumented
+
+_logger = logging.getLogger(__name__)
+
+# Rapports stockés en vues matérialisées, rafraîchies par le cron ou à la demande
+MATERIALIZED_REPORTS = ['pv.installation.report', 'pv.reclamation.report', 'pv.intervention.report',
+                        'pv.ai.call.report']
+
+# Seuil (lignes estimées) à partir duquel une table est considérée grande par la vérification EXPLAIN
+EXPLAIN_LARGE_TABLE_ROWS = 10000
+
+
+def drop_report_relation(cr, name):
+    """Supprime la vue ou la vue matérialisée name (drop_view_if_exists échoue sur une vue matérialisée)"""
+    cr.execute("SELECT relkind FROM pg_class WHERE relname = %s", (name,))
+    row = cr.fetchone()
+    if not row:
+        return
+    if row[0] == 'm':
+        cr.execute("DROP MATERIALIZED VIEW IF EXISTS %s CASCADE" % name)
+    elif row[0] == 'v':
+        cr.execute("DROP VIEW IF EXISTS %s CASCADE" % name)
+
+
+class PVMaterializedReport(models.AbstractModel):
+    _name = 'pv.materialized.report'
+    _description = 'Rapport PV en vue matérialisée'
+    _auto = False
+
+    refreshed_at = fields.Datetime(string='Dernière actualisation', readonly=True)
+
+    def _report_query(self):
+        """Requête SELECT du rapport; doit fournir une colonne id unique"""
+        raise NotImplementedError()
+
+    def init(self):
+        if self._abstract:
+            return
+        drop_report_relation(self.env.cr, self._table)
+        self.env.cr.execute("""
+            CREATE MATERIALIZED VIEW %s AS (
+                SELECT report.*, (now() AT TIME ZONE 'UTC') AS refreshed_at
+                  FROM (%s) report
+            )
+        """ % (self._table, self._report_query()))
+        # Index unique requis par REFRESH MATERIALIZED VIEW CONCURRENTLY
+        self.env.cr.execute("CREATE UNIQUE INDEX %s_id_uniq ON %s (id)" % (self._table, self._table))
+
+    def _refresh_materialized_view(self):
+        """Rafraîchit la vue sans bloquer les lectures des pivots et graphiques"""
+        started = time.monotonic()
+        self.env.cr.execute("REFRESH MATERIALIZED VIEW CONCURRENTLY %s" % self._table)
+        self.invalidate_model()
+        _logger.info(f"Rapport {self._name} actualisé en {(time.monotonic() - started) * 1000:.0f} ms")
+
+    @api.model
+    def _refresh_all_reports(self):
+        for model_name in MATERIALIZED_REPORTS:
+            self.env[model_name]._refresh_materialized_view()
+
+    @api.model
+    def _cron_refresh_reports(self):
+        self._refresh_all_reports()
+        self._check_report_plans()
+
+    def _explain_report_query(self, large_table_rows=EXPLAIN_LARGE_TABLE_ROWS):
+        """Vérifie le plan d'exécution (EXPLAIN, sans exécuter la requête) du rapport
+
+        Retourne la liste des problèmes détectés: sous-requêtes corrélées (SubPlan, exécutées
+        pour chaque ligne) et parcours séquentiels de grandes tables répétés dans une boucle imbriquée.
+        Un parcours séquentiel unique d'une table agrégée en une passe est attendu et n'est pas signalé.
+        """
+        self.env.cr.execute("EXPLAIN (FORMAT JSON) %s" % self._report_query())
+        plan = self.env.cr.fetchone()[0][0]['Plan']
+        table_rows = {}
+        issues = []
+
+        def _estimated_rows(table):
+            if table not in table_rows:
+                self.env.cr.execute("SELECT reltuples FROM pg_class WHERE relname = %s", (table,))
+                row = self.env.cr.fetchone()
+                table_rows[table] = row[0] if row else 0
+            return table_rows[table]
+
+        def _walk(node, repeated):
+            if node.get('Parent Relationship') == 'SubPlan':
+                issues.append(f"Sous-requête corrélée: {node.get('Subplan Name', node['Node Type'])}")
+            relation = node.get('Relation Name')
+            if node['Node Type'] == 'Seq Scan' and repeated and _estimated_rows(relation) >= large_table_rows:
+                issues.append(f"Parcours séquentiel répété de {relation} "
+                              f"(~{_estimated_rows(relation):.0f} lignes) dans une boucle imbriquée")
+            for child in node.get('Plans', []):
+                inner_loop = node['Node Type'] == 'Nested Loop' and child.get('Parent Relationship') == 'Inner'
+                _walk(child, repeated or inner_loop)
+
+        _walk(plan, False)
+        return issues
+
+    @api.model
+    def _check_report_plans(self, large_table_rows=EXPLAIN_LARGE_TABLE_ROWS):
+        """{modèle: problèmes} pour tous les rapports; les problèmes sont journalisés"""
+        result = {}
+        for model_name in MATERIALIZED_REPORTS:
+            issues = self.env[model_name]._explain_report_query(large_table_rows)
+            for issue in issues:
+                _logger.warning(f"Plan du rapport {model_name}: {issue}")
+            result[model_name] = issues
+        return result
+
+    @api.model
+    @instrumented('action')
+    def action_refresh_reports(self):
+        self._refresh_all_reports()
+        return {
+            'type': 'ir.actions.client',
+            'tag': 'display_notification',
+            'params': {
+                'title': _('Analyses actualisées'),
+                'message': _('Les rapports installations, réclamations et interventions sont à jour.'),
+                'sticky': False,
+                'type': 'success',
+                'next': {'type': 'ir.actions.client', 'tag': 'reload'},
+            }
+        }
 
 
 class PVInstallationReport(models.Model):
     _name = 'pv.installation.report'
+    _inherit = 'pv.materialized.report'
     _description = 'Reporting sur les Installations PV'
     _auto = False
     _order = 'date_mise_en_service desc'
@@ -35,10 +161,18 @@ class PVInstallationReport(models.Model):
     month = fields.Char(string='Mois', readonly=True)
     quarter = fields.Char(string='Trimestre', readonly=True)
 
-    def init(self):
-        tools.drop_view_if_exists(self.env.cr, self._table)
-        self.env.cr.execute("""
-            CREATE OR REPLACE VIEW %s AS (
+    def _report_query(self):
+        # Comptages pré-agrégés en une passe par table de relation (pas de sous-requête par ligne)
+        return """
+                WITH modules AS (
+                    SELECT pv_installation_id, COUNT(*) AS nb_modules
+                      FROM pv_installation_pv_module_rel
+                     GROUP BY pv_installation_id
+                ), onduleurs AS (
+                    SELECT pv_installation_id, COUNT(*) AS nb_onduleurs
+                      FROM pv_installation_pv_inverter_rel
+                     GROUP BY pv_installation_id
+                )
                 SELECT
                     pi.id as id,
                     pi.id as installation_id,
@@ -52,8 +186,8 @@ class PVInstallationReport(models.Model):
                     pi.puissance_souscrite,
                     pi.consommation_annuelle,
                     pi.state,
-                    (SELECT COUNT(*) FROM pv_installation_pv_module_rel rel WHERE rel.pv_installation_id = pi.id) as nb_modules,
-                    (SELECT COUNT(*) FROM pv_installation_pv_inverter_rel rel WHERE rel.pv_installation_id = pi.id) as nb_onduleurs,
+                    COALESCE(m.nb_modules, 0) as nb_modules,
+                    COALESCE(o.nb_onduleurs, 0) as nb_onduleurs,
                     TO_CHAR(pi.date_mise_en_service, 'YYYY') as year,
                     TO_CHAR(pi.date_mise_en_service, 'MM') as month,
                     CONCAT('Q', EXTRACT(QUARTER FROM pi.date_mise_en_service)) as quarter
@@ -61,12 +195,16 @@ class PVInstallationReport(models.Model):
                     pv_installation pi
                 LEFT JOIN
                     res_partner rp ON pi.client = rp.id
-            )
-        """ % self._table)
+                LEFT JOIN
+                    modules m ON m.pv_installation_id = pi.id
+                LEFT JOIN
+                    onduleurs o ON o.pv_installation_id = pi.id
+        """
 
 
 class PVReclamationReport(models.Model):
     _name = 'pv.reclamation.report'
+    _inherit = 'pv.materialized.report'
     _description = 'Reporting sur les Réclamations'
     _auto = False
     _order = 'date_heure desc'
@@ -98,10 +236,16 @@ class PVReclamationReport(models.Model):
     day = fields.Char(string='Jour', readonly=True)
     hour = fields.Char(string='Heure', readonly=True)
 
-    def init(self):
-        tools.drop_view_if_exists(self.env.cr, self._table)
-        self.env.cr.execute("""
-            CREATE OR REPLACE VIEW %s AS (
+    def _report_query(self):
+        return """
+                WITH interventions AS (
+                    SELECT reclamation_id,
+                           COUNT(*) AS nb_interventions,
+                           MIN(create_date) AS first_intervention_date
+                      FROM fiche_intervention
+                     WHERE reclamation_id IS NOT NULL
+                     GROUP BY reclamation_id
+                )
                 SELECT
                     r.id as id,
                     r.id as reclamation_id,
@@ -114,12 +258,9 @@ class PVReclamationReport(models.Model):
                     am.name as code_alarm_name,
                     r.priorite_urgence,
                     r.date_disponibilite,
-                    (SELECT COUNT(*) FROM fiche_intervention fi WHERE fi.reclamation_id = r.id) as nb_interventions,
-                    EXTRACT(EPOCH FROM (
-                        COALESCE(
-                            (SELECT MIN(f.create_date) FROM fiche_intervention f WHERE f.reclamation_id = r.id),
-                            NOW()
-                        ) - r.date_heure)) / 3600 as delai_intervention_heures,
+                    COALESCE(i.nb_interventions, 0) as nb_interventions,
+                    EXTRACT(EPOCH FROM (COALESCE(i.first_intervention_date, NOW()) - r.date_heure)) / 3600
+                        as delai_intervention_heures,
                     TO_CHAR(r.date_heure, 'YYYY') as year,
                     TO_CHAR(r.date_heure, 'MM') as month,
                     CONCAT('Q', EXTRACT(QUARTER FROM r.date_heure)) as quarter,
@@ -128,16 +269,18 @@ class PVReclamationReport(models.Model):
                     TO_CHAR(r.date_heure, 'HH24') as hour
                 FROM
                     reclamation r
+                LEFT JOIN
+                    interventions i ON i.reclamation_id = r.id
                 LEFT JOIN
                     pv_installation pi ON r.nom_central_id = pi.id
                 LEFT JOIN
                     alarm_management am ON r.code_alarm_id = am.id
-            )
-        """ % self._table)
+        """
 
 
 class PVInterventionReport(models.Model):
     _name = 'pv.intervention.report'
+    _inherit = 'pv.materialized.report'
     _description = 'Reporting sur les Interventions'
     _auto = False
     _order = 'create_date desc'
@@ -191,10 +334,24 @@ class PVInterventionReport(models.Model):
     quarter = fields.Char(string='Trimestre', readonly=True)
     week = fields.Char(string='Semaine', readonly=True)
 
-    def init(self):
-        tools.drop_view_if_exists(self.env.cr, self._table)
-        self.env.cr.execute("""
-            CREATE OR REPLACE VIEW %s AS (
+    def _report_query(self):
+        # Réponses et évaluations agrégées une seule fois, puis jointes (au lieu de six sous-requêtes par ligne)
+        return """
+                WITH reponses AS (
+                    SELECT intervention_id,
+                           MAX(date_cloture) AS date_cloture,
+                           SUM(montant_a_payer) AS montant_total,
+                           SUM(montant_a_payer) FILTER (WHERE est_paye = 'oui') AS montant_paye,
+                           COUNT(*) AS nb_reponses,
+                           COUNT(*) FILTER (WHERE est_paye = 'non') AS nb_non_payees
+                      FROM fiche_reponse
+                     GROUP BY intervention_id
+                ), evaluations AS (
+                    SELECT DISTINCT ON (intervention_id) intervention_id, technician_rating
+                      FROM pv_evaluation
+                     WHERE intervention_id IS NOT NULL
+                     ORDER BY intervention_id, id
+                )
                 SELECT
                     fi.id as id,
                     fi.id as intervention_id,
@@ -210,22 +367,12 @@ class PVInterventionReport(models.Model):
                     fi.reclamation_id,
                     fi.state,
                     EXTRACT(EPOCH FROM (
-                        CASE WHEN fi.state = 'closed' THEN
-                            (SELECT MAX(fr.date_cloture) FROM fiche_reponse fr WHERE fr.intervention_id = fi.id)
-                        ELSE
-                            NOW()
-                        END - fi.create_date)) / 86400 as duree_intervention_jours,
-                    (SELECT COALESCE(SUM(fr.montant_a_payer), 0) FROM fiche_reponse fr WHERE fr.intervention_id = fi.id) as montant_total,
-                    (SELECT COALESCE(SUM(CASE WHEN fr.est_paye = 'oui' THEN fr.montant_a_payer ELSE 0 END), 0) 
-                     FROM fiche_reponse fr WHERE fr.intervention_id = fi.id) as montant_paye,
-                    CASE WHEN (
-                        SELECT COUNT(*) FROM fiche_reponse fr 
-                        WHERE fr.intervention_id = fi.id AND fr.est_paye = 'non'
-                    ) = 0 AND (
-                        SELECT COUNT(*) FROM fiche_reponse fr 
-                        WHERE fr.intervention_id = fi.id
-                    ) > 0 THEN true ELSE false END as est_payee,
-                    (SELECT pe.technician_rating FROM pv_evaluation pe WHERE pe.intervention_id = fi.id LIMIT 1) as note_technicien,
+                        CASE WHEN fi.state = 'closed' THEN rep.date_cloture ELSE NOW() END
+                        - fi.create_date)) / 86400 as duree_intervention_jours,
+                    COALESCE(rep.montant_total, 0) as montant_total,
+                    COALESCE(rep.montant_paye, 0) as montant_paye,
+                    COALESCE(rep.nb_reponses, 0) > 0 AND rep.nb_non_payees = 0 as est_payee,
+                    ev.technician_rating as note_technicien,
                     TO_CHAR(fi.create_date, 'YYYY') as year,
                     TO_CHAR(fi.create_date, 'MM') as month,
                     CONCAT('Q', EXTRACT(QUARTER FROM fi.create_date)) as quarter,
@@ -233,11 +380,14 @@ class PVInterventionReport(models.Model):
                     1 as nombre_interventions
                 FROM
                     fiche_intervention fi
+                LEFT JOIN
+                    reponses rep ON rep.intervention_id = fi.id
+                LEFT JOIN
+                    evaluations ev ON ev.intervention_id = fi.id
                 LEFT JOIN
                     pv_installation pi ON fi.installation_id = pi.id
                 LEFT JOIN
                     res_partner rp ON pi.client = rp.id
                 LEFT JOIN
                     hr_employee he ON fi.technicien_id = he.id
-            )
-        """ % self._table)
\ No newline at end of file
+        """
\ No newline at end of file